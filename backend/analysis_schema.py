@@ -0,0 +1,138 @@
+"""
+AI分析结果的JSON结构定义与校验
+与prompts.get_analysis_prompt / get_simple_analysis_prompt中要求的输出结构保持一致
+"""
+from typing import Any, Dict, List
+
+# 完整分析（get_analysis_prompt）
+ANALYSIS_SCHEMA = {
+    'type': 'object',
+    'required': [
+        'audience_analysis', 'key_findings', 'content_recommendations',
+        'interaction_design', 'audience_segments', 'practical_tips'
+    ],
+    'properties': {
+        'audience_analysis': {
+            'type': 'object',
+            'required': ['summary', 'key_characteristics', 'readiness_score'],
+            'properties': {
+                'summary': {'type': 'string'},
+                'key_characteristics': {'type': 'array', 'items': {'type': 'object'}},
+                'readiness_score': {
+                    'type': 'object',
+                    'required': ['technical', 'mindset', 'organizational'],
+                },
+            },
+        },
+        'key_findings': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'required': ['title', 'priority', 'details', 'implication'],
+            },
+        },
+        'content_recommendations': {
+            'type': 'object',
+            'required': ['part1_concepts', 'part2_cases', 'time_allocation'],
+        },
+        'interaction_design': {
+            'type': 'object',
+            'required': ['live_poc_suggestions', 'qa_strategy', 'discussion_topics'],
+        },
+        'audience_segments': {
+            'type': 'array',
+            'items': {'type': 'object', 'required': ['segment_name', 'characteristics']},
+        },
+        'practical_tips': {
+            'type': 'object',
+            'required': ['opening', 'transitions', 'engagement_techniques', 'closing'],
+        },
+    },
+}
+
+# 简化分析（get_simple_analysis_prompt）
+SIMPLE_ANALYSIS_SCHEMA = {
+    'type': 'object',
+    'required': [
+        'audience_summary', 'top_3_insights', 'content_focus',
+        'case_priority', 'interaction_tips'
+    ],
+    'properties': {
+        'audience_summary': {'type': 'string'},
+        'top_3_insights': {'type': 'array'},
+        'content_focus': {'type': 'array'},
+        'case_priority': {'type': 'array'},
+        'interaction_tips': {'type': 'array'},
+    },
+}
+
+# 分群分析：单个群体（get_segment_analysis_prompt）
+SEGMENT_SCHEMA = {
+    'type': 'object',
+    'required': ['characteristics', 'pain_points', 'content_focus', 'engagement_strategy'],
+    'properties': {
+        'characteristics': {'type': 'string'},
+        'pain_points': {'type': 'array'},
+        'content_focus': {'type': 'array'},
+        'engagement_strategy': {'type': 'string'},
+    },
+}
+
+# 分群分析：合并结论（get_segment_reduce_prompt）
+SEGMENT_REDUCE_SCHEMA = {
+    'type': 'object',
+    'required': ['overall_summary', 'segment_differences', 'key_findings', 'practical_tips'],
+    'properties': {
+        'overall_summary': {'type': 'string'},
+        'segment_differences': {'type': 'array', 'items': {'type': 'object'}},
+        'key_findings': ANALYSIS_SCHEMA['properties']['key_findings'],
+        'practical_tips': ANALYSIS_SCHEMA['properties']['practical_tips'],
+    },
+}
+
+_TYPES = {
+    'object': dict,
+    'array': list,
+    'string': str,
+    'boolean': bool,
+}
+
+
+def _type_ok(value: Any, expected: str) -> bool:
+    if expected == 'number':
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    return isinstance(value, _TYPES[expected])
+
+
+def validate_analysis(data: Any, schema: Dict, path: str = '$') -> List[str]:
+    """
+    按结构定义校验分析结果
+
+    Returns:
+        错误列表，空列表表示校验通过
+    """
+    expected = schema.get('type')
+    if expected and not _type_ok(data, expected):
+        return [f"{path}: 应为{expected}"]
+
+    errors = []
+    if isinstance(data, dict):
+        for key in schema.get('required', []):
+            if key not in data:
+                errors.append(f"{path}.{key}: 缺失")
+        for key, sub_schema in schema.get('properties', {}).items():
+            if key in data:
+                errors.extend(validate_analysis(data[key], sub_schema, f"{path}.{key}"))
+    elif isinstance(data, list) and 'items' in schema:
+        for i, item in enumerate(data):
+            errors.extend(validate_analysis(item, schema['items'], f"{path}[{i}]"))
+    return errors
+
+
+def missing_top_level(data: Dict, schema: Dict) -> List[str]:
+    """返回缺失或结构不对的顶层字段（用于只补全这些字段）"""
+    missing = []
+    for key in schema.get('required', []):
+        if key not in data or validate_analysis(data[key], schema.get('properties', {}).get(key, {})):
+            missing.append(key)
+    return missing
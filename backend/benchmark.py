@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+压测脚本 - 模拟课堂现场的提交/统计/导出流量
+
+启动本地后端（内存存储替身 + 模拟LLM服务），然后模拟：
+  - N个学生在T秒内集中提交问卷
+  - M个管理后台每隔几秒轮询统计数据
+  - 提交结束后导出CSV、触发AI分析
+
+输出各接口的吞吐量、p50/p95/p99延迟和后端内存占用，结果写入JSON文件便于长期追踪。
+
+用法:
+    python benchmark.py --students 200 --window 30 --dashboards 5
+    python benchmark.py --output bench_results.json --baseline last_results.json
+    python benchmark.py --base-url http://localhost:8000   # 压测已启动的后端
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+
+from generate_test_data import ResponseFactory, generate_random_response
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# ================================================================
+# 工具函数
+# ================================================================
+
+def _free_port() -> int:
+    """获取一个空闲端口"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """最近秩法计算分位数（输入需已排序）"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _read_rss_kb(pid: int) -> Optional[int]:
+    """读取进程当前常驻内存（KB），仅支持Linux"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+# ================================================================
+# 本地服务管理
+# ================================================================
+
+class LocalStack:
+    """启动后端和模拟LLM服务（子进程）"""
+
+    def __init__(self, llm_latency: float):
+        self.llm_latency = llm_latency
+        self.app_port = _free_port()
+        self.llm_port = _free_port()
+        self.processes: List[subprocess.Popen] = []
+        self.app_pid: Optional[int] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.app_port}"
+
+    async def start(self):
+        llm = subprocess.Popen(
+            [sys.executable, 'mock_llm_server.py',
+             '--port', str(self.llm_port), '--latency', str(self.llm_latency)],
+            cwd=BACKEND_DIR
+        )
+        self.processes.append(llm)
+
+        env = dict(os.environ)
+        env.update({
+            'DATABASE_BACKEND': 'local',
+            'OPENROUTER_API_KEY': 'mock',
+            'OPENROUTER_API_BASE': f"http://127.0.0.1:{self.llm_port}/api/v1",
+        })
+        app = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'main:app',
+             '--host', '127.0.0.1', '--port', str(self.app_port),
+             '--log-level', 'warning', '--no-access-log'],
+            cwd=BACKEND_DIR, env=env
+        )
+        self.processes.append(app)
+        self.app_pid = app.pid
+
+        await self._wait_ready(f"http://127.0.0.1:{self.llm_port}/health")
+        await self._wait_ready(f"{self.base_url}/health")
+
+    async def _wait_ready(self, url: str, timeout: float = 20.0):
+        deadline = time.monotonic() + timeout
+        async with httpx.AsyncClient() as client:
+            while time.monotonic() < deadline:
+                try:
+                    if (await client.get(url)).status_code == 200:
+                        return
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(0.2)
+        raise RuntimeError(f"服务启动超时: {url}")
+
+    def stop(self):
+        for p in self.processes:
+            p.terminate()
+        for p in self.processes:
+            try:
+                p.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                p.kill()
+
+
+# ================================================================
+# 压测主体
+# ================================================================
+
+class Recorder:
+    """记录每个请求的延迟与状态"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.status_codes: Dict[str, Dict[str, int]] = {}
+
+    async def timed(self, name: str, coro):
+        start = time.perf_counter()
+        try:
+            response = await coro
+            status = str(response.status_code)
+            ok = response.status_code < 400
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+            ok = False
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        self.samples.setdefault(name, []).append(elapsed_ms)
+        codes = self.status_codes.setdefault(name, {})
+        codes[status] = codes.get(status, 0) + 1
+        if not ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self, wall_seconds: float) -> Dict[str, Dict]:
+        result = {}
+        for name, values in self.samples.items():
+            ordered = sorted(values)
+            result[name] = {
+                'requests': len(ordered),
+                'errors': self.errors.get(name, 0),
+                'status_codes': self.status_codes.get(name, {}),
+                'throughput_rps': round(len(ordered) / wall_seconds, 2) if wall_seconds else None,
+                'mean_ms': round(sum(ordered) / len(ordered), 2),
+                'p50_ms': round(_percentile(ordered, 50), 2),
+                'p95_ms': round(_percentile(ordered, 95), 2),
+                'p99_ms': round(_percentile(ordered, 99), 2),
+                'max_ms': round(ordered[-1], 2),
+            }
+        return result
+
+
+class MemorySampler:
+    """周期性采样后端进程内存"""
+
+    def __init__(self, pid: Optional[int], interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[int] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.pid is not None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            rss = _read_rss_kb(self.pid)
+            if rss is not None:
+                self.samples.append(rss)
+            await asyncio.sleep(self.interval)
+
+    async def stop(self) -> Dict:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        return {
+            'server_rss_start_kb': self.samples[0] if self.samples else None,
+            'server_rss_peak_kb': max(self.samples) if self.samples else None,
+            'server_rss_end_kb': self.samples[-1] if self.samples else None,
+            'client_maxrss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+
+
+async def run_benchmark(args, base_url: str, server_pid: Optional[int]) -> Dict:
+    """执行一轮课堂场景压测"""
+    recorder = Recorder()
+    memory = MemorySampler(server_pid)
+    session_id = args.session_id
+    rng = random.Random(args.seed)
+    factory = ResponseFactory(rng=random.Random(args.seed + 1))
+
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        memory.start()
+        burst_done = asyncio.Event()
+        started = time.perf_counter()
+
+        async def student(delay: float):
+            await asyncio.sleep(delay)
+            payload = generate_random_response(factory=factory)
+            payload['session_id'] = session_id
+            await recorder.timed('submit', client.post('/api/submit', json=payload))
+
+        async def dashboard():
+            # 各后台错开启动，模拟老师/助教陆续打开页面
+            await asyncio.sleep(rng.uniform(0, args.poll_interval))
+            while not burst_done.is_set():
+                await recorder.timed('stats', client.get('/api/stats', params={'session_id': session_id}))
+                try:
+                    await asyncio.wait_for(burst_done.wait(), timeout=args.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+        # 课堂上扫码提交通常集中在前段：三角分布，峰值在窗口前30%
+        delays = [rng.triangular(0, args.window, args.window * 0.3) for _ in range(args.students)]
+        dashboards = [asyncio.create_task(dashboard()) for _ in range(args.dashboards)]
+        await asyncio.gather(*(student(d) for d in delays))
+        burst_done.set()
+        await asyncio.gather(*dashboards)
+        burst_seconds = time.perf_counter() - started
+
+        # 提交结束后：导出与AI分析
+        for _ in range(args.exports):
+            await recorder.timed('export', client.get('/api/export', params={'session_id': session_id}))
+        for _ in range(args.analyses):
+            await recorder.timed('analyze', client.post('/api/analyze', json={'session_id': session_id}))
+
+        wall_seconds = time.perf_counter() - started
+        memory_stats = await memory.stop()
+
+    endpoints = recorder.summary(burst_seconds)
+    # 导出/分析不在集中提交窗口内，按其自身耗时计算吞吐
+    for name in ('export', 'analyze'):
+        if name in endpoints:
+            total_s = sum(recorder.samples[name]) / 1000
+            endpoints[name]['throughput_rps'] = round(len(recorder.samples[name]) / total_s, 2) if total_s else None
+
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'git_revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'base_url': base_url,
+            'params': {
+                'students': args.students,
+                'window_seconds': args.window,
+                'dashboards': args.dashboards,
+                'poll_interval_seconds': args.poll_interval,
+                'exports': args.exports,
+                'analyses': args.analyses,
+                'llm_latency_seconds': args.llm_latency,
+                'seed': args.seed,
+            },
+        },
+        'wall_seconds': round(wall_seconds, 3),
+        'burst_seconds': round(burst_seconds, 3),
+        'endpoints': endpoints,
+        'memory': memory_stats,
+    }
+
+
+def compare_with_baseline(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """与基线结果比较p95延迟，返回退化项列表"""
+    regressions = []
+    for name, current in results['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if not previous or not previous.get('p95_ms'):
+            continue
+        ratio = current['p95_ms'] / previous['p95_ms']
+        if ratio > 1 + tolerance:
+            regressions.append(
+                f"{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms (+{(ratio - 1) * 100:.0f}%)"
+            )
+    return regressions
+
+
+def print_report(results: Dict):
+    print(f"\n{'=' * 78}")
+    print(f"📊 压测结果  (提交窗口 {results['burst_seconds']}s, 总耗时 {results['wall_seconds']}s)")
+    print(f"{'=' * 78}")
+    print(f"{'接口':<10}{'请求数':>8}{'错误':>6}{'吞吐(rps)':>12}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+    for name, s in results['endpoints'].items():
+        print(f"{name:<10}{s['requests']:>8}{s['errors']:>6}{s['throughput_rps'] or 0:>12}"
+              f"{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}{s['max_ms']:>10}")
+    mem = results['memory']
+    if mem.get('server_rss_peak_kb'):
+        print(f"\n💾 后端内存: 起始 {mem['server_rss_start_kb'] / 1024:.1f}MB, "
+              f"峰值 {mem['server_rss_peak_kb'] / 1024:.1f}MB, 结束 {mem['server_rss_end_kb'] / 1024:.1f}MB")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="问卷系统课堂场景压测")
+    parser.add_argument('--students', type=int, default=200, help='提交问卷的学生数N')
+    parser.add_argument('--window', type=float, default=30.0, help='集中提交窗口T（秒）')
+    parser.add_argument('--dashboards', type=int, default=5, help='同时轮询统计的后台数M')
+    parser.add_argument('--poll-interval', type=float, default=5.0, help='后台轮询间隔（秒）')
+    parser.add_argument('--exports', type=int, default=3, help='提交结束后的导出次数')
+    parser.add_argument('--analyses', type=int, default=1, help='提交结束后的AI分析次数')
+    parser.add_argument('--llm-latency', type=float, default=1.0, help='模拟LLM平均延迟（秒）')
+    parser.add_argument('--session-id', default='BENCH_SESSION')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--timeout', type=float, default=120.0, help='单请求超时（秒）')
+    parser.add_argument('--max-connections', type=int, default=200)
+    parser.add_argument('--base-url', help='压测已启动的后端（不再启动本地服务）')
+    parser.add_argument('--output', default='bench_results.json', help='结果JSON文件')
+    parser.add_argument('--baseline', help='基线结果JSON，用于检测退化')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='p95允许退化比例')
+    args = parser.parse_args()
+
+    stack = None
+    if args.base_url:
+        base_url, server_pid = args.base_url.rstrip('/'), None
+    else:
+        print("🚀 启动本地后端（内存存储）和模拟LLM服务...")
+        stack = LocalStack(args.llm_latency)
+        await stack.start()
+        base_url, server_pid = stack.base_url, stack.app_pid
+
+    try:
+        print(f"🎓 模拟 {args.students} 名学生在 {args.window}s 内提交，{args.dashboards} 个后台轮询...")
+        results = await run_benchmark(args, base_url, server_pid)
+    finally:
+        if stack:
+            stack.stop()
+
+    print_report(results)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n📝 结果已写入: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("\n❌ 检测到性能退化:")
+            for item in regressions:
+                print(f"   - {item}")
+            sys.exit(1)
+        print("\n✅ 与基线相比无明显退化")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
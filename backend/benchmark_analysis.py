@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+AI分析吞吐量基准 - 离线、可复现
+
+启动本地模拟LLM服务（mock_llm_server.py），用固定种子生成的问卷统计数据并发执行N次分析
+（LLMAnalyzer指向模拟服务 + 内存存储保存结果），统计：
+  - 吞吐量（次/分钟）、单次分析耗时p50/p95、成功率
+  - 重试次数（429/5xx）、截断续写次数
+  - 模拟服务实际注入的故障
+
+同一组参数（含--seed）多次运行注入的故障相同，可用于对比重试/续写策略的改动。
+配合 --replay 使用录制的真实响应（见 mock_llm_server.py --record）。
+
+用法:
+    python benchmark_analysis.py --analyses 50 --concurrency 5
+    python benchmark_analysis.py --error-rate 0.2 --truncate-rate 0.1 --seed 7 --stream
+    python benchmark_analysis.py --replay cassettes/analysis.jsonl --output analysis_bench.json
+    python benchmark_analysis.py --segment-by q1 --analyses 5 --latency 2   # 分群分析（map-reduce）
+"""
+import os
+
+# 必须在导入database/llm_analyzer之前设置：使用内存存储，不连接Supabase；模拟服务不校验密钥
+os.environ.setdefault('DATABASE_BACKEND', 'local')
+os.environ.setdefault('OPENROUTER_API_KEY', 'mock')
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import httpx
+
+from benchmark import BACKEND_DIR, _free_port, _git_revision, _percentile
+from database import db
+from generate_test_data import generate_random_response
+from llm_analyzer import LLMAnalyzer
+from segment_stats import compute_segment_stats, resolve_segment_dimension
+
+SESSION_ID = 'bench-analysis'
+
+
+def start_mock(args, port: int) -> subprocess.Popen:
+    command = [
+        sys.executable, 'mock_llm_server.py', '--port', str(port),
+        '--latency', str(args.latency), '--jitter', '0',
+        '--tokens-per-second', str(args.tokens_per_second),
+        '--error-rate', str(args.error_rate), '--truncate-rate', str(args.truncate_rate),
+        '--seed', str(args.seed),
+    ]
+    if args.replay:
+        command += ['--replay', args.replay]
+    return subprocess.Popen(command, cwd=BACKEND_DIR)
+
+
+async def wait_ready(url: str, timeout: float = 20.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"服务启动超时: {url}")
+
+
+async def prepare_stats(responses: int, seed: int) -> tuple:
+    """返回 (全场统计, 问卷回答)"""
+    random.seed(seed)
+    rows = []
+    for _ in range(responses):
+        row = generate_random_response()
+        row['session_id'] = SESSION_ID
+        rows.append(row)
+    db.insert_responses(rows)
+    return await db.get_statistics(SESSION_ID), rows
+
+
+async def run(args, api_base: str) -> Dict:
+    stats, rows = await prepare_stats(args.responses, args.seed)
+    segments = compute_segment_stats(rows, resolve_segment_dimension(args.segment_by)) if args.segment_by else None
+    analyzer = LLMAnalyzer(api_base=api_base, api_key='mock')
+    analyzer.stream = args.stream
+    analyzer.retry_base_delay = args.retry_base_delay
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    durations: List[float] = []
+    outcomes = {'success': 0, 'failed': 0, 'continuations': 0, 'fill_missing': 0}
+    errors: Dict[str, int] = {}
+
+    async def one(index: int):
+        async with semaphore:
+            started = time.perf_counter()
+            if segments:
+                result = await analyzer.analyze_segmented(stats, segments, SESSION_ID)
+            else:
+                result = await analyzer.analyze_questionnaire(stats, SESSION_ID, use_simple_prompt=args.simple)
+            durations.append(time.perf_counter() - started)
+            if not result['success']:
+                outcomes['failed'] += 1
+                key = result['error'][:60]
+                errors[key] = errors.get(key, 0) + 1
+                return
+            outcomes['success'] += 1
+            repairs = result.get('repairs', [])
+            outcomes['continuations'] += repairs.count('continuation')
+            outcomes['fill_missing'] += repairs.count('fill_missing')
+            await asyncio.to_thread(
+                db.save_analysis_result, SESSION_ID, result['analysis_text'], result['model'],
+                result['total_responses'], result['stats_snapshot']
+            )
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.analyses)))
+    elapsed = time.perf_counter() - started
+
+    async with httpx.AsyncClient() as client:
+        mock_stats = (await client.get(api_base.rsplit('/api/', 1)[0] + '/mock/stats')).json()
+    model_stats = analyzer.router.stats(analyzer.model).summary()
+    durations.sort()
+
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'git_revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': {k: v for k, v in vars(args).items() if k != 'output'},
+        },
+        'results': {
+            'elapsed_seconds': round(elapsed, 3),
+            'analyses_per_minute': round(args.analyses / elapsed * 60, 1),
+            'latency_p50': round(_percentile(durations, 50), 3),
+            'latency_p95': round(_percentile(durations, 95), 3),
+            'success_rate': round(outcomes['success'] / args.analyses, 3),
+            **outcomes,
+            # 每次失败的请求（含之后重试成功的）都记入路由指标
+            'failed_requests': model_stats['failures'],
+            'requests': mock_stats['requests'],
+            'errors': errors,
+        },
+        'mock': {k: mock_stats[k] for k in ('replayed', 'canned', 'faults')},
+    }
+
+
+def print_report(report: Dict):
+    r = report['results']
+    print(f"\n{'=' * 60}")
+    print("📊 AI分析吞吐量基准（模拟LLM服务）")
+    print(f"{'=' * 60}")
+    print(f"⏱️  总耗时 {r['elapsed_seconds']}秒，吞吐量 {r['analyses_per_minute']} 次/分钟")
+    print(f"📈 单次分析 p50 {r['latency_p50']}秒，p95 {r['latency_p95']}秒")
+    print(f"✅ 成功率 {r['success_rate']:.1%}（成功 {r['success']}，失败 {r['failed']}）")
+    print(f"🔁 请求 {r['requests']} 次，其中失败 {r['failed_requests']} 次；"
+          f"截断续写 {r['continuations']} 次，补全字段 {r['fill_missing']} 次")
+    print(f"💥 注入故障: {report['mock']['faults'] or '无'}；回放 {report['mock']['replayed']}，内置 {report['mock']['canned']}")
+    for error, count in r['errors'].items():
+        print(f"   ❌ {count} × {error}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="AI分析吞吐量基准（离线）")
+    parser.add_argument('--analyses', type=int, default=30, help='分析次数')
+    parser.add_argument('--concurrency', type=int, default=5, help='并发分析数')
+    parser.add_argument('--responses', type=int, default=200, help='问卷样本数')
+    parser.add_argument('--simple', action='store_true', help='使用简化版提示词')
+    parser.add_argument('--stream', action='store_true', help='使用流式请求')
+    parser.add_argument('--segment-by', help='分群分析的维度（如q1、q2），各群体并发请求后合并')
+    parser.add_argument('--latency', type=float, default=0.5, help='模拟首token延迟（秒）')
+    parser.add_argument('--tokens-per-second', type=float, default=0, help='模拟输出速度，0表示不限速')
+    parser.add_argument('--error-rate', type=float, default=0, help='注入429/5xx的比例')
+    parser.add_argument('--truncate-rate', type=float, default=0, help='注入截断的比例')
+    parser.add_argument('--retry-base-delay', type=float, default=0.2, help='重试退避基数（秒）')
+    parser.add_argument('--replay', help='回放的录制文件')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='结果JSON文件')
+    args = parser.parse_args()
+
+    port = _free_port()
+    mock = start_mock(args, port)
+    try:
+        await wait_ready(f"http://127.0.0.1:{port}/health")
+        report = await run(args, f"http://127.0.0.1:{port}/api/v1")
+    finally:
+        mock.terminate()
+        mock.wait(timeout=5)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 结果已写入 {args.output}")
+    return 0 if report['results']['success'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+/api/submit 请求解码微基准 - 单核每秒可处理的提交数
+
+对比两条路径（都不访问数据库，只测请求体 -> 数据库行 -> 响应 的CPU开销）：
+  - legacy: FastAPI按参数类型解析（json.loads -> dict -> 模型校验），手工逐字段复制出数据库行，
+            返回模型再经response_model校验和jsonable_encoder序列化
+  - fast:   parse_submission() 由pydantic-core直接从字节解码并校验，to_row() 导出数据库行，
+            响应直接 model_dump_json()
+
+每组先测纯函数调用（decode），再经ASGI完整走一遍FastAPI路由（asgi），单进程单线程即单核吞吐。
+
+用法:
+    python benchmark_submit.py
+    python benchmark_submit.py --requests 20000 --output submit_bench.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import Response
+from pydantic import ValidationError
+
+from generate_test_data import generate_random_response
+from models import QuestionnaireSubmit, SubmitResponse, parse_submission
+
+FAKE_ID = '00000000-0000-4000-8000-000000000000'
+
+
+# ================================================================
+# 两条解码路径
+# ================================================================
+
+def legacy_row(data: QuestionnaireSubmit) -> dict:
+    """优化前main.py中的手工字段复制"""
+    row = {
+        'session_id': data.session_id,
+        'q1_industry': data.q1_industry,
+        'q1_industry_other': data.q1_industry_other,
+        'q2_role': data.q2_role,
+        'q2_role_other': data.q2_role_other,
+        'q3_digital_habit': data.q3_digital_habit,
+        'q4_ai_self_position': data.q4_ai_self_position,
+        'q5_ai_usage': data.q5_ai_usage,
+        'q6_org_stage': data.q6_org_stage,
+        'q7_personal_role': data.q7_personal_role,
+        'q8_pain_points': data.q8_pain_points,
+        'q9_attitude': data.q9_attitude,
+        'q10_constraints': data.q10_constraints,
+        'completion_time_seconds': data.completion_time_seconds,
+        'device_type': data.device_type,
+        'user_agent': data.user_agent,
+        'ip_hash': data.ip_hash
+    }
+    if data.client_submission_id:
+        row['client_submission_id'] = data.client_submission_id.lower()
+    return row
+
+
+def legacy_decode(body: bytes) -> dict:
+    return legacy_row(QuestionnaireSubmit(**json.loads(body)))
+
+
+def fast_decode(body: bytes) -> dict:
+    return parse_submission(body).to_row()
+
+
+def build_app() -> FastAPI:
+    """只包含两个提交路由的应用（不访问数据库）"""
+    app = FastAPI()
+
+    @app.post('/legacy', response_model=SubmitResponse)
+    async def legacy(data: QuestionnaireSubmit):
+        legacy_row(data)
+        return SubmitResponse(success=True, message="提交成功", id=FAKE_ID)
+
+    @app.post('/fast', response_model=SubmitResponse)
+    async def fast(request: Request):
+        try:
+            data = parse_submission(await request.body())
+        except ValidationError as e:
+            raise RequestValidationError(e.errors(include_url=False))
+        data.to_row()
+        body = SubmitResponse(success=True, message="提交成功", id=FAKE_ID).model_dump_json()
+        return Response(content=body, media_type="application/json")
+
+    return app
+
+
+# ================================================================
+# 计时
+# ================================================================
+
+def time_decode(func: Callable[[bytes], dict], bodies: List[bytes], requests: int) -> float:
+    """返回每秒处理次数"""
+    for body in bodies[:200]:
+        func(body)                                   # 预热
+    started = time.perf_counter()
+    for i in range(requests):
+        func(bodies[i % len(bodies)])
+    return requests / (time.perf_counter() - started)
+
+
+async def time_asgi(client: httpx.AsyncClient, path: str, bodies: List[bytes], requests: int) -> float:
+    headers = {'content-type': 'application/json'}
+    for body in bodies[:200]:
+        response = await client.post(path, content=body, headers=headers)
+        assert response.status_code == 200, response.text
+    started = time.perf_counter()
+    for i in range(requests):
+        await client.post(path, content=bodies[i % len(bodies)], headers=headers)
+    return requests / (time.perf_counter() - started)
+
+
+async def run(args) -> Dict:
+    random.seed(args.seed)
+    bodies = [json.dumps(generate_random_response(), ensure_ascii=False).encode('utf-8') for _ in range(args.samples)]
+
+    results = {}
+    for name, func in (('legacy', legacy_decode), ('fast', fast_decode)):
+        results[name] = {'decode_per_second': round(time_decode(func, bodies, args.requests))}
+
+    transport = httpx.ASGITransport(app=build_app())
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        asgi_requests = max(args.requests // 10, 1)
+        for name in ('legacy', 'fast'):
+            results[name]['asgi_requests_per_second'] = round(
+                await time_asgi(client, f'/{name}', bodies, asgi_requests)
+            )
+
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'requests': args.requests,
+            'samples': args.samples,
+        },
+        'results': results,
+        'speedup': {
+            key: round(results['fast'][key] / results['legacy'][key], 2)
+            for key in ('decode_per_second', 'asgi_requests_per_second')
+        },
+    }
+
+
+def print_report(report: Dict):
+    print(f"\n{'=' * 60}")
+    print("📊 /api/submit 解码微基准（单核）")
+    print(f"{'=' * 60}")
+    print(f"{'路径':<10}{'解码(次/秒)':>18}{'ASGI(请求/秒)':>20}")
+    for name, r in report['results'].items():
+        print(f"{name:<10}{r['decode_per_second']:>18}{r['asgi_requests_per_second']:>20}")
+    speedup = report['speedup']
+    print(f"\n⚡ fast/legacy: 解码 {speedup['decode_per_second']}x，ASGI {speedup['asgi_requests_per_second']}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/api/submit 请求解码微基准")
+    parser.add_argument('--requests', type=int, default=20000, help='纯解码的调用次数（ASGI为其1/10）')
+    parser.add_argument('--samples', type=int, default=500, help='随机问卷样本数')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='结果JSON文件')
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 结果已写入 {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
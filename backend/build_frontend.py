@@ -0,0 +1,245 @@
+"""
+前端构建脚本
+把 frontend/*.html 依赖的CDN资源（Tailwind、ECharts、supabase-js等）下载到本地，
+生成带内容哈希的文件名并预压缩（gzip/brotli），输出到 frontend/dist/，
+由后端 /static/ 以 immutable 缓存头直接提供，避免手机首次扫码时依赖第三方CDN。
+
+使用方法:
+    python build_frontend.py
+    python build_frontend.py --api-base-url ""        # 页面与API同源部署
+    python build_frontend.py --offline                # 只使用已缓存的第三方资源
+
+Tailwind: 如果能找到 tailwindcss 命令行（TAILWIND_BIN、PATH 或 npx），
+按页面实际用到的class编译出精简CSS并内联到<head>；否则退回自托管Play CDN脚本。
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import urllib.request
+from pathlib import Path
+from typing import Dict, Optional
+
+from questionnaire_config import questionnaire_config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+FRONTEND_DIR = Path(__file__).resolve().parent.parent / 'frontend'
+DEFAULT_OUT_DIR = FRONTEND_DIR / 'dist'
+VENDOR_CACHE_DIR = FRONTEND_DIR / '.vendor_cache'
+
+PAGES = ['questionnaire.html', 'dashboard.html', 'qrcode.html']
+
+TAILWIND_PLAY_CDN = 'https://cdn.tailwindcss.com'
+
+# 内联CSS的上限：首个TCP往返（约14KB）内能送达的大小，超过则作为外链样式表
+CRITICAL_CSS_BUDGET = 14 * 1024
+
+# 低于此大小的文件不做预压缩
+MIN_COMPRESS_SIZE = 256
+
+SCRIPT_TAG = re.compile(r'<script\s+src="(https?://[^"]+)"\s*>\s*</script>')
+STYLE_BLOCK = re.compile(r'<style>(.*?)</style>', re.S)
+API_BASE_URL = re.compile(r"(API_BASE_URL:\s*)'[^']*'")
+CONFIG_VERSION = re.compile(r"(CONFIG_VERSION:\s*)'[^']*'")
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def fetch_vendor(url: str, offline: bool = False) -> bytes:
+    """下载第三方资源（带本地缓存，重复构建不再访问CDN）"""
+    VENDOR_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    cached = VENDOR_CACHE_DIR / hashlib.sha256(url.encode()).hexdigest()[:16]
+    if cached.exists():
+        return cached.read_bytes()
+    if offline:
+        raise RuntimeError(f"离线模式下缺少缓存: {url}")
+
+    print(f"   ⬇️  下载 {url}")
+    request = urllib.request.Request(url, headers={'User-Agent': 'questionnaire-build'})
+    with urllib.request.urlopen(request, timeout=60) as response:
+        data = response.read()
+    cached.write_bytes(data)
+    return data
+
+
+def asset_name(url: str, data: bytes) -> str:
+    """echarts.min.js -> echarts.min.3f2a9c1b7d4e.js"""
+    base = url.rstrip('/').rsplit('/', 1)[-1].split('?')[0] or 'asset'
+    if '@' in base:
+        # 形如 supabase-js@2 的URL没有文件名
+        base = base.split('@')[0]
+    stem, _, ext = base.rpartition('.')
+    if ext not in ('js', 'css'):
+        # 域名形式（cdn.tailwindcss.com）或无扩展名
+        stem, ext = base.replace('.', '-'), 'js'
+    return f"{stem}.{content_hash(data)}.{ext}"
+
+
+def find_tailwind_cli() -> Optional[list]:
+    explicit = os.getenv('TAILWIND_BIN')
+    if explicit:
+        return [explicit]
+    if shutil.which('tailwindcss'):
+        return ['tailwindcss']
+    if shutil.which('npx'):
+        return ['npx', '--yes', 'tailwindcss@3']
+    return None
+
+
+def compile_tailwind(cli: list, html: str) -> Optional[str]:
+    """只编译页面中实际用到的class（包括脚本里动态添加的class字符串）"""
+    with tempfile.TemporaryDirectory() as tmp:
+        page = Path(tmp) / 'page.html'
+        page.write_text(html, encoding='utf-8')
+        source = Path(tmp) / 'input.css'
+        source.write_text('@tailwind base;\n@tailwind components;\n@tailwind utilities;\n')
+        output = Path(tmp) / 'output.css'
+        try:
+            subprocess.run(
+                cli + ['-i', str(source), '-o', str(output), '--content', str(page), '--minify'],
+                check=True, capture_output=True, timeout=180
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f"   ⚠️  Tailwind编译失败，改用自托管Play CDN: {e}")
+            return None
+        return output.read_text(encoding='utf-8')
+
+
+def precompress(path: Path):
+    """生成 .gz / .br 预压缩版本"""
+    data = path.read_bytes()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return
+    path.with_name(path.name + '.gz').write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        path.with_name(path.name + '.br').write_bytes(brotli.compress(data, quality=11))
+
+
+class FrontendBuilder:
+    """构建 frontend/dist"""
+
+    def __init__(self, out_dir: Path, offline: bool = False, api_base_url: Optional[str] = None):
+        self.out_dir = out_dir
+        self.assets_dir = out_dir / 'assets'
+        self.offline = offline
+        self.api_base_url = api_base_url
+        self.tailwind_cli = find_tailwind_cli()
+        self.tailwind_mode = 'play-cdn'
+        self.assets: Dict[str, str] = {}     # 原始URL/逻辑名 -> 带哈希的文件名
+
+    def emit_asset(self, key: str, name: str, data: bytes) -> str:
+        path = self.assets_dir / name
+        if not path.exists():
+            path.write_bytes(data)
+            precompress(path)
+        self.assets[key] = name
+        return f"assets/{name}"
+
+    def vendor_script(self, url: str) -> str:
+        if url in self.assets:
+            return f"assets/{self.assets[url]}"
+        data = fetch_vendor(url, self.offline)
+        return self.emit_asset(url, asset_name(url, data), data)
+
+    def build_page(self, page: str) -> Dict[str, int]:
+        html = (FRONTEND_DIR / page).read_text(encoding='utf-8')
+        if self.api_base_url is not None:
+            html = API_BASE_URL.sub(lambda m: f"{m.group(1)}'{self.api_base_url}'", html)
+        # 页面带上配置版本请求 /api/config?v=...，浏览器可长期缓存
+        html = CONFIG_VERSION.sub(lambda m: f"{m.group(1)}'{questionnaire_config.version}'", html)
+
+        compiled_css = None
+        if self.tailwind_cli and TAILWIND_PLAY_CDN in html:
+            compiled_css = compile_tailwind(self.tailwind_cli, html)
+            if compiled_css is None:
+                # 编译器不可用时其余页面不再尝试
+                self.tailwind_cli = None
+            else:
+                self.tailwind_mode = 'compiled'
+
+        def replace_script(match):
+            url = match.group(1)
+            if url.startswith(TAILWIND_PLAY_CDN) and compiled_css is not None:
+                return ''
+            # 页面只在load/DOMContentLoaded之后使用这些库，defer不阻塞首屏解析
+            defer = '' if url.startswith(TAILWIND_PLAY_CDN) else ' defer'
+            return f'<script src="{self.vendor_script(url)}"{defer}></script>'
+
+        html = SCRIPT_TAG.sub(replace_script, html)
+
+        css_bytes = 0
+        if compiled_css is not None:
+            css_bytes = len(compiled_css.encode('utf-8'))
+            page_css = ''.join(STYLE_BLOCK.findall(html))
+            if css_bytes + len(page_css.encode('utf-8')) <= CRITICAL_CSS_BUDGET:
+                tag = f'<style>{compiled_css}</style>'
+            else:
+                href = self.emit_asset(
+                    f'tailwind:{page}',
+                    f"{page.rsplit('.', 1)[0]}.{content_hash(compiled_css.encode())}.css",
+                    compiled_css.encode('utf-8')
+                )
+                tag = f'<link rel="stylesheet" href="{href}">'
+            html = html.replace('</title>', '</title>\n    ' + tag, 1)
+
+        out = self.out_dir / page
+        out.write_text(html, encoding='utf-8')
+        precompress(out)
+        return {'html_bytes': len(html.encode('utf-8')), 'tailwind_css_bytes': css_bytes}
+
+    def build(self) -> Dict:
+        if self.out_dir.exists():
+            shutil.rmtree(self.out_dir)
+        self.assets_dir.mkdir(parents=True)
+
+        pages = {}
+        for page in PAGES:
+            print(f"📄 构建 {page}")
+            pages[page] = self.build_page(page)
+
+        manifest = {
+            'pages': pages,
+            'assets': self.assets,
+            'tailwind': self.tailwind_mode,
+            'config_version': questionnaire_config.version,
+            'brotli': brotli is not None,
+        }
+        (self.out_dir / 'manifest.json').write_text(
+            json.dumps(manifest, ensure_ascii=False, indent=2), encoding='utf-8'
+        )
+        return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='构建前端静态资源')
+    parser.add_argument('--out', default=str(DEFAULT_OUT_DIR), help='输出目录')
+    parser.add_argument('--offline', action='store_true', help='只使用已缓存的第三方资源')
+    parser.add_argument('--api-base-url', default=None, help='替换页面中的CONFIG.API_BASE_URL')
+    args = parser.parse_args()
+
+    try:
+        manifest = FrontendBuilder(Path(args.out), args.offline, args.api_base_url).build()
+    except Exception as e:
+        print(f"❌ 构建失败: {e}")
+        sys.exit(1)
+
+    print(f"\n✅ 构建完成: {args.out}")
+    print(f"   Tailwind: {manifest['tailwind']}，brotli: {'是' if manifest['brotli'] else '否（pip install brotli）'}")
+    for name in sorted(manifest['assets'].values()):
+        print(f"   assets/{name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+"""
+批量导入问卷回答（线下/纸质问卷录入）
+流式解析CSV/NDJSON上传内容，逐行用QuestionnaireSubmit校验，按块批量插入数据库；
+单行错误只记录不中断，整批插入失败时逐行重试以定位出错的行
+"""
+import asyncio
+import csv
+import codecs
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from models import QuestionnaireSubmit
+
+# 每块校验/插入的行数
+CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', '500'))
+
+# 报告中最多返回的错误行数
+MAX_REPORTED_ERRORS = 1000
+
+ARRAY_FIELDS = {'q8_pain_points', 'q10_constraints'}
+INT_FIELDS = {
+    'q3_digital_habit', 'q4_ai_self_position', 'q5_ai_usage', 'q6_org_stage',
+    'q7_personal_role', 'q9_attitude', 'completion_time_seconds'
+}
+
+
+def detect_format(content_type: Optional[str], filename: Optional[str] = None) -> str:
+    """根据Content-Type/文件名判断格式，默认CSV"""
+    content_type = (content_type or '').lower()
+    name = (filename or '').lower()
+    if 'ndjson' in content_type or 'jsonl' in content_type or 'json' in content_type \
+            or name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return 'csv'
+
+
+def _parse_array(value: Any) -> Optional[List[str]]:
+    """支持JSON数组、PostgreSQL数组字面量 {a,b}、以及 a,b / a;b / a|b 分隔"""
+    if value is None or isinstance(value, list):
+        return value
+    text = str(value).strip()
+    if not text or text == '{}':
+        return [] if text == '{}' else None
+    if text.startswith('['):
+        return json.loads(text)
+    if text.startswith('{') and text.endswith('}'):
+        return [item.strip().strip('"') for item in next(csv.reader([text[1:-1]])) if item.strip()]
+    for sep in (';', '|', ','):
+        if sep in text:
+            return [item.strip() for item in text.split(sep) if item.strip()]
+    return [text]
+
+
+def _csv_int(value: str) -> Any:
+    """整数字段：整数值（含Excel导出的"3.0"）转为int，其余原样返回，交给模型校验报错"""
+    try:
+        number = float(value)
+    except ValueError:
+        return value
+    return int(number) if number.is_integer() else value
+
+
+def _csv_record(row: Dict[str, str]) -> Dict[str, Any]:
+    """CSV字符串值 -> 模型字段类型（空字符串视为未填写）"""
+    record: Dict[str, Any] = {}
+    for key, value in row.items():
+        if key is None:
+            continue
+        key = key.strip()
+        value = value.strip() if isinstance(value, str) else value
+        if value == '' or value is None:
+            continue
+        if key in ARRAY_FIELDS:
+            record[key] = _parse_array(value)
+        elif key in INT_FIELDS:
+            record[key] = _csv_int(value)
+        else:
+            record[key] = value
+    return record
+
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """字节流 -> 文本行（增量解码，去掉UTF-8 BOM）"""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    pending = ''
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            yield line
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+async def iter_records(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    流式解析上传内容（逐行产出，调用方按块校验和插入）
+
+    Yields:
+        (行号, 记录字典) 或 (行号, Exception)；行号为数据行序号（从1开始，不含CSV表头）
+    """
+    row_number = 0
+    if fmt == 'ndjson':
+        async for line in _iter_lines(chunks):
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError('每行必须是JSON对象')
+                yield row_number, record
+            except ValueError as e:
+                yield row_number, ValueError(f'JSON格式错误: {e}')
+        return
+
+    header: Optional[List[str]] = None
+    buffered = ''
+    async for line in _iter_lines(chunks):
+        # 引号内的换行：引号数为奇数说明记录未结束，与下一行拼接
+        buffered = f'{buffered}\n{line}' if buffered else line
+        if buffered.count('"') % 2:
+            continue
+        text, buffered = buffered.rstrip('\r'), ''
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [h.strip() for h in values]
+            continue
+        row_number += 1
+        if len(values) != len(header):
+            yield row_number, ValueError(f'列数不匹配: 表头{len(header)}列，本行{len(values)}列')
+            continue
+        try:
+            yield row_number, _csv_record(dict(zip(header, values)))
+        except ValueError as e:
+            yield row_number, ValueError(f'字段格式错误: {e}')
+    if buffered:
+        row_number += 1
+        yield row_number, ValueError('引号未闭合')
+
+
+def _format_validation_error(e: ValidationError) -> List[str]:
+    return [
+        f"{'.'.join(str(p) for p in err['loc']) or '(row)'}: {err['msg']}"
+        for err in e.errors()
+    ]
+
+
+def validate_record(record: Dict[str, Any], session_id: Optional[str]) -> Dict[str, Any]:
+    """
+    校验一行并转换为数据库字段
+
+    Raises:
+        ValidationError / ValueError: 校验失败
+    """
+    if session_id:
+        record['session_id'] = session_id
+    created_at = record.pop('created_at', None)
+    record.pop('id', None)
+    data = QuestionnaireSubmit.model_validate(record).to_row()
+    if created_at:
+        # 保留线下填写的时间
+        filled_at = datetime.fromisoformat(str(created_at).replace('Z', '+00:00'))
+        if filled_at.tzinfo is None:
+            filled_at = filled_at.replace(tzinfo=timezone.utc)   # 不带时区按UTC（与数据库会话时区一致）
+        data['created_at'] = filled_at.isoformat()
+    return data
+
+
+class ImportReport:
+    """导入结果统计"""
+
+    def __init__(self, fmt: str, dry_run: bool):
+        self.format = fmt
+        self.dry_run = dry_run
+        self.total_rows = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+        self.sessions = set()
+        self.earliest_created_at: Dict[str, str] = {}   # 场次 -> 已插入行中最早的线下填写时间
+        self.started = time.perf_counter()
+
+    def add_error(self, row: int, messages: List[str]):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row, 'errors': messages})
+
+    def add_inserted(self, rows: List[Dict[str, Any]]):
+        self.inserted += len(rows)
+        for data in rows:
+            created_at = data.get('created_at')
+            if not created_at:
+                continue
+            earliest = self.earliest_created_at.get(data['session_id'])
+            if earliest is None or datetime.fromisoformat(created_at) < datetime.fromisoformat(earliest):
+                self.earliest_created_at[data['session_id']] = created_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        return {
+            'success': self.failed == 0,
+            'format': self.format,
+            'dry_run': self.dry_run,
+            'total_rows': self.total_rows,
+            'inserted': self.inserted,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+            'sessions': sorted(self.sessions),
+            'earliest_created_at': self.earliest_created_at,
+            'elapsed_seconds': round(elapsed, 3),
+            'rows_per_second': round(self.total_rows / elapsed, 1) if elapsed > 0 else None,
+        }
+
+
+async def _insert_chunk(database, chunk: List[Tuple[int, Dict[str, Any]]], report: ImportReport):
+    """批量插入一块；整批失败（如IP重复）时逐行插入，只记录失败的行"""
+    rows = [data for _, data in chunk]
+    try:
+        await asyncio.to_thread(database.insert_responses, rows)
+        report.add_inserted(rows)
+        return
+    except Exception:
+        pass
+
+    for row, data in chunk:
+        try:
+            await asyncio.to_thread(database.insert_responses, [data])
+            report.add_inserted([data])
+        except Exception as e:
+            report.add_error(row, [str(e)])
+
+
+async def import_responses(
+    database,
+    chunks: AsyncIterator[bytes],
+    fmt: str,
+    session_id: Optional[str] = None,
+    dry_run: bool = False,
+    session_error: Optional[Callable[[str], Awaitable[Optional[str]]]] = None
+) -> Dict[str, Any]:
+    """
+    流式导入
+
+    Args:
+        database: Database实例
+        chunks: 上传内容的字节流
+        fmt: csv / ndjson
+        session_id: 指定场次（覆盖文件中的session_id）
+        dry_run: 只校验不写入
+        session_error: 场次 -> 拒绝原因（如场次已关闭），返回None表示接收；每个场次只检查一次
+
+    Returns:
+        导入报告（插入数、失败行及原因、耗时与吞吐量）
+    """
+    report = ImportReport(fmt, dry_run)
+    chunk: List[Tuple[int, Dict[str, Any]]] = []
+    checked: Dict[str, Optional[str]] = {}
+
+    async for row, record in iter_records(chunks, fmt):
+        report.total_rows += 1
+        if isinstance(record, Exception):
+            report.add_error(row, [str(record)])
+            continue
+        try:
+            data = validate_record(record, session_id)
+        except ValidationError as e:
+            report.add_error(row, _format_validation_error(e))
+            continue
+        except (TypeError, ValueError) as e:
+            report.add_error(row, [str(e)])
+            continue
+
+        if session_error is not None:
+            if data['session_id'] not in checked:
+                checked[data['session_id']] = await session_error(data['session_id'])
+            if checked[data['session_id']]:
+                report.add_error(row, [checked[data['session_id']]])
+                continue
+
+        report.sessions.add(data['session_id'])
+        chunk.append((row, data))
+        if len(chunk) >= CHUNK_SIZE:
+            if not dry_run:
+                await _insert_chunk(database, chunk, report)
+            chunk = []
+
+    if chunk and not dry_run:
+        await _insert_chunk(database, chunk, report)
+
+    return report.to_dict()
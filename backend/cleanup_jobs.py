@@ -0,0 +1,118 @@
+"""
+场次数据清理任务
+场次有独立的responses分区时直接清空分区（常数时间）；否则（回答在默认分区或数据库未迁移）
+在后台按批删除responses（每批CLEANUP_BATCH_SIZE行，批次之间让出CLEANUP_BATCH_PAUSE秒），
+避免一次性DELETE长时间持有锁、阻塞现场提交；进度可随时查询。
+回答删完后再清理分析结果、完成时间摘要和归档快照，并丢弃各处的内存缓存。
+"""
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+
+class CleanupJob:
+    """一次清理任务的进度"""
+
+    def __init__(self, session_id: str, batch_size: int):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.session_id = session_id
+        self.batch_size = batch_size
+        self.status = 'pending'           # pending -> running -> completed / failed
+        self.total: Optional[int] = None  # 开始时的回答数
+        self.deleted = 0
+        self.batches = 0
+        self.error: Optional[str] = None
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.finished_at: Optional[str] = None
+        self._started = time.monotonic()
+        self._elapsed: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ('completed', 'failed')
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = self._elapsed if self._elapsed is not None else time.monotonic() - self._started
+        progress = None
+        if self.total:
+            progress = round(min(self.deleted / self.total, 1.0), 3)
+        elif self.status == 'completed':
+            progress = 1.0
+        return {
+            'job_id': self.job_id,
+            'session_id': self.session_id,
+            'status': self.status,
+            'total': self.total,
+            'deleted': self.deleted,
+            'batches': self.batches,
+            'progress': progress,
+            'rows_per_second': round(self.deleted / elapsed, 1) if elapsed > 0 else None,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'error': self.error,
+        }
+
+
+class CleanupJobs:
+    """按场次管理清理任务（同一场次同时只运行一个）"""
+
+    def __init__(self, database, on_finished: Optional[Callable[[str], None]] = None):
+        self.db = database
+        self.on_finished = on_finished
+        self.batch_size = int(os.getenv('CLEANUP_BATCH_SIZE', '2000'))
+        self.batch_pause = float(os.getenv('CLEANUP_BATCH_PAUSE', '0.05'))
+        self._jobs: Dict[str, CleanupJob] = {}    # 场次 -> 最近一次任务
+        self._tasks = set()                       # 运行中的后台任务（事件循环只保留弱引用）
+
+    def start(self, session_id: str) -> CleanupJob:
+        """开始清理；该场次已有进行中的任务时直接返回它"""
+        job = self._jobs.get(session_id)
+        if job and not job.done:
+            return job
+
+        job = self._jobs[session_id] = CleanupJob(session_id, self.batch_size)
+        task = asyncio.get_running_loop().create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, session_id: str) -> Optional[CleanupJob]:
+        return self._jobs.get(session_id)
+
+    async def _run(self, job: CleanupJob):
+        job.status = 'running'
+        try:
+            job.total = await asyncio.to_thread(self.db.count_responses, job.session_id)
+            try:
+                if await asyncio.to_thread(self.db.truncate_session_partition, job.session_id):
+                    job.deleted = job.total
+                    job.batches = 1
+            except Exception as e:
+                # 分区正被长查询占用等情况，退回分批删除
+                print(f"⚠️  清空场次 {job.session_id} 分区失败，改为分批删除: {e}")
+            while True:
+                deleted = await asyncio.to_thread(self.db.delete_responses_batch, job.session_id, job.batch_size)
+                if not deleted:
+                    break
+                job.deleted += deleted
+                job.batches += 1
+                # 删除期间仍有新提交时总数随之增加
+                job.total = max(job.total, job.deleted)
+                await asyncio.sleep(self.batch_pause)
+
+            await asyncio.to_thread(self.db.cleanup_session_metadata, job.session_id)
+            job.status = 'completed'
+            print(f"🧹 场次 {job.session_id} 已清理：{job.deleted} 条回答，{job.batches} 批")
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+            print(f"❌ 清理场次 {job.session_id} 失败（已删除 {job.deleted} 条）: {e}")
+        finally:
+            job._elapsed = time.monotonic() - job._started
+            job.finished_at = datetime.now(timezone.utc).isoformat()
+            # 即使中途失败，部分数据也已删除，缓存同样需要丢弃
+            if self.on_finished is not None:
+                self.on_finished(job.session_id)
@@ -0,0 +1,177 @@
+"""
+完成时间分位数摘要
+按 场次 × 设备类型 维护completion_time_seconds的t-digest，持久化在session_sketches表中。
+
+摘要按 (created_at, id) 水位线增量折叠新提交：同一水位线下的摘要内容是确定的，
+多个worker并发更新时最多是较旧的水位线覆盖较新的（下次读取会再补上），不会重复计数。
+问卷前端直接写入Supabase，所以更新来源是responses表本身，而不只是本进程的/api/submit。
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from database import encode_cursor, precedes_cursor
+from tdigest import TDigest
+
+QUANTILES = {'p50': 0.5, 'p90': 0.9}
+
+
+class SessionSketch:
+    """单个场次的摘要状态"""
+
+    def __init__(self, digests: Dict[str, TDigest], response_count: int = 0, watermark: Optional[str] = None):
+        self.digests = digests              # 设备类型 -> t-digest
+        self.response_count = response_count
+        self.watermark = watermark          # 已折叠的最后一行 (created_at, id) 游标
+
+    def overall(self, compression: float) -> TDigest:
+        """合并所有设备类型的摘要"""
+        merged = TDigest(compression)
+        for digest in self.digests.values():
+            merged.merge(TDigest.from_dict(digest.to_dict()))
+        return merged
+
+
+class CompletionSketches:
+    """完成时间分位数摘要管理"""
+
+    def __init__(self, database):
+        self.db = database
+        self.compression = float(os.getenv('SKETCH_COMPRESSION', '100'))
+        # 只折叠settle秒之前的提交，避免并发事务按created_at乱序提交时漏掉行
+        self.settle_seconds = float(os.getenv('SKETCH_SETTLE_SECONDS', '1'))
+        self._states: Dict[str, SessionSketch] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._scheduled = set()
+
+    def _load(self, session_id: str) -> SessionSketch:
+        row = self.db.get_session_sketch(session_id)
+        if not row:
+            return SessionSketch({})
+        return SessionSketch(
+            {device: TDigest.from_dict(d) for device, d in (row.get('sketches') or {}).items()},
+            row.get('response_count') or 0,
+            row.get('watermark')
+        )
+
+    async def refresh(self, session_id: str) -> SessionSketch:
+        """把水位线之后的新提交折叠进摘要，有变化时写回数据库"""
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        async with lock:
+            state = self._states.get(session_id)
+            if state is None:
+                state = self._states[session_id] = self._load(session_id)
+
+            until = datetime.fromtimestamp(time.time() - self.settle_seconds, timezone.utc).isoformat()
+            changed = False
+            while True:
+                page = await self.db.list_responses(
+                    session_id,
+                    columns=['completion_time_seconds', 'device_type'],
+                    limit=1000,
+                    cursor=state.watermark,
+                    until=until,
+                    ascending=True,
+                    primary=True
+                )
+                for row in page['items']:
+                    if row.get('completion_time_seconds') is not None:
+                        device = row.get('device_type') or 'unknown'
+                        digest = state.digests.get(device)
+                        if digest is None:
+                            digest = state.digests[device] = TDigest(self.compression)
+                        digest.add(row['completion_time_seconds'])
+                    state.response_count += 1
+                if page['last']:
+                    state.watermark = encode_cursor(page['last']['created_at'], page['last']['id'])
+                    changed = True
+                if not page['has_more']:
+                    break
+
+            if changed:
+                self.db.save_session_sketch(
+                    session_id,
+                    {device: digest.to_dict() for device, digest in state.digests.items()},
+                    state.response_count,
+                    state.watermark
+                )
+            return state
+
+    def schedule_refresh(self, session_id: str):
+        """提交后在后台更新摘要（同一场次同时只排队一次）"""
+        if session_id in self._scheduled:
+            return
+        self._scheduled.add(session_id)
+
+        async def run():
+            await asyncio.sleep(self.settle_seconds)
+            self._scheduled.discard(session_id)
+            try:
+                await self.refresh(session_id)
+            except Exception as e:
+                print(f"⚠️  更新完成时间摘要失败: {e}")
+
+        asyncio.get_running_loop().create_task(run())
+
+    async def quantiles(self, session_id: str) -> Dict[str, Any]:
+        """
+        返回整体与各设备类型的完成时间分位数（查询开销只与centroid数量有关）
+
+        Returns:
+            {'all': {'p50': 150.0, 'p90': 320.0, 'count': 42}, 'mobile': {...}, 'desktop': {...}}
+        """
+        state = await self.refresh(session_id)
+        result = {'all': self._summary(state.overall(self.compression))}
+        for device, digest in sorted(state.digests.items()):
+            result[device] = self._summary(digest)
+        return result
+
+    async def merged_quantiles(self, session_ids: List[str]) -> Dict[str, Any]:
+        """合并多个场次的摘要后计算分位数（如同一课程的多个班次）"""
+        merged: Dict[str, TDigest] = {}
+        for session_id in session_ids:
+            state = await self.refresh(session_id)
+            for device, digest in state.digests.items():
+                merged.setdefault(device, TDigest(self.compression)).merge(
+                    TDigest.from_dict(digest.to_dict())
+                )
+        overall = TDigest(self.compression)
+        for digest in merged.values():
+            overall.merge(digest)
+        result = {'all': self._summary(overall)}
+        for device, digest in sorted(merged.items()):
+            result[device] = self._summary(digest)
+        return result
+
+    @staticmethod
+    def _summary(digest: TDigest) -> Dict[str, Any]:
+        summary = {}
+        for name, q in QUANTILES.items():
+            value = digest.quantile(q)
+            summary[name] = round(value, 1) if value is not None else None
+        summary['count'] = int(digest.count)
+        return summary
+
+    async def rebuild_if_behind(self, session_id: str, earliest_created_at: str) -> bool:
+        """
+        导入了早于水位线的回答（线下问卷保留原填写时间）时清空摘要，下次刷新从头折叠
+
+        Returns:
+            是否已清空
+        """
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        async with lock:
+            state = self._states.get(session_id)
+            if state is None:
+                state = self._states[session_id] = self._load(session_id)
+            if not precedes_cursor(earliest_created_at, state.watermark):
+                return False
+            self._states[session_id] = SessionSketch({})
+            self.db.save_session_sketch(session_id, {}, 0, None)
+            return True
+
+    def invalidate(self, session_id: str):
+        """场次数据被清理后丢弃内存状态"""
+        self._states.pop(session_id, None)
@@ -0,0 +1,131 @@
+"""
+交叉分析（列联表）
+在内存中对场次的问卷回答做二维/三维交叉计数，多选题（Q8/Q10）按选项展开
+"""
+from collections import Counter
+from itertools import product
+from typing import Any, Dict, List
+
+from questionnaire_config import questionnaire_config
+
+# 可参与交叉分析的维度：简写 -> responses列名
+DIMENSIONS = {
+    'q1': 'q1_industry',
+    'q2': 'q2_role',
+    'q3': 'q3_digital_habit',
+    'q4': 'q4_ai_self_position',
+    'q5': 'q5_ai_usage',
+    'q6': 'q6_org_stage',
+    'q7': 'q7_personal_role',
+    'q8': 'q8_pain_points',
+    'q9': 'q9_attitude',
+    'q10': 'q10_constraints',
+    'device': 'device_type',
+}
+
+# 多选题：一条回答按选项展开为多个计数
+MULTI_SELECT = {'q8_pain_points', 'q10_constraints'}
+
+NORMALIZE_MODES = ('none', 'row', 'col', 'all')
+
+# 缺失值（如Q10未选）在表中显示的键
+MISSING = '(空)'
+
+
+def resolve_dimensions(dims: List[str]) -> List[str]:
+    """把 q1 / q1_industry 等写法统一为列名，不合法时抛出ValueError"""
+    if not 2 <= len(dims) <= 3:
+        raise ValueError("交叉分析需要2或3个维度")
+    columns = []
+    for dim in dims:
+        dim = dim.strip().lower()
+        column = DIMENSIONS.get(dim) or (dim if dim in DIMENSIONS.values() else None)
+        if column is None:
+            raise ValueError(f"不支持的维度: {dim}（可选: {', '.join(DIMENSIONS)}）")
+        if column in columns:
+            raise ValueError(f"维度重复: {dim}")
+        columns.append(column)
+    return columns
+
+
+def _values(row: Dict[str, Any], column: str) -> List[Any]:
+    value = row.get(column)
+    if column in MULTI_SELECT:
+        return list(dict.fromkeys(value)) if value else [MISSING]
+    return [MISSING if value is None or value == '' else value]
+
+
+def _sort_keys(keys) -> List[Any]:
+    # 数值选项按大小排序，其他按字符串排序，缺失值放最后
+    return sorted(keys, key=lambda k: (k == MISSING, not isinstance(k, (int, float)), k if isinstance(k, (int, float)) else str(k)))
+
+
+def _normalize(matrix: List[List[int]], mode: str) -> List[List[float]]:
+    if mode == 'row':
+        return [[c / sum(row) if sum(row) else 0.0 for c in row] for row in matrix]
+    if mode == 'col':
+        col_totals = [sum(col) for col in zip(*matrix)] if matrix else []
+        return [[c / col_totals[j] if col_totals[j] else 0.0 for j, c in enumerate(row)] for row in matrix]
+    if mode == 'all':
+        total = sum(map(sum, matrix))
+        return [[c / total if total else 0.0 for c in row] for row in matrix]
+    return matrix
+
+
+def _table(counts: Counter, row_keys: List[Any], col_keys: List[Any], normalize: str) -> Dict:
+    matrix = [[counts.get((r, c), 0) for c in col_keys] for r in row_keys]
+    table = {
+        'matrix': matrix,
+        'row_totals': [sum(row) for row in matrix],
+        'col_totals': [sum(col) for col in zip(*matrix)] if matrix else [],
+        'total': sum(map(sum, matrix)),
+    }
+    if normalize != 'none':
+        table['normalized'] = [[round(v, 4) for v in row] for row in _normalize(matrix, normalize)]
+    return table
+
+
+def compute_crosstab(rows: List[Dict[str, Any]], columns: List[str], normalize: str = 'none') -> Dict:
+    """
+    计算列联表
+
+    Args:
+        rows: 问卷回答（至少包含columns中的列）
+        columns: 2或3个列名，依次为 行、列、分层
+        normalize: none / row / col / all，对应按行、按列、按总数计算占比
+
+    Returns:
+        二维: {'dimensions', 'rows', 'cols', 'matrix', 'row_totals', 'col_totals', 'total', 'labels'}
+        三维: 另含 'layers' 列表，每层为该分层取值下的二维表
+    """
+    if normalize not in NORMALIZE_MODES:
+        raise ValueError(f"normalize只能是: {', '.join(NORMALIZE_MODES)}")
+
+    # 行×列计数；三维时同时按第三个维度分层计数（多选分层时总表不重复计数）
+    counts: Counter = Counter()
+    layered: Dict[Any, Counter] = {}
+    for row in rows:
+        cells = list(product(*(_values(row, c) for c in columns[:2])))
+        counts.update(cells)
+        if len(columns) == 3:
+            for layer in _values(row, columns[2]):
+                layered.setdefault(layer, Counter()).update(cells)
+
+    row_keys = _sort_keys({r for r, _ in counts})
+    col_keys = _sort_keys({c for _, c in counts})
+
+    result: Dict[str, Any] = {
+        'dimensions': columns,
+        'respondents': len(rows),
+        'rows': row_keys,
+        'cols': col_keys,
+        'labels': {c: questionnaire_config.short_labels[c] for c in columns if c in questionnaire_config.short_labels},
+    }
+    result.update(_table(counts, row_keys, col_keys, normalize))
+
+    if len(columns) == 3:
+        result['layers'] = [
+            {'key': layer, **_table(layered[layer], row_keys, col_keys, normalize)}
+            for layer in _sort_keys(layered)
+        ]
+    return result
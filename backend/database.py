@@ -2,19 +2,84 @@
 Supabase数据库操作封装
 """
 import os
-from typing import Optional, List, Dict, Any
+import json
+import time
+import base64
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, Tuple
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
 # 加载环境变量
 load_dotenv()
 
+# responses表中允许查询的列（列投影白名单）
+RESPONSE_COLUMNS = [
+    'id', 'session_id', 'created_at',
+    'q1_industry', 'q1_industry_other',
+    'q2_role', 'q2_role_other',
+    'q3_digital_habit', 'q4_ai_self_position',
+    'q5_ai_usage', 'q6_org_stage', 'q7_personal_role',
+    'q8_pain_points', 'q9_attitude', 'q10_constraints',
+    'completion_time_seconds', 'user_agent', 'ip_hash', 'device_type',
+    'client_submission_id'
+]
+
+# 单页最大行数（需小于PostgREST的max-rows，避免被静默截断）
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(created_at: str, row_id: str) -> str:
+    """把翻页位置 (created_at, id) 编码为不透明的游标字符串"""
+    raw = json.dumps([created_at, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """解析游标，格式错误时抛出ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return str(created_at), str(row_id)
+    except Exception:
+        raise ValueError("无效的分页游标")
+
+
+def precedes_cursor(created_at: str, cursor: Optional[str]) -> bool:
+    """created_at是否不晚于游标位置（升序水位线已越过该时间，之后的增量读取不会再读到这样的行）"""
+    if not cursor:
+        return False
+    return _parse_time(created_at) <= _parse_time(decode_cursor(cursor)[0])
+
 
 class Database:
     """数据库操作类"""
     
     def __init__(self):
         """初始化Supabase客户端"""
+        # 已在sessions表登记过的场次（登记时触发器创建该场次的responses分区）
+        self._registered_sessions = set()
+        
+        # 只读副本：统计、导出、分页等读请求走副本，写入和需要读到刚写入数据的请求走主库
+        self.replica: Optional[Client] = None
+        # 副本最新提交时间落后主库超过此秒数时改读主库（0表示必须追平）
+        self.replica_max_lag = float(os.getenv('REPLICA_MAX_LAG_SECONDS', '0'))
+        # 每个场次重新比对主库/副本最新提交时间的间隔
+        self.replica_check_interval = float(os.getenv('REPLICA_CHECK_INTERVAL', '2'))
+        # 场次 -> {'primary': 主库最新created_at, 'replica': 副本最新created_at, 'checked': 比对时间}
+        self._replica_state: Dict[str, Dict[str, Any]] = {}
+        self._read_counts = {'replica': 0, 'primary': 0, 'lag_fallback': 0, 'replica_errors': 0}
+        
+        # 压测/离线开发时使用进程内存存储替身
+        if os.getenv('DATABASE_BACKEND', 'supabase') == 'local':
+            from local_store import LocalClient
+            self.client = LocalClient()
+            return
+        
         supabase_url = os.getenv('SUPABASE_URL')
         supabase_key = os.getenv('SUPABASE_SERVICE_KEY')  # 使用service_role key
         
@@ -22,6 +87,111 @@ class Database:
             raise ValueError("缺少SUPABASE_URL或SUPABASE_SERVICE_KEY环境变量")
         
         self.client: Client = create_client(supabase_url, supabase_key)
+        
+        replica_url = os.getenv('SUPABASE_REPLICA_URL')
+        if replica_url:
+            self.replica = create_client(replica_url, os.getenv('SUPABASE_REPLICA_KEY') or supabase_key)
+    
+    # ---------------- 读写分离 ----------------
+    
+    def _latest_created_at(self, client, session_id: str) -> Optional[datetime]:
+        result = client.table('responses')\
+            .select('created_at')\
+            .eq('session_id', session_id)\
+            .order('created_at', desc=True)\
+            .limit(1)\
+            .execute()
+        return _parse_time(result.data[0]['created_at']) if result.data else None
+    
+    def _replica_caught_up(self, state: Dict[str, Any]) -> bool:
+        """副本的最新提交时间与主库一致（或落后不超过REPLICA_MAX_LAG_SECONDS）"""
+        primary, replica = state['primary'], state['replica']
+        if primary is None or replica is None:
+            return primary is None and replica is None
+        # 副本比主库新说明主库删除了数据（如清理场次）而副本尚未同步
+        return primary - timedelta(seconds=self.replica_max_lag) <= replica <= primary
+    
+    def _reader(self, session_id: str, primary: bool = False):
+        """
+        选择读取场次回答的客户端
+        
+        副本的最新提交时间落后主库时改读主库。主库的最新提交时间每REPLICA_CHECK_INTERVAL秒查询一次，
+        本进程写入时立即更新，因此刚提交的数据总能读到；在此期间副本只在落后时重新查询。
+        """
+        if self.replica is None or primary:
+            self._read_counts['primary'] += 1
+            return self.client
+        
+        state = self._replica_state.setdefault(session_id, {'primary': None, 'replica': None, 'checked': None})
+        try:
+            if state['checked'] is None or time.monotonic() - state['checked'] >= self.replica_check_interval:
+                state['primary'] = self._latest_created_at(self.client, session_id)
+                state['replica'] = self._latest_created_at(self.replica, session_id)
+                state['checked'] = time.monotonic()
+            elif not self._replica_caught_up(state):
+                state['replica'] = self._latest_created_at(self.replica, session_id)
+        except Exception as e:
+            self._read_counts['replica_errors'] += 1
+            print(f"⚠️  比对副本延迟失败，改读主库: {e}")
+            state['checked'] = None
+            return self.client
+        
+        if self._replica_caught_up(state):
+            self._read_counts['replica'] += 1
+            return self.replica
+        self._read_counts['lag_fallback'] += 1
+        return self.client
+    
+    def _record_writes(self, rows: List[Dict[str, Any]]):
+        """记录本进程写入的最新提交时间，副本追上之前该场次改读主库"""
+        if self.replica is None:
+            return
+        for row in rows:
+            state = self._replica_state.get(row.get('session_id'))
+            if state is None or not row.get('created_at'):
+                continue
+            created_at = _parse_time(row['created_at'])
+            if state['primary'] is None or created_at > state['primary']:
+                state['primary'] = created_at
+    
+    def _record_delete(self, session_id: str):
+        """删除回答后下次读取时重新比对主库和副本"""
+        state = self._replica_state.get(session_id)
+        if state is not None:
+            state['checked'] = None
+    
+    def _read(self, session_id: str, query, primary: bool = False):
+        """用选定的客户端执行读取；副本出错时改用主库重试"""
+        client = self._reader(session_id, primary)
+        if client is self.client:
+            return query(client)
+        try:
+            return query(client)
+        except Exception as e:
+            self._read_counts['replica_errors'] += 1
+            print(f"⚠️  副本读取失败，改读主库: {e}")
+            return query(self.client)
+    
+    def routing_stats(self) -> Dict[str, Any]:
+        """读写分离状态（用于健康检查）"""
+        return {'replica': self.replica is not None, 'reads': dict(self._read_counts)}
+    
+    def _register_sessions(self, rows: List[Dict[str, Any]]):
+        """
+        首次写入某场次前在sessions表登记该场次，触发器随之为其创建responses分区
+        
+        每个进程每个场次只登记一次；登记失败不影响写入（回答落在默认分区，场次登记时再移入）
+        """
+        for session_id in {row.get('session_id') for row in rows} - self._registered_sessions:
+            if not session_id:
+                continue
+            try:
+                self.client.table('sessions')\
+                    .upsert({'session_id': session_id}, on_conflict='session_id', ignore_duplicates=True)\
+                    .execute()
+                self._registered_sessions.add(session_id)
+            except Exception as e:
+                print(f"⚠️  登记场次 {session_id} 失败: {e}")
     
     async def insert_response(self, data: Dict[str, Any]) -> str:
         """
@@ -36,10 +206,12 @@ class Database:
         Raises:
             Exception: 插入失败时抛出异常
         """
+        self._register_sessions([data])
         try:
             result = self.client.table('responses').insert(data).execute()
             
             if result.data and len(result.data) > 0:
+                self._record_writes(result.data)
                 return result.data[0]['id']
             else:
                 raise Exception("插入失败，未返回数据")
@@ -50,34 +222,113 @@ class Database:
                 raise Exception("您已经提交过问卷，请勿重复提交")
             raise Exception(f"数据库插入失败: {str(e)}")
     
-    async def get_statistics(self, session_id: str) -> Dict[str, Any]:
+    def insert_responses(self, rows: List[Dict[str, Any]]) -> List[str]:
+        """
+        批量插入问卷回答（单条INSERT语句，整批成功或整批失败）
+        
+        Args:
+            rows: 问卷数据字典列表
+            
+        Returns:
+            响应ID列表
+            
+        Raises:
+            Exception: 插入失败时抛出异常
+        """
+        self._register_sessions(rows)
+        try:
+            result = self.client.table('responses').insert(rows).execute()
+            self._record_writes(result.data or [])
+            return [row['id'] for row in result.data or []]
+            
+        except Exception as e:
+            if 'unique_ip_session' in str(e):
+                raise Exception("重复提交（同一IP/指纹在该场次已有回答）")
+            raise Exception(f"数据库插入失败: {str(e)}")
+    
+    def submit_idempotent(self, rows: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        按client_submission_id幂等写入（重试的请求不会产生重复数据）
+        
+        Args:
+            rows: 问卷数据字典列表，每行都必须带client_submission_id
+            
+        Returns:
+            client_submission_id -> {'status': 'created'/'duplicate'/'rejected', 'id': 响应ID, 'error': 错误信息}
+        """
+        self._register_sessions(rows)
+        results: Dict[str, Dict[str, Any]] = {}
+        try:
+            result = self.client.table('responses')\
+                .upsert(rows, on_conflict='session_id,client_submission_id', ignore_duplicates=True)\
+                .execute()
+            self._record_writes(result.data or [])
+            for row in result.data or []:
+                results[row['client_submission_id']] = {'status': 'created', 'id': row['id']}
+        except Exception as e:
+            # 整批失败（通常是同一设备重复提交），逐行写入以定位
+            if len(rows) > 1:
+                for row in rows:
+                    results.update(self.submit_idempotent([row]))
+                return results
+            if 'unique_ip_session' not in str(e):
+                raise Exception(f"数据库插入失败: {str(e)}")
+            results[rows[0]['client_submission_id']] = {
+                'status': 'rejected',
+                'error': '您已经提交过问卷，请勿重复提交'
+            }
+        
+        # 未返回的行是之前已经写入过的，查出原来的ID
+        missing = [row['client_submission_id'] for row in rows if row['client_submission_id'] not in results]
+        if missing:
+            # 带上场次条件，才能用上 (session_id, client_submission_id) 唯一索引并裁剪分区
+            sessions = list({row['session_id'] for row in rows if row['client_submission_id'] in missing})
+            try:
+                existing = self.client.table('responses')\
+                    .select('id,client_submission_id')\
+                    .in_('session_id', sessions)\
+                    .in_('client_submission_id', missing)\
+                    .execute()
+                for row in existing.data or []:
+                    results[row['client_submission_id']] = {'status': 'duplicate', 'id': row['id']}
+            except Exception as e:
+                raise Exception(f"查询已提交记录失败: {str(e)}")
+        
+        return results
+    
+    async def get_statistics(self, session_id: str, primary: bool = False) -> Dict[str, Any]:
         """
         获取问卷统计数据
         
         Args:
             session_id: 场次ID
+            primary: 强制读主库（如归档快照需要完整数据）
             
         Returns:
             统计数据字典
         """
-        try:
-            # 调用数据库函数获取统计
-            result = self.client.rpc(
+        def query(client):
+            # 调用数据库函数获取统计，最新提交时间与统计来自同一个库
+            result = client.rpc(
                 'get_session_statistics',
                 {'p_session_id': session_id}
             ).execute()
+            if not result.data:
+                return result, None
+            latest = client.table('responses')\
+                .select('created_at')\
+                .eq('session_id', session_id)\
+                .order('created_at', desc=True)\
+                .limit(1)\
+                .execute()
+            return result, latest
+        
+        try:
+            result, latest = self._read(session_id, query, primary)
             
             if result.data:
                 stats = result.data
                 
-                # 获取最新提交时间
-                latest = self.client.table('responses')\
-                    .select('created_at')\
-                    .eq('session_id', session_id)\
-                    .order('created_at', desc=True)\
-                    .limit(1)\
-                    .execute()
-                
                 if latest.data and len(latest.data) > 0:
                     from datetime import datetime, timezone
                     latest_time = datetime.fromisoformat(
@@ -96,21 +347,24 @@ class Database:
                 return stats
             
             # 如果函数返回空，手动查询
-            return await self._manual_statistics(session_id)
+            return await self._manual_statistics(session_id, primary)
             
         except Exception as e:
             print(f"获取统计失败: {str(e)}")
             # 降级到手动查询
-            return await self._manual_statistics(session_id)
+            return await self._manual_statistics(session_id, primary)
     
-    async def _manual_statistics(self, session_id: str) -> Dict[str, Any]:
+    async def _manual_statistics(self, session_id: str, primary: bool = False) -> Dict[str, Any]:
         """手动统计（备用方案）"""
         try:
             # 查询所有回答
-            responses = self.client.table('responses')\
-                .select('*')\
-                .eq('session_id', session_id)\
-                .execute()
+            def query(client):
+                return client.table('responses')\
+                    .select('*')\
+                    .eq('session_id', session_id)\
+                    .execute()
+            
+            responses = self._read(session_id, query, primary)
             
             if not responses.data:
                 return {
@@ -184,34 +438,412 @@ class Database:
         except Exception as e:
             raise Exception(f"手动统计失败: {str(e)}")
     
-    async def get_all_responses(self, session_id: str) -> List[Dict[str, Any]]:
+    async def get_all_responses(
+        self,
+        session_id: str,
+        columns: Optional[List[str]] = None,
+        primary: bool = False
+    ) -> List[Dict[str, Any]]:
         """
-        获取所有问卷回答
+        获取所有问卷回答（按页读取，避免被PostgREST的max-rows截断）
         
         Args:
             session_id: 场次ID
+            columns: 需要返回的列（默认全部列）
+            primary: 强制读主库
             
         Returns:
             问卷回答列表
         """
-        try:
-            result = self.client.table('responses')\
-                .select('*')\
+        responses = []
+        cursor = None
+        while True:
+            page = await self.list_responses(
+                session_id, columns=columns, limit=MAX_PAGE_SIZE, cursor=cursor, primary=primary
+            )
+            responses.extend(page['items'])
+            cursor = page['next_cursor']
+            if not cursor:
+                return responses
+    
+    async def get_session_version(self, session_id: str, primary: bool = False) -> str:
+        """
+        获取场次数据版本（回答数 + 最新提交时间），用于判断缓存是否失效
+        
+        Args:
+            session_id: 场次ID
+            primary: 强制读主库
+            
+        Returns:
+            版本字符串，如 "42:2025-11-14T10:00:00.123456+00:00"
+        """
+        def query(client):
+            return client.table('responses')\
+                .select('created_at', count='exact')\
                 .eq('session_id', session_id)\
                 .order('created_at', desc=True)\
+                .limit(1)\
+                .execute()
+        
+        try:
+            result = self._read(session_id, query, primary)
+            
+            latest = result.data[0]['created_at'] if result.data else ''
+            return f"{result.count or 0}:{latest}"
+            
+        except Exception as e:
+            raise Exception(f"查询场次版本失败: {str(e)}")
+    
+    async def list_responses(
+        self,
+        session_id: str,
+        columns: Optional[List[str]] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        industry: Optional[str] = None,
+        role: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        ascending: bool = False,
+        primary: bool = False
+    ) -> Dict[str, Any]:
+        """
+        分页查询问卷回答（按 (created_at, id) 的键集分页，默认从新到旧）
+        
+        Args:
+            session_id: 场次ID
+            columns: 需要返回的列（默认全部列），id和created_at总会返回用于生成游标
+            limit: 每页行数（1-MAX_PAGE_SIZE）
+            cursor: 上一页返回的next_cursor
+            industry: 按Q1机构类型筛选
+            role: 按Q2工作方向筛选
+            since: 起始时间（含），ISO 8601
+            until: 截止时间（不含），ISO 8601
+            ascending: 从旧到新翻页（用于按水位线增量读取）
+            primary: 强制读主库（按水位线增量读取时副本的延迟会导致漏行）
+            
+        Returns:
+            {'items': [...], 'next_cursor': str或None, 'has_more': bool,
+             'last': 本页最后一行的 {'created_at', 'id'}，空页为None}
+            
+        Raises:
+            ValueError: 参数不合法
+            Exception: 查询失败
+        """
+        if columns:
+            unknown = [c for c in columns if c not in RESPONSE_COLUMNS]
+            if unknown:
+                raise ValueError(f"未知的列: {', '.join(unknown)}")
+            selected = list(dict.fromkeys(['id', 'created_at'] + list(columns)))
+        else:
+            selected = RESPONSE_COLUMNS
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        position = decode_cursor(cursor) if cursor else None
+        
+        def page_query(client):
+            query = client.table('responses')\
+                .select(','.join(selected))\
+                .eq('session_id', session_id)
+            
+            if industry:
+                query = query.eq('q1_industry', industry)
+            if role:
+                query = query.eq('q2_role', role)
+            if since:
+                query = query.gte('created_at', since)
+            if until:
+                query = query.lt('created_at', until)
+            if position:
+                created_at, row_id = position
+                op = 'gt' if ascending else 'lt'
+                query = query.or_(
+                    f'created_at.{op}."{created_at}",'
+                    f'and(created_at.eq."{created_at}",id.{op}."{row_id}")'
+                )
+            
+            # 多取一行用于判断是否还有下一页
+            return query\
+                .order('created_at', desc=not ascending)\
+                .order('id', desc=not ascending)\
+                .limit(limit + 1)\
                 .execute()
+        
+        try:
+            result = self._read(session_id, page_query, primary)
+            rows = result.data or []
+            has_more = len(rows) > limit
+            items = rows[:limit]
+            
+            last = {'created_at': items[-1]['created_at'], 'id': items[-1]['id']} if items else None
+            next_cursor = encode_cursor(last['created_at'], last['id']) if has_more else None
             
-            return result.data if result.data else []
+            if columns:
+                items = [{c: row.get(c) for c in columns} for row in items]
+            
+            return {
+                'items': items,
+                'next_cursor': next_cursor,
+                'has_more': has_more,
+                'last': last
+            }
             
         except Exception as e:
             raise Exception(f"查询失败: {str(e)}")
     
+    def get_session_sketch(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取场次的完成时间分位数摘要
+        
+        Args:
+            session_id: 场次ID
+            
+        Returns:
+            {'sketches': {设备类型: t-digest}, 'response_count': int, 'watermark': 游标} 或None
+        """
+        try:
+            result = self.client.table('session_sketches')\
+                .select('sketches,response_count,watermark')\
+                .eq('session_id', session_id)\
+                .limit(1)\
+                .execute()
+            
+            return result.data[0] if result.data else None
+            
+        except Exception as e:
+            raise Exception(f"获取分位数摘要失败: {str(e)}")
+    
+    def save_session_sketch(
+        self,
+        session_id: str,
+        sketches: Dict[str, Any],
+        response_count: int,
+        watermark: Optional[str]
+    ):
+        """
+        保存场次的完成时间分位数摘要
+        
+        Args:
+            session_id: 场次ID
+            sketches: 设备类型 -> 序列化后的t-digest
+            response_count: 已折叠的回答数
+            watermark: 已折叠的最后一行的分页游标
+        """
+        try:
+            self.client.table('session_sketches')\
+                .upsert({
+                    'session_id': session_id,
+                    'sketches': sketches,
+                    'response_count': response_count,
+                    'watermark': watermark
+                }, on_conflict='session_id')\
+                .execute()
+            
+        except Exception as e:
+            raise Exception(f"保存分位数摘要失败: {str(e)}")
+    
+    def get_free_text_index(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取场次的"其他"自由填写答案聚类索引
+        
+        Args:
+            session_id: 场次ID
+            
+        Returns:
+            {'clusters': {自由填写列: 序列化的聚类}, 'response_count': int, 'watermark': 游标} 或None
+        """
+        try:
+            result = self.client.table('session_free_text')\
+                .select('clusters,response_count,watermark')\
+                .eq('session_id', session_id)\
+                .limit(1)\
+                .execute()
+            
+            return result.data[0] if result.data else None
+            
+        except Exception as e:
+            raise Exception(f"获取自由填写索引失败: {str(e)}")
+    
+    def save_free_text_index(
+        self,
+        session_id: str,
+        clusters: Dict[str, Any],
+        response_count: int,
+        watermark: Optional[str]
+    ):
+        """
+        保存场次的"其他"自由填写答案聚类索引
+        
+        Args:
+            session_id: 场次ID
+            clusters: 自由填写列 -> 序列化后的聚类
+            response_count: 已折叠的回答数
+            watermark: 已折叠的最后一行的分页游标
+        """
+        try:
+            self.client.table('session_free_text')\
+                .upsert({
+                    'session_id': session_id,
+                    'clusters': clusters,
+                    'response_count': response_count,
+                    'watermark': watermark
+                }, on_conflict='session_id')\
+                .execute()
+            
+        except Exception as e:
+            raise Exception(f"保存自由填写索引失败: {str(e)}")
+    
+    def set_session_active(self, session_id: str, active: bool):
+        """
+        开启/关闭场次（sessions表中没有该场次时自动创建）
+        
+        Args:
+            session_id: 场次ID
+            active: True为开启，False为关闭（同时记录结束时间）
+        """
+        try:
+            from datetime import datetime, timezone
+            self.client.table('sessions')\
+                .upsert({
+                    'session_id': session_id,
+                    'is_active': active,
+                    'end_time': None if active else datetime.now(timezone.utc).isoformat()
+                }, on_conflict='session_id')\
+                .execute()
+            
+        except Exception as e:
+            raise Exception(f"更新场次状态失败: {str(e)}")
+    
+    def get_session_snapshot_etag(self, session_id: str) -> Optional[str]:
+        """
+        获取场次归档快照的ETag（只查一列，用于校验进程内缓存）
+        
+        Returns:
+            ETag，场次未归档时返回None
+        """
+        try:
+            result = self.client.table('session_snapshots')\
+                .select('etag')\
+                .eq('session_id', session_id)\
+                .limit(1)\
+                .execute()
+            
+            return result.data[0]['etag'] if result.data else None
+            
+        except Exception as e:
+            raise Exception(f"获取归档快照失败: {str(e)}")
+    
+    def get_session_snapshot(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取场次归档快照
+        
+        Returns:
+            {'etag', 'response_count', 'stats', 'analysis', 'export_csv_gz', 'finalized_at'} 或None
+        """
+        try:
+            result = self.client.table('session_snapshots')\
+                .select('*')\
+                .eq('session_id', session_id)\
+                .limit(1)\
+                .execute()
+            
+            return result.data[0] if result.data else None
+            
+        except Exception as e:
+            raise Exception(f"获取归档快照失败: {str(e)}")
+    
+    def save_session_snapshot(self, snapshot: Dict[str, Any]):
+        """
+        保存场次归档快照（同一场次重新归档时覆盖）
+        
+        Args:
+            snapshot: session_snapshots表的一行
+        """
+        try:
+            self.client.table('session_snapshots')\
+                .upsert(snapshot, on_conflict='session_id')\
+                .execute()
+            
+        except Exception as e:
+            raise Exception(f"保存归档快照失败: {str(e)}")
+    
+    def delete_session_snapshot(self, session_id: str):
+        """删除场次归档快照（重新开启场次时）"""
+        try:
+            self.client.table('session_snapshots')\
+                .delete()\
+                .eq('session_id', session_id)\
+                .execute()
+            
+        except Exception as e:
+            raise Exception(f"删除归档快照失败: {str(e)}")
+    
+    def count_responses(self, session_id: str) -> int:
+        """统计场次的回答数（只返回计数，不读取行）"""
+        try:
+            result = self.client.table('responses')\
+                .select('id', count='exact')\
+                .eq('session_id', session_id)\
+                .limit(1)\
+                .execute()
+            return result.count or 0
+        
+        except Exception as e:
+            raise Exception(f"统计回答数失败: {str(e)}")
+    
+    def delete_responses_batch(self, session_id: str, batch_size: int) -> int:
+        """
+        删除场次的一批回答
+        
+        Args:
+            session_id: 场次ID
+            batch_size: 本批最多删除的行数
+        
+        Returns:
+            实际删除的行数（0表示已删完）
+        """
+        try:
+            result = self.client.rpc('cleanup_session_batch', {
+                'p_session_id': session_id,
+                'p_batch_size': batch_size
+            }).execute()
+            self._record_delete(session_id)
+            return result.data or 0
+        
+        except Exception as e:
+            raise Exception(f"分批删除回答失败: {str(e)}")
+    
+    def truncate_session_partition(self, session_id: str) -> bool:
+        """
+        清空场次的responses分区（常数时间，不逐行删除）
+        
+        Returns:
+            是否已清空；场次没有独立分区或数据库尚未迁移到分区表时返回False，需改为分批删除
+        """
+        try:
+            result = self.client.rpc('truncate_session_partition', {'p_session_id': session_id}).execute()
+            self._record_delete(session_id)
+            return bool(result.data)
+        
+        except Exception as e:
+            if 'Could not find the function' in str(e):
+                return False
+            raise Exception(f"清空场次分区失败: {str(e)}")
+    
+    def cleanup_session_metadata(self, session_id: str):
+        """清理场次的分析结果、完成时间摘要和归档快照，并重新开放提交"""
+        try:
+            self.client.rpc('cleanup_session_metadata', {'p_session_id': session_id}).execute()
+        
+        except Exception as e:
+            raise Exception(f"清理场次元数据失败: {str(e)}")
+    
     def save_analysis_result(
         self, 
         session_id: str, 
         analysis_text: str,
         model_name: str,
-        total_responses: int
+        total_responses: int,
+        stats_snapshot: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """
         保存AI分析结果到数据库
@@ -221,6 +853,7 @@ class Database:
             analysis_text: 分析文本
             model_name: 使用的模型名称
             total_responses: 分析的问卷数量
+            stats_snapshot: 分析时的统计快照（用于下次增量分析）
         
         Returns:
             保存的记录
@@ -230,7 +863,8 @@ class Database:
                 'session_id': session_id,
                 'analysis_text': analysis_text,
                 'model_name': model_name,
-                'total_responses': total_responses
+                'total_responses': total_responses,
+                'stats_snapshot': stats_snapshot
             }
             
             result = self.client.table('analysis_results')\
@@ -275,6 +909,28 @@ class Database:
             if "404" in str(e) or "No rows" in str(e):
                 return None
             raise Exception(f"获取分析结果失败: {str(e)}")
+    
+    def get_analysis_snapshot(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取上次分析时保存的统计快照（增量分析用，不随分析结果返回给前端）
+        
+        Args:
+            session_id: 会话ID
+        
+        Returns:
+            统计快照，没有分析结果或旧结果未保存快照时返回None
+        """
+        try:
+            result = self.client.table('analysis_results')\
+                .select('stats_snapshot')\
+                .eq('session_id', session_id)\
+                .limit(1)\
+                .execute()
+            
+            return result.data[0].get('stats_snapshot') if result.data else None
+            
+        except Exception as e:
+            raise Exception(f"获取统计快照失败: {str(e)}")
 
 
 # 全局数据库实例
@@ -0,0 +1,149 @@
+"""
+"其他"自由填写答案的归一化索引
+按场次维护 q1_industry_other / q2_role_other 的聚类（text_clusters.TextClusterer），持久化在session_free_text表中。
+
+与完成时间摘要（completion_sketch.py）相同，按 (created_at, id) 水位线增量折叠新提交：
+每条答案只在首次折叠时分配一次簇，读取统计时只返回 簇 -> 人数，不需要每次重新聚类。
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from database import encode_cursor, precedes_cursor
+from text_clusters import TextClusterer
+
+# 自由填写列 -> 对应的统计分布字段
+FREE_TEXT_FIELDS = {
+    'q1_industry_other': 'industries',
+    'q2_role_other': 'roles',
+}
+
+
+class SessionFreeText:
+    """单个场次的聚类状态"""
+
+    def __init__(self, clusterers: Dict[str, TextClusterer], response_count: int = 0, watermark: Optional[str] = None):
+        self.clusterers = clusterers        # 自由填写列 -> 聚类
+        self.response_count = response_count
+        self.watermark = watermark          # 已折叠的最后一行 (created_at, id) 游标
+
+
+class FreeTextIndex:
+    """自由填写答案索引管理"""
+
+    def __init__(self, database):
+        self.db = database
+        self.threshold = float(os.getenv('FREE_TEXT_SIMILARITY', '0.45'))
+        self.max_clusters = int(os.getenv('FREE_TEXT_MAX_CLUSTERS', '20'))
+        # 只折叠settle秒之前的提交，避免并发事务按created_at乱序提交时漏掉行
+        self.settle_seconds = float(os.getenv('SKETCH_SETTLE_SECONDS', '1'))
+        self._states: Dict[str, SessionFreeText] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._scheduled = set()
+
+    def _clusterer(self, data: Optional[Dict[str, Any]] = None) -> TextClusterer:
+        if data:
+            return TextClusterer.from_dict(data, threshold=self.threshold)
+        return TextClusterer(threshold=self.threshold)
+
+    def _load(self, session_id: str) -> SessionFreeText:
+        row = self.db.get_free_text_index(session_id) or {}
+        saved = row.get('clusters') or {}
+        return SessionFreeText(
+            {field: self._clusterer(saved.get(field)) for field in FREE_TEXT_FIELDS},
+            row.get('response_count') or 0,
+            row.get('watermark')
+        )
+
+    async def refresh(self, session_id: str) -> SessionFreeText:
+        """把水位线之后的新提交的自由填写答案分配到簇，有变化时写回数据库"""
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        async with lock:
+            state = self._states.get(session_id)
+            if state is None:
+                state = self._states[session_id] = self._load(session_id)
+
+            until = datetime.fromtimestamp(time.time() - self.settle_seconds, timezone.utc).isoformat()
+            changed = False
+            while True:
+                page = await self.db.list_responses(
+                    session_id,
+                    columns=list(FREE_TEXT_FIELDS),
+                    limit=1000,
+                    cursor=state.watermark,
+                    until=until,
+                    ascending=True,
+                    primary=True
+                )
+                for row in page['items']:
+                    for field, clusterer in state.clusterers.items():
+                        if row.get(field):
+                            clusterer.add(row[field])
+                    state.response_count += 1
+                if page['last']:
+                    state.watermark = encode_cursor(page['last']['created_at'], page['last']['id'])
+                    changed = True
+                if not page['has_more']:
+                    break
+
+            if changed:
+                self.db.save_free_text_index(
+                    session_id,
+                    {field: clusterer.to_dict() for field, clusterer in state.clusterers.items()},
+                    state.response_count,
+                    state.watermark
+                )
+            return state
+
+    def schedule_refresh(self, session_id: str):
+        """提交后在后台归类（同一场次同时只排队一次）"""
+        if session_id in self._scheduled:
+            return
+        self._scheduled.add(session_id)
+
+        async def run():
+            await asyncio.sleep(self.settle_seconds)
+            self._scheduled.discard(session_id)
+            try:
+                await self.refresh(session_id)
+            except Exception as e:
+                print(f"⚠️  更新自由填写索引失败: {e}")
+
+        asyncio.get_running_loop().create_task(run())
+
+    async def summary(self, session_id: str) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        各分布中"其他"选项的细分（按人数从多到少，最多FREE_TEXT_MAX_CLUSTERS个簇）
+
+        Returns:
+            {'industries': [{'label': '金融监管', 'count': 5, 'variants': ['金融监管机构', '监管机构']}], 'roles': [...]}
+        """
+        state = await self.refresh(session_id)
+        return {
+            stats_key: state.clusterers[field].summary(self.max_clusters)
+            for field, stats_key in FREE_TEXT_FIELDS.items()
+        }
+
+    async def rebuild_if_behind(self, session_id: str, earliest_created_at: str) -> bool:
+        """
+        导入了早于水位线的回答（线下问卷保留原填写时间）时清空索引，下次刷新从头折叠
+
+        Returns:
+            是否已清空
+        """
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        async with lock:
+            state = self._states.get(session_id)
+            if state is None:
+                state = self._states[session_id] = self._load(session_id)
+            if not precedes_cursor(earliest_created_at, state.watermark):
+                return False
+            self._states[session_id] = SessionFreeText({field: self._clusterer() for field in FREE_TEXT_FIELDS})
+            self.db.save_free_text_index(session_id, {}, 0, None)
+            return True
+
+    def invalidate(self, session_id: str):
+        """场次数据被清理后丢弃内存状态"""
+        self._states.pop(session_id, None)
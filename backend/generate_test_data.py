@@ -1,211 +1,473 @@
 #!/usr/bin/env python3
 """
-生成测试问卷数据并提交到Supabase
-匹配前端questionnaire.html的实际字段结构
+生成测试问卷数据并提交到Supabase（或直接写入文件）
+选项取自questionnaire_config.json，与前端questionnaire.html的实际提交值一致
+
+用法:
+    python generate_test_data.py                                   # 默认场次生成20条并写入数据库
+    python generate_test_data.py --sessions 50 --per-session 2000  # 50个场次，每场约2000条
+    python generate_test_data.py --sessions 500 --per-session 2000 --output perf.csv
+    python generate_test_data.py --total 1000000 --sessions 500 --output perf.parquet
+
+写入数据库时按批次并发插入（--batch-size / --concurrency），并实时打印进度与吞吐量。
+CSV中的数组字段使用PostgreSQL数组字面量（{a,b}），可直接用COPY导入responses表。
 """
-import random
-import hashlib
+import argparse
 import asyncio
-from database import db
-
-# 问卷选项定义（匹配前端）
-Q1_INDUSTRIES = [
-    "银行（含政策性银行、商业银行）",
-    "证券公司",
-    "基金公司（公募 / 私募 / 资管）",
-    "期货公司",
-    "保险公司",
-    "信托公司",
-    "其他持牌金融机构（如消费金融、金融租赁、金控集团等）",
-    "金融科技公司（非持牌）"
-]
+import csv
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional
 
-Q2_ROLES = [
-    "对公 / 公司金融业务",
-    "对私 / 零售 / 财富管理",
-    "投研 / 交易 / 资产管理",
-    "风险管理 / 合规 / 内控",
-    "运营 / 清结算 / 托管",
-    "科技 / 数据 / IT",
-    "产品开发 / 创新",
-    "战略 / 规划 / 综合管理"
-]
+DEFAULT_SESSION_ID = 'SJTU_SAIF_20251114'
 
-Q8_PAIN_POINTS = [
-    "数据质量和标准化问题",
-    "模型可解释性和信任度不足",
-    "技术落地和产品化困难",
-    "缺乏专业人才",
-    "监管合规和风险管理挑战",
-    "与现有系统集成复杂",
-    "投入产出比不明确",
-    "内部认知和推动阻力",
-    "供应商选择和评估困难"
+# 写入responses表的字段（与database_schema.sql一致）
+RESPONSE_FIELDS = [
+    'session_id', 'created_at',
+    'q1_industry', 'q1_industry_other',
+    'q2_role', 'q2_role_other',
+    'q3_digital_habit', 'q4_ai_self_position',
+    'q5_ai_usage', 'q6_org_stage', 'q7_personal_role',
+    'q8_pain_points', 'q9_attitude', 'q10_constraints',
+    'completion_time_seconds', 'device_type', 'user_agent', 'ip_hash'
 ]
 
-Q10_CONSTRAINTS = [
-    "预算和成本约束",
-    "监管政策限制",
-    "数据安全和隐私要求",
-    "组织架构和流程限制",
-    "技术基础设施不足",
-    "人才短缺",
-    "业务部门配合度低",
-    "高层支持不足"
+# "其他"选项的填写内容样本
+# 同一类答案的不同写法（用于检验自由填写答案的归一化）
+OTHER_INDUSTRY_SAMPLES = ["金融监管机构", "金融监管", "金融咨询公司", "金融咨询", "金融研究机构", "金融研究所",
+                          "互联网金融平台", "互联网金融", "高校金融研究"]
+OTHER_ROLE_SAMPLES = ["数据分析师", "数据分析", "产品经理", "产品经理 ", "合规专员", "合规", "研究员", "项目经理"]
+
+USER_AGENTS = [
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 15_0 like Mac OS X) AppleWebKit/605.1.15',
+    'Mozilla/5.0 (Linux; Android 11) AppleWebKit/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
 ]
 
-def generate_random_response():
-    """生成一条随机的问卷响应"""
-    
-    # 随机选择是否填写"其他"选项
-    use_industry_other = random.random() < 0.1  # 10%概率填写其他
-    use_role_other = random.random() < 0.1
-    
-    if use_industry_other:
-        q1_industry = "其他行业"
-        q1_industry_other = random.choice([
-            "金融监管机构",
-            "金融咨询公司",
-            "金融研究机构",
-            "互联网金融平台",
-            "高校金融研究"
-        ])
-    else:
-        q1_industry = random.choice(Q1_INDUSTRIES)
-        q1_industry_other = None
+
+# ================================================================
+# 基于问卷配置的分布
+# ================================================================
+
+def _load_config() -> Dict:
+    """读取问卷配置（优先使用QUESTIONNAIRE_CONFIG环境变量）"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    candidates = [
+        os.getenv('QUESTIONNAIRE_CONFIG'),
+        os.path.join(here, 'questionnaire_config.json'),
+        os.path.join(here, '..', 'questionnaire_config.json'),
+    ]
+    for path in candidates:
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+    raise FileNotFoundError("未找到questionnaire_config.json")
+
+
+def _option_weights(question: Dict) -> Dict:
+    """
+    为题目选项生成抽样权重
+
+    - 评分类单选题（整数值）：偏向中间值的离散正态分布
+    - 类别单选/多选题：选项按配置顺序递减（配置中常见选项在前），"其他"固定约5%
+    """
+    values = [opt['value'] for opt in question['options']]
+
+    if all(isinstance(v, int) for v in values):
+        mean = (min(values) + max(values)) / 2
+        std = (max(values) - min(values)) / 3
+        return {v: pow(2.718281828, -((v - mean) ** 2) / (2 * std ** 2)) for v in values}
+
+    weights = {}
+    regular = [v for v in values if v != 'other']
+    for rank, value in enumerate(regular):
+        weights[value] = 1.0 / (1 + 0.35 * rank)
+    if 'other' in values:
+        weights['other'] = sum(weights.values()) * 0.05
+    return weights
+
+
+class ResponseFactory:
+    """按问卷配置生成随机回答"""
+
+    def __init__(self, config: Optional[Dict] = None, rng: Optional[Any] = None):
+        """rng: random.Random实例，或random模块本身（使用模块级函数，受random.seed()控制）"""
+        self.config = config or _load_config()
+        self.rng = rng or random.Random()
+        self.questions = {q['db_field']: q for q in self.config['questions']}
+        self.weights = {field: _option_weights(q) for field, q in self.questions.items()}
+        self._counter = 0
+
+    def _choice(self, field: str):
+        weights = self.weights[field]
+        return self.rng.choices(list(weights), weights=list(weights.values()))[0]
+
+    def _sample(self, field: str, k: int) -> List[str]:
+        """按权重无放回抽取k项"""
+        pool = dict(self.weights[field])
+        picked = []
+        for _ in range(min(k, len(pool))):
+            value = self.rng.choices(list(pool), weights=list(pool.values()))[0]
+            picked.append(value)
+            del pool[value]
+        return picked
+
+    def response(self, session_id: str = DEFAULT_SESSION_ID,
+                 created_at: Optional[datetime] = None) -> Dict:
+        """生成一条随机的问卷响应"""
+        rng = self.rng
+        self._counter += 1
+
+        q1_industry = self._choice('q1_industry')
+        q2_role = self._choice('q2_role')
+
+        # Q8 痛点场景（多选，遵循配置中的最少/最多选项数）
+        q8 = self.questions['q8_pain_points']
+        q8_pain_points = self._sample(
+            'q8_pain_points',
+            rng.randint(q8.get('min_selections', 1), q8.get('max_selections', 3))
+        )
+        if 'none' in q8_pain_points:
+            q8_pain_points = ['none']
+
+        # Q10 推进约束（可选多选，约90%的人会填）
+        q10_constraints = self._sample('q10_constraints', rng.randint(1, 3)) if rng.random() < 0.9 else None
+
+        # 填写耗时：对数正态分布，多数在2-3分钟，少数挂着页面很久
+        completion_time_seconds = int(min(3600, max(30, rng.lognormvariate(5.0, 0.45))))
+
+        ip_hash = hashlib.sha256(
+            f"test_{session_id}_{self._counter}_{rng.random()}".encode()
+        ).hexdigest()
+
+        return {
+            'session_id': session_id,
+            'created_at': created_at.isoformat() if created_at else None,
+            'q1_industry': q1_industry,
+            'q1_industry_other': rng.choice(OTHER_INDUSTRY_SAMPLES) if q1_industry == 'other' else None,
+            'q2_role': q2_role,
+            'q2_role_other': rng.choice(OTHER_ROLE_SAMPLES) if q2_role == 'other' else None,
+            'q3_digital_habit': self._choice('q3_digital_habit'),
+            'q4_ai_self_position': self._choice('q4_ai_self_position'),
+            'q5_ai_usage': self._choice('q5_ai_usage'),
+            'q6_org_stage': self._choice('q6_org_stage'),
+            'q7_personal_role': self._choice('q7_personal_role'),
+            'q8_pain_points': q8_pain_points,  # PostgreSQL数组
+            'q9_attitude': self._choice('q9_attitude'),
+            'q10_constraints': q10_constraints,  # PostgreSQL数组或null
+            'ip_hash': ip_hash,
+            'device_type': rng.choice(['mobile', 'mobile', 'mobile', 'desktop']),  # 75%移动端
+            'completion_time_seconds': completion_time_seconds,
+            'user_agent': rng.choice(USER_AGENTS)
+        }
+
+
+_default_factory: Optional[ResponseFactory] = None
+
+
+def generate_random_response(session_id: str = DEFAULT_SESSION_ID,
+                             factory: Optional[ResponseFactory] = None) -> Dict:
+    """
+    生成一条随机的问卷响应（不指定提交时间，由数据库默认NOW()）
     
-    if use_role_other:
-        q2_role = "其他"
-        q2_role_other = random.choice([
-            "数据分析师",
-            "产品经理",
-            "合规专员",
-            "研究员",
-            "项目经理"
-        ])
+    默认使用模块级random（random.seed()后结果可复现），也可传入带独立随机数生成器的factory
+    """
+    global _default_factory
+    if factory is None:
+        if _default_factory is None:
+            _default_factory = ResponseFactory(rng=random)
+        factory = _default_factory
+    response = factory.response(session_id)
+    del response['created_at']
+    return response
+
+
+# ================================================================
+# 多场次数据流
+# ================================================================
+
+def plan_sessions(args) -> List[Dict]:
+    """规划场次及每场人数（班级规模在均值上下浮动）"""
+    rng = random.Random(args.seed)
+    if args.sessions == 1 and args.session_id:
+        names = [args.session_id]
     else:
-        q2_role = random.choice(Q2_ROLES)
-        q2_role_other = None
-    
-    # Q3-Q7, Q9 是评分题（1-5或1-4）
-    # 使用正态分布，让结果更真实（偏向中间值）
-    def random_rating(min_val, max_val):
-        """生成偏向中间值的随机评分"""
-        mean = (min_val + max_val) / 2
-        std = (max_val - min_val) / 4
-        value = int(random.gauss(mean, std))
-        return max(min_val, min(max_val, value))
-    
-    q3_digital_habit = random_rating(1, 4)
-    q4_ai_self_position = random_rating(1, 4)
-    q5_ai_usage = random_rating(1, 5)
-    q6_org_stage = random_rating(1, 5)
-    q7_personal_role = random_rating(1, 4)
-    q9_attitude = random_rating(1, 5)
-    
-    # Q8 痛点场景（多选，1-3项）
-    q8_pain_points = random.sample(Q8_PAIN_POINTS, k=random.randint(1, 3))
-    
-    # Q10 推进约束（多选，可选，90%的人会填）
-    if random.random() < 0.9:
-        q10_constraints = random.sample(Q10_CONSTRAINTS, k=random.randint(1, 3))
+        names = [f"{args.session_prefix}_{i + 1:04d}" for i in range(args.sessions)]
+
+    if args.total:
+        per_session = args.total / len(names)
+        sizes = [int(per_session)] * len(names)
+        for i in range(args.total - sum(sizes)):
+            sizes[i % len(names)] += 1
     else:
-        q10_constraints = None
-    
-    # 生成唯一的ip_hash
-    ip_hash = hashlib.sha256(f"test_{random.randint(1, 1000000)}_{random.random()}".encode()).hexdigest()
-    
-    # 随机设备类型
-    device_type = random.choice(['mobile', 'mobile', 'mobile', 'desktop'])  # 75%移动端
-    
-    # 随机完成时间（60-300秒）
-    completion_time_seconds = random.randint(60, 300)
-    
-    # 生成随机User-Agent
-    user_agents = [
-        'Mozilla/5.0 (iPhone; CPU iPhone OS 15_0 like Mac OS X) AppleWebKit/605.1.15',
-        'Mozilla/5.0 (Linux; Android 11) AppleWebKit/537.36',
-        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        sizes = [
+            max(1, int(args.per_session * rng.uniform(0.6, 1.4))) if args.sessions > 1 else args.per_session
+            for _ in names
+        ]
+
+    start = datetime.now(timezone.utc) - timedelta(days=len(names))
+    return [
+        {'session_id': name, 'count': size, 'start_time': start + timedelta(days=i)}
+        for i, (name, size) in enumerate(zip(names, sizes))
     ]
-    
-    return {
-        'session_id': 'SJTU_SAIF_20251114',
-        'q1_industry': q1_industry,
-        'q1_industry_other': q1_industry_other,
-        'q2_role': q2_role,
-        'q2_role_other': q2_role_other,
-        'q3_digital_habit': q3_digital_habit,
-        'q4_ai_self_position': q4_ai_self_position,
-        'q5_ai_usage': q5_ai_usage,
-        'q6_org_stage': q6_org_stage,
-        'q7_personal_role': q7_personal_role,
-        'q8_pain_points': q8_pain_points,  # PostgreSQL数组
-        'q9_attitude': q9_attitude,
-        'q10_constraints': q10_constraints,  # PostgreSQL数组或null
-        'ip_hash': ip_hash,
-        'device_type': device_type,
-        'completion_time_seconds': completion_time_seconds,
-        'user_agent': random.choice(user_agents)
-    }
+
+
+def iter_batches(plan: List[Dict], batch_size: int, seed: Optional[int],
+                 spread_minutes: float) -> Iterator[List[Dict]]:
+    """逐批生成数据（不在内存中保留全部数据）"""
+    factory = ResponseFactory(rng=random.Random(seed))
+    rng = random.Random(None if seed is None else seed + 1)
+    batch: List[Dict] = []
+    for session in plan:
+        window = spread_minutes * 60
+        # 课堂扫码提交集中在开始后的前几分钟
+        offsets = sorted(rng.triangular(0, window, window * 0.3) for _ in range(session['count']))
+        for offset in offsets:
+            batch.append(factory.response(
+                session['session_id'],
+                created_at=session['start_time'] + timedelta(seconds=offset)
+            ))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+class Progress:
+    """进度与吞吐量输出"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.started = time.perf_counter()
+        self._last_print = 0.0
+
+    def update(self, ok: int, failed: int = 0):
+        self.done += ok
+        self.failed += failed
+        now = time.perf_counter()
+        # 最多每0.2秒刷新一次，避免百万行时刷屏
+        if now - self._last_print < 0.2 and self.done + self.failed < self.total:
+            return
+        self._last_print = now
+        elapsed = now - self.started
+        rate = self.done / elapsed if elapsed else 0
+        remaining = (self.total - self.done - self.failed) / rate if rate else 0
+        sys.stdout.write(
+            f"\r⏳ {self.done + self.failed:,}/{self.total:,} "
+            f"({(self.done + self.failed) / self.total * 100:5.1f}%) "
+            f"| {rate:,.0f} 行/秒 | 失败 {self.failed:,} | 预计剩余 {remaining:,.0f}s   "
+        )
+        sys.stdout.flush()
+
+    def finish(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        sys.stdout.write("\n")
+        return elapsed
+
+
+# ================================================================
+# 输出：文件
+# ================================================================
+
+def _pg_array(values: Optional[List[str]]) -> Optional[str]:
+    """转为PostgreSQL数组字面量，便于COPY导入"""
+    if values is None:
+        return None
+    escaped = ['"' + v.replace('\\', '\\\\').replace('"', '\\"') + '"' for v in values]
+    return '{' + ','.join(escaped) + '}'
+
+
+def write_file(path: str, batches: Iterator[List[Dict]], progress: Progress):
+    """写入CSV/NDJSON/Parquet文件"""
+    ext = os.path.splitext(path)[1].lower()
+
+    if ext == '.parquet':
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("❌ 写入Parquet需要安装pyarrow: pip install pyarrow")
+
+        schema = pa.schema([
+            ('session_id', pa.string()), ('created_at', pa.string()),
+            ('q1_industry', pa.string()), ('q1_industry_other', pa.string()),
+            ('q2_role', pa.string()), ('q2_role_other', pa.string()),
+            ('q3_digital_habit', pa.int32()), ('q4_ai_self_position', pa.int32()),
+            ('q5_ai_usage', pa.int32()), ('q6_org_stage', pa.int32()),
+            ('q7_personal_role', pa.int32()), ('q8_pain_points', pa.list_(pa.string())),
+            ('q9_attitude', pa.int32()), ('q10_constraints', pa.list_(pa.string())),
+            ('completion_time_seconds', pa.int32()), ('device_type', pa.string()),
+            ('user_agent', pa.string()), ('ip_hash', pa.string()),
+        ])
+        with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+            for batch in batches:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                progress.update(len(batch))
+        return
+
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        if ext in ('.ndjson', '.jsonl'):
+            for batch in batches:
+                f.writelines(json.dumps(row, ensure_ascii=False) + '\n' for row in batch)
+                progress.update(len(batch))
+            return
+
+        writer = csv.DictWriter(f, fieldnames=RESPONSE_FIELDS)
+        writer.writeheader()
+        for batch in batches:
+            for row in batch:
+                row = dict(row)
+                row['q8_pain_points'] = _pg_array(row['q8_pain_points'])
+                row['q10_constraints'] = _pg_array(row['q10_constraints'])
+                writer.writerow(row)
+            progress.update(len(batch))
+
+
+# ================================================================
+# 输出：数据库（批量并发插入）
+# ================================================================
+
+async def insert_batches(db, batches: Iterator[List[Dict]], progress: Progress,
+                         concurrency: int, retries: int = 3):
+    """以有限并发批量插入（supabase客户端为同步接口，放到线程池执行）"""
+    semaphore = asyncio.Semaphore(concurrency)
+    errors: List[str] = []
+
+    async def insert(batch: List[Dict]):
+        try:
+            for attempt in range(retries):
+                try:
+                    await asyncio.to_thread(
+                        lambda: db.client.table('responses').insert(batch).execute()
+                    )
+                    progress.update(len(batch))
+                    return
+                except Exception as e:
+                    if attempt == retries - 1:
+                        progress.update(0, len(batch))
+                        error_msg = str(e)
+                        errors.append(error_msg[:100] + "..." if len(error_msg) > 100 else error_msg)
+                        return
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+        finally:
+            semaphore.release()
+
+    tasks = set()
+    for batch in batches:
+        # 先拿到并发名额再生成下一批，控制内存占用
+        await semaphore.acquire()
+        task = asyncio.create_task(insert(batch))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks)
+    return errors
+
+
+def register_sessions(db, plan: List[Dict]):
+    """在sessions表登记场次"""
+    rows = [
+        {
+            'session_id': s['session_id'],
+            'name': f"压测场次 {s['session_id']}",
+            'description': '由generate_test_data.py生成',
+            'start_time': s['start_time'].isoformat(),
+            'is_active': True
+        }
+        for s in plan
+    ]
+    for i in range(0, len(rows), 500):
+        db.client.table('sessions').upsert(rows[i:i + 500], on_conflict='session_id').execute()
+
+
+async def print_statistics(db, session_id: str):
+    """显示单个场次的统计"""
+    try:
+        stats = await db.get_statistics(session_id)
+        print(f"\n📈 场次 {session_id} 当前统计:")
+        print(f"   总提交数: {stats.get('total_responses', 0)}")
+        print(f"   平均完成时间: {stats.get('avg_completion_time') or 0:.1f}秒")
+
+        # 显示行业分布
+        industries = stats.get('industries') or {}
+        if industries:
+            print(f"\n🏢 行业分布（Top 5）:")
+            for industry, count in sorted(industries.items(), key=lambda x: x[1], reverse=True)[:5]:
+                print(f"   - {industry}: {count}人")
+
+        # 显示痛点分布
+        pain_points = stats.get('pain_points') or {}
+        if pain_points:
+            print(f"\n⚠️  主要痛点（Top 5）:")
+            for pain_point, count in sorted(pain_points.items(), key=lambda x: x[1], reverse=True)[:5]:
+                print(f"   - {pain_point}: {count}次提及")
+
+    except Exception as e:
+        print(f"⚠️  无法获取统计信息: {e}")
+
 
 async def main():
     """生成并插入测试数据"""
+    parser = argparse.ArgumentParser(description="生成测试问卷数据")
+    parser.add_argument('--sessions', type=int, default=1, help='场次数量')
+    parser.add_argument('--per-session', type=int, default=20, help='每场平均人数')
+    parser.add_argument('--total', type=int, help='总条数（优先于--per-session，均分到各场次）')
+    parser.add_argument('--session-id', default=DEFAULT_SESSION_ID, help='单场次时使用的场次ID')
+    parser.add_argument('--session-prefix', default='PERF', help='多场次时的场次ID前缀')
+    parser.add_argument('--spread-minutes', type=float, default=10.0, help='每场提交时间跨度（分钟）')
+    parser.add_argument('--batch-size', type=int, default=500, help='每批插入条数')
+    parser.add_argument('--concurrency', type=int, default=8, help='并发插入批次数')
+    parser.add_argument('--seed', type=int, help='随机种子（相同种子生成相同数据）')
+    parser.add_argument('--output', help='写入文件（.csv/.ndjson/.parquet），不写数据库')
+    args = parser.parse_args()
+
+    plan = plan_sessions(args)
+    total = sum(s['count'] for s in plan)
+    batches = iter_batches(plan, args.batch_size, args.seed, args.spread_minutes)
+    progress = Progress(total)
+
     print("🎲 开始生成测试数据...")
-    print("📋 使用前端HTML匹配的字段结构（整数评分 + 文本数组）")
-    
-    num_responses = 20
-    successful = 0
-    failed = 0
-    
-    for i in range(num_responses):
-        try:
-            response = generate_random_response()
-            
-            # 插入数据库
-            result = db.client.table('responses').insert(response).execute()
-            
-            successful += 1
-            print(f"✅ [{successful}/{num_responses}] 已生成测试数据")
-            
-        except Exception as e:
-            failed += 1
-            error_msg = str(e)
-            if len(error_msg) > 100:
-                error_msg = error_msg[:100] + "..."
-            print(f"❌ 生成第 {i+1} 条数据时出错: {error_msg}")
-    
+    print(f"📋 {len(plan)} 个场次，共 {total:,} 条（选项取自questionnaire_config.json）")
+
+    if args.output:
+        write_file(args.output, batches, progress)
+        elapsed = progress.finish()
+        print(f"\n{'='*60}")
+        print(f"🎉 完成! 已写入 {progress.done:,} 条到 {args.output}")
+        print(f"⚡ 耗时 {elapsed:.1f}s，平均 {progress.done / elapsed if elapsed else 0:,.0f} 行/秒")
+        print(f"{'='*60}")
+        return
+
+    from database import db
+
+    register_sessions(db, plan)
+    errors = await insert_batches(db, batches, progress, args.concurrency)
+    elapsed = progress.finish()
+
     print(f"\n{'='*60}")
-    print(f"🎉 完成! 成功: {successful}/{num_responses}, 失败: {failed}/{num_responses}")
-    print(f"📊 Session ID: SJTU_SAIF_20251114")
+    print(f"🎉 完成! 成功: {progress.done:,}/{total:,}, 失败: {progress.failed:,}/{total:,}")
+    print(f"⚡ 耗时 {elapsed:.1f}s，平均 {progress.done / elapsed if elapsed else 0:,.0f} 行/秒")
+    if len(plan) == 1:
+        print(f"📊 Session ID: {plan[0]['session_id']}")
+    else:
+        print(f"📊 Session ID: {plan[0]['session_id']} ~ {plan[-1]['session_id']}")
     print(f"{'='*60}")
-    
+    for error_msg in errors[:5]:
+        print(f"❌ {error_msg}")
+
     # 显示统计
-    if successful > 0:
-        try:
-            stats = await db.get_statistics('SJTU_SAIF_20251114')
-            print(f"\n📈 当前统计:")
-            print(f"   总提交数: {stats.get('total_responses', 0)}")
-            print(f"   平均完成时间: {stats.get('avg_completion_time', 0):.1f}秒")
-            
-            # 显示行业分布
-            industries = stats.get('industries', {})
-            if industries:
-                print(f"\n🏢 行业分布（Top 5）:")
-                sorted_industries = sorted(industries.items(), key=lambda x: x[1], reverse=True)[:5]
-                for industry, count in sorted_industries:
-                    print(f"   - {industry}: {count}人")
-            
-            # 显示痛点分布
-            pain_points = stats.get('pain_points', {})
-            if pain_points:
-                print(f"\n⚠️  主要痛点（Top 5）:")
-                sorted_pain_points = sorted(pain_points.items(), key=lambda x: x[1], reverse=True)[:5]
-                for pain_point, count in sorted_pain_points:
-                    print(f"   - {pain_point}: {count}次提及")
-            
-        except Exception as e:
-            print(f"⚠️  无法获取统计信息: {e}")
+    if progress.done > 0:
+        await print_statistics(db, plan[0]['session_id'])
+
 
 if __name__ == '__main__':
     asyncio.run(main())
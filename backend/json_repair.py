@@ -0,0 +1,231 @@
+"""
+容错JSON解析 - 修复大模型输出中的常见问题
+
+支持：
+- 代码块包裹（```json ... ```）和JSON前后的说明文字
+- 多余的逗号（尾逗号、连续逗号）
+- 字符串中的原始换行
+- 输出被截断（未闭合的字符串/对象/数组），截断时回退到最后一个完整的值再补全括号
+
+解析器可以逐块喂入（feed），用于流式输出时边接收边解析。
+"""
+import json
+import re
+from typing import Any, List, Optional, Tuple
+
+_CLOSERS = {'{': '}', '[': ']'}
+_LITERAL_TAIL = re.compile(r'[A-Za-z0-9.+\-]+$')
+_FENCE = re.compile(r'^\s*```[a-zA-Z]*\n?|\n?```\s*$')
+
+
+class TolerantJSONParser:
+    """增量式容错JSON解析器"""
+
+    def __init__(self):
+        self._out: List[str] = []     # 清洗后的字符
+        self._stack: List[str] = []   # 未闭合的容器
+        self._in_string = False
+        self._escape = False
+        self._string_is_key = False
+        self._key_start = 0           # 当前（最近一个）键在_out中的起始位置
+        self._started = False         # 是否已遇到顶层的 { 或 [
+        self._done = False            # 顶层容器是否已闭合
+
+    @property
+    def done(self) -> bool:
+        """顶层JSON是否已完整结束"""
+        return self._done
+
+    def feed(self, chunk: str):
+        """喂入一段文本"""
+        for ch in chunk:
+            if self._done:
+                return
+            if not self._started:
+                # 跳过JSON之前的说明文字和代码块标记
+                if ch in _CLOSERS:
+                    self._started = True
+                    self._open(ch)
+                continue
+            if self._in_string:
+                self._feed_string_char(ch)
+            else:
+                self._feed_char(ch)
+
+    def _open(self, ch: str):
+        self._stack.append(ch)
+        self._out.append(ch)
+
+    def _feed_string_char(self, ch: str):
+        if self._escape:
+            self._escape = False
+            self._out.append(ch)
+        elif ch == '\\':
+            self._escape = True
+            self._out.append(ch)
+        elif ch == '"':
+            self._in_string = False
+            self._out.append(ch)
+        elif ch == '\n':
+            self._out.append('\\n')
+        elif ch == '\r':
+            self._out.append('\\r')
+        elif ch == '\t':
+            self._out.append('\\t')
+        else:
+            self._out.append(ch)
+
+    def _feed_char(self, ch: str):
+        if ch.isspace():
+            return
+        last = self._out[-1] if self._out else ''
+        if ch in _CLOSERS:
+            self._open(ch)
+        elif ch in '}]':
+            while self._out and self._out[-1] == ',':
+                self._out.pop()
+            opener = self._stack.pop()
+            self._out.append(_CLOSERS[opener])
+            if not self._stack:
+                self._done = True
+        elif ch == ',':
+            # 连续逗号、容器开头或冒号后的逗号直接丢弃
+            if last not in (',', '{', '[', ':'):
+                self._out.append(ch)
+        elif ch == '"':
+            self._in_string = True
+            self._string_is_key = self._stack[-1] == '{' and last in ('{', ',')
+            if self._string_is_key:
+                self._key_start = len(self._out)
+            self._out.append(ch)
+        else:
+            self._out.append(ch)
+
+    def text(self) -> Tuple[str, bool]:
+        """
+        返回修复后的JSON文本
+
+        Returns:
+            (json_text, truncated) truncated表示输出不完整、已自动补全
+        """
+        if not self._started:
+            raise ValueError("未找到JSON内容")
+
+        out = list(self._out)
+        truncated = not self._done
+
+        if self._in_string:
+            if self._string_is_key:
+                del out[self._key_start:]
+            else:
+                if self._escape:
+                    out.pop()
+                out.append('"')
+
+        # 回退不完整的尾部：悬空的逗号、冒号、截断的字面量
+        while out:
+            tail = out[-1]
+            if tail == ',':
+                out.pop()
+                continue
+            if tail == ':':
+                del out[self._find_key_start(out):]
+                continue
+            if tail not in '"}]{[':
+                match = _LITERAL_TAIL.search(''.join(out[-32:]))
+                if match:
+                    token = match.group(0)
+                    try:
+                        json.loads(token)
+                        break
+                    except ValueError:
+                        del out[len(out) - len(token):]
+                        continue
+            break
+
+        # 对象中只剩键没有值时去掉该键
+        open_stack = self._recount_stack(out)
+        if out and out[-1] == '"' and open_stack and open_stack[-1] == '{':
+            start = self._find_key_start(out + [':'])
+            prev = out[start - 1] if start > 0 else ''
+            if prev in ('{', ','):
+                del out[start:]
+                while out and out[-1] == ',':
+                    out.pop()
+
+        for opener in reversed(self._recount_stack(out)):
+            out.append(_CLOSERS[opener])
+
+        return ''.join(out), truncated
+
+    def result(self) -> Tuple[Any, bool]:
+        """返回解析后的对象和是否被截断"""
+        text, truncated = self.text()
+        return json.loads(text), truncated
+
+    @staticmethod
+    def _find_key_start(out: List[str]) -> int:
+        """out以 "key": 结尾时，返回该键起始引号的位置"""
+        i = len(out) - 2  # 跳过冒号，指向键的结束引号
+        if i < 0 or out[i] != '"':
+            return len(out) - 1
+        i -= 1
+        while i >= 0:
+            if out[i] == '"':
+                # 计算前面连续反斜杠数量，判断是否为转义引号
+                j, backslashes = i - 1, 0
+                while j >= 0 and out[j] == '\\':
+                    backslashes += 1
+                    j -= 1
+                if backslashes % 2 == 0:
+                    return i
+            i -= 1
+        return 0
+
+    @staticmethod
+    def _recount_stack(out: List[str]) -> List[str]:
+        """回退后重新计算未闭合的容器"""
+        stack: List[str] = []
+        in_string = escape = False
+        for ch in out:
+            if in_string:
+                if escape:
+                    escape = False
+                elif ch == '\\':
+                    escape = True
+                elif ch == '"':
+                    in_string = False
+            elif ch == '"':
+                in_string = True
+            elif ch in _CLOSERS:
+                stack.append(ch)
+            elif ch in '}]' and stack:
+                stack.pop()
+        return stack
+
+
+def strip_code_fence(text: str) -> str:
+    """去掉续写内容首尾的代码块标记"""
+    return _FENCE.sub('', text or '')
+
+
+def parse_llm_json(text: str) -> Tuple[Optional[Any], bool]:
+    """
+    解析大模型输出的JSON
+
+    Returns:
+        (obj, truncated) 无法解析时obj为None
+    """
+    if text is None:
+        return None, False
+    try:
+        return json.loads(text), False
+    except (TypeError, ValueError):
+        pass
+
+    parser = TolerantJSONParser()
+    parser.feed(text)
+    try:
+        return parser.result()
+    except ValueError:
+        return None, False
@@ -0,0 +1,240 @@
+"""
+实时提交指标
+按场次维护提交速率时间序列（5秒/1分钟分桶的环形缓冲）和滚动完成时间分位数，
+提交时增量更新，看板读取时不需要按created_at扫描responses表
+"""
+import math
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+# 分桶粒度 -> (每桶秒数, 桶数)
+RESOLUTIONS = {
+    '5s': (5, 360),     # 最近30分钟
+    '1m': (60, 240),    # 最近4小时
+}
+
+# 从数据库补齐时向前多查的秒数（应用服务器与数据库的时钟差、事务提交延迟）
+SYNC_SKEW_SECONDS = 10
+
+
+def parse_timestamp(value: Any) -> float:
+    """ISO时间字符串/datetime -> Unix时间戳"""
+    if value is None:
+        return time.time()
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.timestamp()
+    dt = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _percentile(sorted_values: List[float], p: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class RingSeries:
+    """固定长度的分桶计数环形缓冲"""
+
+    def __init__(self, bucket_seconds: int, size: int):
+        self.bucket_seconds = bucket_seconds
+        self.size = size
+        self._counts = [0] * size
+        self._bucket_ids = [-1] * size
+
+    def add(self, ts: float, n: int = 1):
+        bucket = int(ts // self.bucket_seconds)
+        idx = bucket % self.size
+        if self._bucket_ids[idx] != bucket:
+            if self._bucket_ids[idx] > bucket:
+                # 比缓冲区覆盖范围更早的数据直接丢弃
+                return
+            self._bucket_ids[idx] = bucket
+            self._counts[idx] = 0
+        self._counts[idx] += n
+
+    def series(self, now: float, buckets: Optional[int] = None) -> List[List]:
+        """返回 [[桶起始时间戳, 计数], ...]，从旧到新，包含空桶"""
+        buckets = min(buckets or self.size, self.size)
+        current = int(now // self.bucket_seconds)
+        result = []
+        for bucket in range(current - buckets + 1, current + 1):
+            idx = bucket % self.size
+            count = self._counts[idx] if self._bucket_ids[idx] == bucket else 0
+            result.append([bucket * self.bucket_seconds, count])
+        return result
+
+
+class SessionMetrics:
+    """单个场次的实时指标"""
+
+    def __init__(self, completion_window: float, max_samples: int):
+        self.series = {name: RingSeries(*spec) for name, spec in RESOLUTIONS.items()}
+        self.completion_window = completion_window
+        self._completions: deque = deque(maxlen=max_samples)  # (ts, 完成秒数)
+        self._recent_ids: deque = deque(maxlen=max_samples)
+        self._recent_id_set = set()
+        self.latest_ts: Optional[float] = None
+        self.seeded = False
+
+    def record(self, ts: float, completion_seconds: Optional[float] = None, response_id: Optional[str] = None) -> bool:
+        """记录一次提交，已记录过的response_id会被忽略"""
+        if response_id is not None:
+            if response_id in self._recent_id_set:
+                return False
+            if len(self._recent_ids) == self._recent_ids.maxlen:
+                self._recent_id_set.discard(self._recent_ids[0])
+            self._recent_ids.append(response_id)
+            self._recent_id_set.add(response_id)
+
+        for ring in self.series.values():
+            ring.add(ts)
+        if completion_seconds is not None:
+            self._completions.append((ts, float(completion_seconds)))
+        self.latest_ts = ts if self.latest_ts is None else max(self.latest_ts, ts)
+        return True
+
+    def completion_percentiles(self, now: float) -> Dict[str, Any]:
+        cutoff = now - self.completion_window
+        values = sorted(v for ts, v in self._completions if ts >= cutoff)
+        return {
+            'window_seconds': self.completion_window,
+            'count': len(values),
+            'p50': _percentile(values, 50),
+            'p90': _percentile(values, 90),
+            'p99': _percentile(values, 99),
+        }
+
+
+class LiveMetrics:
+    """所有场次的实时指标（进程内）"""
+
+    def __init__(self):
+        self.completion_window = float(os.getenv('LIVE_COMPLETION_WINDOW', '600'))
+        self.max_samples = int(os.getenv('LIVE_MAX_SAMPLES', '2000'))
+        self._sessions: Dict[str, SessionMetrics] = {}
+        self._lock = threading.Lock()
+
+    def _session(self, session_id: str) -> SessionMetrics:
+        metrics = self._sessions.get(session_id)
+        if metrics is None:
+            metrics = self._sessions[session_id] = SessionMetrics(self.completion_window, self.max_samples)
+        return metrics
+
+    def is_seeded(self, session_id: str) -> bool:
+        with self._lock:
+            return self._session(session_id).seeded
+
+    def latest_timestamp(self, session_id: str) -> Optional[float]:
+        with self._lock:
+            return self._session(session_id).latest_ts
+
+    def record(
+        self,
+        session_id: str,
+        created_at: Any = None,
+        completion_seconds: Optional[float] = None,
+        response_id: Optional[str] = None
+    ) -> bool:
+        """提交成功后调用"""
+        ts = parse_timestamp(created_at)
+        with self._lock:
+            return self._session(session_id).record(ts, completion_seconds, response_id)
+
+    def record_rows(self, session_id: str, rows: List[Dict[str, Any]]) -> int:
+        """批量记录数据库中读到的回答（冷启动/补齐其他入口写入的数据）"""
+        added = 0
+        with self._lock:
+            metrics = self._session(session_id)
+            for row in rows:
+                added += metrics.record(
+                    parse_timestamp(row.get('created_at')),
+                    row.get('completion_time_seconds'),
+                    row.get('id')
+                )
+        return added
+
+    async def sync(self, database, session_id: str) -> int:
+        """
+        从数据库补齐未经本进程写入的提交（前端直连Supabase、其他实例等）
+
+        首次访问时加载最近4小时的数据，之后只查询最新提交时间之后的少量行（走索引的范围查询）
+        """
+        latest = self.latest_timestamp(session_id)
+        seeded = self.is_seeded(session_id)
+        if seeded and latest is not None:
+            since_ts = latest - SYNC_SKEW_SECONDS
+        else:
+            since_ts = time.time() - max(s * n for s, n in RESOLUTIONS.values())
+        since = datetime.fromtimestamp(since_ts, timezone.utc).isoformat()
+
+        added = 0
+        cursor = None
+        while True:
+            page = await database.list_responses(
+                session_id,
+                columns=['id', 'created_at', 'completion_time_seconds'],
+                limit=1000,
+                cursor=cursor,
+                since=since
+            )
+            added += self.record_rows(session_id, page['items'])
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        if not seeded:
+            with self._lock:
+                self._session(session_id).seeded = True
+        return added
+
+    def invalidate(self, session_id: str):
+        """场次数据被清理后丢弃环形缓冲、已记录的response_id和补齐状态，下次读取时重新从数据库加载"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def snapshot(self, session_id: str, resolution: str = '5s', buckets: Optional[int] = None) -> Dict[str, Any]:
+        """
+        读取时间序列
+
+        Returns:
+            {
+                'resolution': '5s', 'bucket_seconds': 5,
+                'buckets': [[起始时间戳, 提交数], ...],
+                'rate_per_minute': 最近1分钟提交数,
+                'completion_time': {'p50': .., 'p90': .., 'p99': .., 'count': .., 'window_seconds': ..},
+                'latest_submission': {'timestamp': .., 'seconds_ago': ..} 或 None
+            }
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"resolution只能是: {', '.join(RESOLUTIONS)}")
+        now = time.time()
+        with self._lock:
+            metrics = self._session(session_id)
+            ring = metrics.series[resolution]
+            last_minute = metrics.series['5s'].series(now, 60 // RESOLUTIONS['5s'][0])
+            latest = metrics.latest_ts
+            return {
+                'session_id': session_id,
+                'resolution': resolution,
+                'bucket_seconds': ring.bucket_seconds,
+                'buckets': ring.series(now, buckets),
+                'rate_per_minute': sum(count for _, count in last_minute),
+                'completion_time': metrics.completion_percentiles(now),
+                'latest_submission': {
+                    'timestamp': latest,
+                    'seconds_ago': max(0, int(now - latest))
+                } if latest is not None else None,
+            }
+
+
+# 全局实例
+live_metrics = LiveMetrics()
@@ -2,17 +2,91 @@
 LLM分析器 - 通过OpenRouter调用大模型进行问卷分析
 """
 import os
+import json
+import time
+import asyncio
+import random
 import httpx
-from typing import Dict, Optional
-from prompts import ANALYSIS_SYSTEM_PROMPT, get_analysis_prompt
+from typing import Dict, List, Optional
+from prompts import (
+    ANALYSIS_SYSTEM_PROMPT,
+    CONTINUATION_PROMPT,
+    STATS_KEY_LABELS,
+    _format_stats_compact,
+    get_incremental_analysis_prompt,
+    get_fill_missing_prompt,
+    get_segment_analysis_prompt,
+    get_segment_reduce_prompt
+)
+from prompt_budget import build_prompt, estimate_tokens
+from model_router import MODEL_CATALOG, ModelRouter
+from stats_diff import make_snapshot, diff_stats, format_diff_for_prompt
+from json_repair import TolerantJSONParser, parse_llm_json, strip_code_fence
+from analysis_schema import (
+    ANALYSIS_SCHEMA,
+    SIMPLE_ANALYSIS_SCHEMA,
+    SEGMENT_SCHEMA,
+    SEGMENT_REDUCE_SCHEMA,
+    validate_analysis,
+    missing_top_level
+)
+
+# 可重试的HTTP状态码
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+MAX_RETRY_DELAY = 30.0
+
+
+class OpenRouterError(Exception):
+    """接口返回非200状态码"""
+
+    def __init__(self, message: str, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
 
 class LLMAnalyzer:
     """大模型分析器"""
     
-    def __init__(self):
-        self.api_key = os.getenv('OPENROUTER_API_KEY')
-        self.api_base = "https://openrouter.ai/api/v1"
-        self.model = os.getenv('OPENROUTER_MODEL', 'minimax/minimax-m2')  # 默认使用Claude
+    def __init__(self, api_base: Optional[str] = None, api_key: Optional[str] = None, model: Optional[str] = None):
+        """
+        Args:
+            api_base: OpenAI兼容接口地址（默认OPENROUTER_API_BASE），压测时可指向mock_llm_server
+            api_key: 接口密钥（默认OPENROUTER_API_KEY）
+            model: 默认模型（默认OPENROUTER_MODEL）
+        """
+        self.api_key = api_key or os.getenv('OPENROUTER_API_KEY')
+        self.api_base = (api_base or os.getenv('OPENROUTER_API_BASE', "https://openrouter.ai/api/v1")).rstrip('/')
+        self.model = model or os.getenv('OPENROUTER_MODEL', 'minimax/minimax-m2')  # 默认使用Claude
+        
+        # 增量分析阈值：分布漂移或新增样本比例超过阈值时改为全量分析
+        self.drift_threshold = float(os.getenv('ANALYSIS_DRIFT_THRESHOLD', '0.15'))
+        self.max_new_ratio = float(os.getenv('ANALYSIS_MAX_NEW_RATIO', '0.3'))
+        
+        # 多模型竞速：逗号分隔的模型列表，以及每个模型的超时（秒）
+        self.race_models = [
+            m.strip() for m in os.getenv('OPENROUTER_RACE_MODELS', '').split(',') if m.strip()
+        ]
+        self.race_timeout = float(os.getenv('OPENROUTER_RACE_TIMEOUT', '60'))
+        
+        # 输出被截断时最多续写几次
+        self.max_continuations = int(os.getenv('OPENROUTER_MAX_CONTINUATIONS', '2'))
+        
+        # 分析提示词的token上限，超出时逐级压缩
+        self.prompt_token_budget = int(os.getenv('PROMPT_TOKEN_BUDGET', '6000'))
+        
+        # 流式请求（记录真实的首token时间）
+        self.stream = os.getenv('OPENROUTER_STREAM', 'false').lower() == 'true'
+        
+        # 429/5xx/网络错误时的重试次数和退避基数（秒，指数退避+抖动，优先遵循Retry-After）
+        self.max_retries = int(os.getenv('OPENROUTER_MAX_RETRIES', '2'))
+        self.retry_base_delay = float(os.getenv('OPENROUTER_RETRY_BASE_DELAY', '1.0'))
+        
+        # 分群分析时同时进行的群体请求数
+        self.segment_concurrency = int(os.getenv('ANALYSIS_SEGMENT_CONCURRENCY', '4'))
+        
+        # 按实时延迟/失败率选择模型
+        self.router = ModelRouter(self.model)
         
         if not self.api_key:
             raise ValueError("缺少OPENROUTER_API_KEY环境变量")
@@ -21,7 +95,8 @@ class LLMAnalyzer:
         self, 
         stats: Dict,
         session_id: str,
-        use_simple_prompt: bool = False
+        use_simple_prompt: bool = False,
+        tier: Optional[str] = None
     ) -> Dict:
         """
         分析问卷数据
@@ -30,39 +105,382 @@ class LLMAnalyzer:
             stats: 问卷统计数据
             session_id: 会话ID
             use_simple_prompt: 是否使用简化提示词
+            tier: 最低质量档位（配置了OPENROUTER_ROUTE_MODELS时用于选择模型）
         
         Returns:
             分析结果字典
         """
         try:
-            # 生成提示词
-            if use_simple_prompt:
-                from prompts import get_simple_analysis_prompt
-                user_prompt = get_simple_analysis_prompt(stats)
-            else:
-                user_prompt = get_analysis_prompt(stats)
+            # 生成提示词（超出token预算时压缩，必要时改用简化版）
+            built = self._build_prompt(stats, use_simple_prompt)
+            use_simple_prompt = built['simple']
+            model = self.router.choose(tier)
             
-            # 调用OpenRouter API（返回JSON文本）
-            analysis_text = await self._call_openrouter(
-                system_prompt=ANALYSIS_SYSTEM_PROMPT,
-                user_prompt=user_prompt
+            # 调用OpenRouter API，解析/修复JSON（截断时续写，缺字段时补全）
+            generated = await self._generate_analysis(
+                user_prompt=built['prompt'],
+                schema=self._schema_for(use_simple_prompt),
+                model=model
             )
             
-            # 解析JSON
-            import json
+            analysis_json = generated['analysis']
+            if analysis_json is None:
+                # 修复后仍无法解析，返回原始文本
+                analysis_json = {"raw_text": generated['text']}
+            
+            result = {
+                'success': True,
+                'session_id': session_id,
+                'analysis': analysis_json,  # 现在是JSON对象
+                'analysis_text': generated['text'],  # 保留原始文本用于存储
+                'model': model,
+                'total_responses': stats.get('total_responses', 0),
+                'analysis_mode': 'full',
+                'prompt': self._prompt_info(built),
+                'stats_snapshot': make_snapshot(stats, 'simple' if use_simple_prompt else 'full')
+            }
+            if generated['repairs']:
+                result['repairs'] = generated['repairs']
+            if generated['errors']:
+                result['validation_errors'] = generated['errors']
+            return result
+            
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'session_id': session_id
+            }
+    
+    async def analyze_race(
+        self,
+        stats: Dict,
+        session_id: str,
+        use_simple_prompt: bool = False,
+        models: Optional[List[str]] = None,
+        timeout: Optional[float] = None,
+        collect_all: bool = False
+    ) -> Dict:
+        """
+        多模型竞速分析：同一提示词并发发给多个模型，返回最先通过JSON校验的结果
+        
+        Args:
+            stats: 问卷统计数据
+            session_id: 会话ID
+            use_simple_prompt: 是否使用简化提示词
+            models: 参与竞速的模型（默认OPENROUTER_RACE_MODELS，未配置时只用默认模型）
+            timeout: 每个模型的超时秒数（默认OPENROUTER_RACE_TIMEOUT）
+            collect_all: 是否等待所有模型返回（用于对比各模型结果，耗时取决于最慢的模型）
+        
+        Returns:
+            分析结果字典，race字段记录每个模型的耗时与结果
+        """
+        models = list(dict.fromkeys(models or self.race_models or [self.model]))
+        timeout = timeout or self.race_timeout
+        built = self._build_prompt(stats, use_simple_prompt)
+        use_simple_prompt = built['simple']
+        user_prompt = built['prompt']
+        schema = self._schema_for(use_simple_prompt)
+        
+        async def run(model: str) -> Dict:
+            started = time.perf_counter()
+            outcome = {'model': model}
             try:
-                analysis_json = json.loads(analysis_text)
-            except json.JSONDecodeError:
-                # 如果解析失败，返回原始文本
-                analysis_json = {"raw_text": analysis_text}
+                generated = await asyncio.wait_for(
+                    self._generate_analysis(user_prompt=user_prompt, schema=schema, model=model),
+                    timeout=timeout
+                )
+                outcome['text'] = generated['text']
+                outcome['analysis'] = generated['analysis']
+                outcome['valid'] = generated['analysis'] is not None and not generated['errors']
+                if generated['repairs']:
+                    outcome['repairs'] = generated['repairs']
+                if not outcome['valid']:
+                    outcome['error'] = '返回内容未通过JSON结构校验: ' + '; '.join(
+                        generated['errors'][:3] or ['无法解析']
+                    )
+            except asyncio.TimeoutError:
+                outcome.update(valid=False, error=f'超时（>{timeout:.0f}秒）')
+                self.router.record(model, ok=False, latency=timeout, error=outcome['error'])
+            except Exception as e:
+                outcome.update(valid=False, error=str(e))
+            outcome['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+            return outcome
+        
+        pending = {asyncio.create_task(run(m)) for m in models}
+        outcomes: List[Dict] = []
+        winner: Optional[Dict] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    outcome = task.result()
+                    outcomes.append(outcome)
+                    if winner is None and outcome['valid']:
+                        winner = outcome
+                if winner is not None and not collect_all:
+                    break
+        finally:
+            # 已有结果时取消其余请求，避免继续占用连接
+            for task in pending:
+                task.cancel()
+        
+        race = [
+            {k: v for k, v in o.items() if k != 'text' and (collect_all or k != 'analysis')}
+            for o in outcomes
+        ]
+        race.extend({'model': m, 'valid': False, 'error': '已取消（其他模型先返回）'}
+                    for m in models if m not in {o['model'] for o in outcomes})
+        
+        if winner is None:
+            return {
+                'success': False,
+                'error': '所有模型均未返回有效结果: ' + '; '.join(
+                    f"{o['model']}: {o.get('error')}" for o in outcomes
+                ),
+                'session_id': session_id,
+                'race': race
+            }
+        
+        return {
+            'success': True,
+            'session_id': session_id,
+            'analysis': winner['analysis'],
+            'analysis_text': winner['text'],
+            'model': winner['model'],
+            'total_responses': stats.get('total_responses', 0),
+            'analysis_mode': 'race',
+            'prompt': self._prompt_info(built),
+            'stats_snapshot': make_snapshot(stats, 'simple' if use_simple_prompt else 'full'),
+            'race': race
+        }
+    
+    async def analyze_segmented(
+        self,
+        stats: Dict,
+        segments: Dict,
+        session_id: str,
+        tier: Optional[str] = None
+    ) -> Dict:
+        """
+        分群分析（map-reduce）：每个群体一个短提示词并发请求（最多ANALYSIS_SEGMENT_CONCURRENCY个同时进行），
+        再用一个合并提示词输出跨群体结论，总耗时约等于最慢的一次群体请求 + 一次合并请求
+        
+        Args:
+            stats: 全场统计数据
+            segments: segment_stats.compute_segment_stats 的结果
+            session_id: 会话ID
+            tier: 最低质量档位
+        
+        Returns:
+            分析结果字典；analysis 含合并结论和 audience_segments（每个群体一项，结构同完整分析）
+        """
+        try:
+            model = self.router.choose(tier)
+            semaphore = asyncio.Semaphore(self.segment_concurrency)
+            
+            async def run(segment: Dict) -> Dict:
+                async with semaphore:
+                    started = time.perf_counter()
+                    generated = await self._generate_analysis(
+                        user_prompt=get_segment_analysis_prompt(segment, segments['title'], segments['total']),
+                        schema=SEGMENT_SCHEMA,
+                        model=model,
+                        max_tokens=800
+                    )
+                    return {'generated': generated, 'elapsed_seconds': round(time.perf_counter() - started, 3)}
+            
+            started = time.perf_counter()
+            outcomes = await asyncio.gather(
+                *(run(s) for s in segments['segments']), return_exceptions=True
+            )
+            map_seconds = time.perf_counter() - started
             
+            audience_segments, details = [], []
+            for segment, outcome in zip(segments['segments'], outcomes):
+                detail = {'segment': segment['name'], 'size': segment['size']}
+                if isinstance(outcome, Exception):
+                    detail['error'] = str(outcome)
+                elif outcome['generated']['analysis'] is None:
+                    detail.update(error='无法解析JSON', elapsed_seconds=outcome['elapsed_seconds'])
+                else:
+                    audience_segments.append({
+                        'segment_name': segment['name'],
+                        'percentage': round(segment['share'] * 100),
+                        'count': segment['size'],
+                        **outcome['generated']['analysis']
+                    })
+                    detail['elapsed_seconds'] = outcome['elapsed_seconds']
+                    if outcome['generated']['repairs']:
+                        detail['repairs'] = outcome['generated']['repairs']
+                details.append(detail)
+            
+            if not audience_segments:
+                raise Exception('所有群体分析均失败: ' + '; '.join(
+                    f"{d['segment']}: {d.get('error')}" for d in details
+                ))
+            
+            # 合并：全场数据用紧凑格式，各群体结论去掉重复的人数字段
+            reduce_started = time.perf_counter()
+            generated = await self._generate_analysis(
+                user_prompt=get_segment_reduce_prompt(
+                    _format_stats_compact(stats),
+                    segments['title'],
+                    [{k: v for k, v in s.items() if k != 'content_focus'} for s in audience_segments]
+                ),
+                schema=SEGMENT_REDUCE_SCHEMA,
+                model=model,
+                max_tokens=2000
+            )
+            reduce_seconds = time.perf_counter() - reduce_started
+            
+            analysis = generated['analysis'] if generated['analysis'] is not None else {'raw_text': generated['text']}
+            analysis['segment_dimension'] = segments['title']
+            analysis['audience_segments'] = audience_segments
+            
+            print(f"🧩 分群分析完成：{len(audience_segments)}/{len(details)} 个群体，"
+                  f"并发阶段 {map_seconds:.1f}秒，合并 {reduce_seconds:.1f}秒")
             return {
                 'success': True,
                 'session_id': session_id,
-                'analysis': analysis_json,  # 现在是JSON对象
-                'analysis_text': analysis_text,  # 保留原始文本用于存储
-                'model': self.model,
-                'total_responses': stats.get('total_responses', 0)
+                'analysis': analysis,
+                'analysis_text': json.dumps(analysis, ensure_ascii=False),
+                'model': model,
+                'total_responses': stats.get('total_responses', 0),
+                'analysis_mode': 'segmented',
+                'segments': {
+                    'dimension': segments['dimension'],
+                    'excluded': segments['excluded'],
+                    'map_seconds': round(map_seconds, 3),
+                    'reduce_seconds': round(reduce_seconds, 3),
+                    'details': details
+                },
+                'stats_snapshot': make_snapshot(stats, 'segmented')
+            }
+        
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'session_id': session_id
+            }
+    
+    async def analyze_incremental(
+        self,
+        stats: Dict,
+        session_id: str,
+        previous: Optional[Dict],
+        snapshot: Optional[Dict] = None,
+        use_simple_prompt: bool = False,
+        tier: Optional[str] = None
+    ) -> Dict:
+        """
+        增量分析：只把上次的分析结果和统计变化发给模型，由模型输出需要更新的字段
+        
+        以下情况回退为全量分析：
+        - 没有上次的分析结果或统计快照
+        - 上次的结果不是有效JSON，或提示词类型不同
+        - 新增样本比例或任一题分布漂移超过阈值
+        
+        Args:
+            stats: 当前统计数据
+            session_id: 会话ID
+            previous: db.get_analysis_result的返回值
+            snapshot: db.get_analysis_snapshot的返回值（上次分析时的统计快照）
+            use_simple_prompt: 是否使用简化提示词
+            tier: 最低质量档位
+        
+        Returns:
+            分析结果字典（analysis_mode为incremental或full）
+        """
+        prompt_type = 'simple' if use_simple_prompt else 'full'
+        previous_analysis = None
+        if previous and snapshot and snapshot.get('prompt_type') == prompt_type:
+            try:
+                previous_analysis = json.loads(previous['analysis'])
+            except (TypeError, json.JSONDecodeError):
+                previous_analysis = None
+        
+        if not isinstance(previous_analysis, dict) or 'raw_text' in previous_analysis:
+            result = await self.analyze_questionnaire(stats, session_id, use_simple_prompt, tier)
+            result['fallback_reason'] = '没有可用的上次分析结果'
+            return result
+        
+        diff = diff_stats(snapshot, stats)
+        
+        # 数据没有变化，直接复用上次的结果
+        if not diff['changes'] and diff['new_responses'] == 0:
+            return {
+                'success': True,
+                'session_id': session_id,
+                'analysis': previous_analysis,
+                'analysis_text': previous['analysis'],
+                'model': previous.get('model', self.model),
+                'total_responses': stats.get('total_responses', 0),
+                'analysis_mode': 'unchanged',
+                'stats_snapshot': snapshot,
+                'drift': diff['max_drift']
+            }
+        
+        if diff['max_drift'] > self.drift_threshold or diff['new_ratio'] > self.max_new_ratio:
+            result = await self.analyze_questionnaire(stats, session_id, use_simple_prompt, tier)
+            result['fallback_reason'] = (
+                f"数据变化较大（最大漂移{diff['max_drift']:.2f}，新增占比{diff['new_ratio']:.2f}）"
+            )
+            result['drift'] = diff['max_drift']
+            return result
+        
+        try:
+            user_prompt = get_incremental_analysis_prompt(
+                previous_analysis,
+                format_diff_for_prompt(diff, STATS_KEY_LABELS)
+            )
+            model = self.router.choose(tier)
+            reply = await self._chat(
+                [
+                    {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+                    {"role": "user", "content": user_prompt}
+                ],
+                max_tokens=1500,
+                model=model
+            )
+            
+            patch, truncated = parse_llm_json(reply['content'])
+            fallback_reason = None
+            if not isinstance(patch, dict):
+                fallback_reason = '增量结果不是有效JSON'
+            elif truncated or reply['finish_reason'] == 'length':
+                fallback_reason = '增量结果被截断'
+            else:
+                # 只接受结构定义中的顶层字段，模型自造的字段丢弃；任一字段结构不对时整体回退
+                properties = self._schema_for(use_simple_prompt)['properties']
+                patch = {k: v for k, v in patch.items() if k in properties}
+                errors = [
+                    error for key, value in patch.items()
+                    for error in validate_analysis(value, properties[key], f"$.{key}")
+                ]
+                if errors:
+                    fallback_reason = f"增量结果结构无效: {'; '.join(errors[:3])}"
+            
+            if fallback_reason:
+                result = await self.analyze_questionnaire(stats, session_id, use_simple_prompt, tier)
+                result['fallback_reason'] = fallback_reason
+                return result
+            
+            # 只覆盖模型返回的、校验通过的顶层字段
+            merged = {**previous_analysis, **patch}
+            
+            return {
+                'success': True,
+                'session_id': session_id,
+                'analysis': merged,
+                'analysis_text': json.dumps(merged, ensure_ascii=False),
+                'model': model,
+                'total_responses': stats.get('total_responses', 0),
+                'analysis_mode': 'incremental',
+                'updated_sections': list(patch.keys()),
+                'stats_snapshot': make_snapshot(stats, prompt_type),
+                'drift': diff['max_drift']
             }
             
         except Exception as e:
@@ -72,12 +490,109 @@ class LLMAnalyzer:
                 'session_id': session_id
             }
     
+    def _build_prompt(self, stats: Dict, use_simple_prompt: bool) -> Dict:
+        """生成不超过token预算的分析提示词（见prompt_budget.build_prompt）"""
+        return build_prompt(stats, use_simple_prompt, self.prompt_token_budget)
+    
+    def _prompt_info(self, built: Dict) -> Dict:
+        """随结果返回的提示词压缩信息"""
+        return {k: built[k] for k in ('stage', 'estimated_tokens', 'budget', 'over_budget')}
+    
+    def _schema_for(self, use_simple_prompt: bool) -> Dict:
+        """提示词对应的输出结构"""
+        return SIMPLE_ANALYSIS_SCHEMA if use_simple_prompt else ANALYSIS_SCHEMA
+    
+    async def _generate_analysis(
+        self,
+        user_prompt: str,
+        schema: Dict,
+        model: Optional[str] = None,
+        max_tokens: int = 4000
+    ) -> Dict:
+        """
+        生成分析JSON，尽量用小的追加请求修复问题而不是整体重新生成
+        
+        1. 容错解析（代码块、尾逗号、字符串内换行等）
+        2. 输出被截断时，把已输出内容作为上下文请求模型续写
+        3. 仍缺少部分顶层字段时，只请求补全缺失的字段
+        
+        Returns:
+            {'text': 存储用的JSON文本, 'analysis': JSON对象或None, 'errors': 结构校验错误, 'repairs': 执行过的修复}
+        """
+        messages = [
+            {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ]
+        reply = await self._chat(messages, max_tokens=max_tokens, model=model)
+        raw_text = reply['content']
+        repairs: List[str] = []
+        
+        parser = TolerantJSONParser()
+        parser.feed(raw_text)
+        
+        # 截断续写
+        attempts = 0
+        while (reply['finish_reason'] == 'length' or not parser.done) and attempts < self.max_continuations:
+            if not raw_text.strip():
+                break
+            attempts += 1
+            reply = await self._chat(
+                messages + [
+                    {"role": "assistant", "content": raw_text},
+                    {"role": "user", "content": CONTINUATION_PROMPT}
+                ],
+                max_tokens=max_tokens // 2,
+                model=model,
+                json_mode=False
+            )
+            continuation = strip_code_fence(reply['content'])
+            raw_text += continuation
+            parser.feed(continuation)
+            repairs.append('continuation')
+        
+        try:
+            analysis, truncated = parser.result()
+        except ValueError:
+            analysis, truncated = None, False
+        if not isinstance(analysis, dict):
+            return {'text': raw_text, 'analysis': None, 'errors': ['无法解析JSON'], 'repairs': repairs}
+        if truncated:
+            repairs.append('truncated')
+        
+        # 只补全缺失的顶层字段
+        missing = missing_top_level(analysis, schema)
+        if missing and len(missing) < len(schema.get('required', [])):
+            try:
+                reply = await self._chat(
+                    messages + [
+                        {"role": "assistant", "content": json.dumps(analysis, ensure_ascii=False)},
+                        {"role": "user", "content": get_fill_missing_prompt(missing)}
+                    ],
+                    max_tokens=max_tokens // 2,
+                    model=model
+                )
+                patch, _ = parse_llm_json(reply['content'])
+                if isinstance(patch, dict):
+                    analysis.update({k: v for k, v in patch.items() if k in missing})
+                    repairs.append('fill_missing')
+            except Exception as e:
+                print(f"⚠️  补全缺失字段失败: {e}")
+        
+        return {
+            # 存储规范化后的JSON，前端可以直接JSON.parse
+            'text': json.dumps(analysis, ensure_ascii=False),
+            'analysis': analysis,
+            'errors': validate_analysis(analysis, schema),
+            'repairs': repairs
+        }
+    
     async def _call_openrouter(
         self,
         system_prompt: str,
         user_prompt: str,
         temperature: float = 0.7,
-        max_tokens: int = 4000
+        max_tokens: int = 4000,
+        model: Optional[str] = None
     ) -> str:
         """
         调用OpenRouter API
@@ -87,20 +602,13 @@ class LLMAnalyzer:
             user_prompt: 用户提示词
             temperature: 温度参数
             max_tokens: 最大token数
+            model: 使用的模型（默认self.model）
         
         Returns:
             模型返回的文本
         """
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://github.com/your-repo",  # 可选，用于统计
-            "X-Title": "Questionnaire Analysis System"  # 可选
-        }
-        
-        payload = {
-            "model": self.model,
-            "messages": [
+        reply = await self._chat(
+            [
                 {
                     "role": "system",
                     "content": system_prompt
@@ -110,87 +618,177 @@ class LLMAnalyzer:
                     "content": user_prompt
                 }
             ],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            model=model
+        )
+        return reply['content']
+    
+    async def _chat(
+        self,
+        messages: List[Dict],
+        temperature: float = 0.7,
+        max_tokens: int = 4000,
+        model: Optional[str] = None,
+        json_mode: bool = True
+    ) -> Dict:
+        """
+        发送chat/completions请求，并把延迟/首token时间/输出token数记入模型路由指标
+        
+        Returns:
+            {'content': 模型返回的文本, 'finish_reason': 结束原因（length表示被截断）}
+        """
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": "https://github.com/your-repo",  # 可选，用于统计
+            "X-Title": "Questionnaire Analysis System"  # 可选
+        }
+        
+        model = model or self.model
+        payload = {
+            "model": model,
+            "messages": messages,
             "temperature": temperature,
-            "max_tokens": max_tokens,
-            "response_format": {"type": "json_object"}  # 强制JSON输出
+            "max_tokens": max_tokens
         }
+        if json_mode:
+            payload["response_format"] = {"type": "json_object"}  # 强制JSON输出
+        if self.stream:
+            payload["stream"] = True
+        
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                reply = await self._send(payload, headers, started)
+                break
+            except asyncio.CancelledError:
+                # 竞速中被其他模型抢先，不计入该模型的失败
+                raise
+            except Exception as e:
+                self.router.record(model, ok=False, latency=time.perf_counter() - started, error=str(e)[:200])
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                print(f"🔁 {model} 请求失败，{delay:.1f}秒后第{attempt}次重试: {str(e)[:120]}")
+                await asyncio.sleep(delay)
+        
+        self.router.record(
+            model,
+            ok=True,
+            latency=time.perf_counter() - started,
+            ttft=reply.pop('ttft'),
+            output_tokens=reply.pop('output_tokens') or estimate_tokens(reply['content'])
+        )
+        return reply
+    
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """可重试的错误返回等待秒数，否则返回None"""
+        if attempt >= self.max_retries:
+            return None
+        if isinstance(error, OpenRouterError):
+            if error.status_code not in RETRYABLE_STATUS:
+                return None
+            if error.retry_after is not None:
+                return min(error.retry_after, MAX_RETRY_DELAY)
+        elif not isinstance(error, httpx.TransportError):
+            return None
+        delay = self.retry_base_delay * (2 ** attempt)
+        return min(delay * random.uniform(0.5, 1.0), MAX_RETRY_DELAY)
+    
+    async def _send(self, payload: Dict, headers: Dict, started: float) -> Dict:
+        """
+        发送请求并解析响应（普通JSON或SSE流）
         
+        Returns:
+            {'content', 'finish_reason', 'ttft': 首个内容到达的秒数, 'output_tokens': usage中的输出token数}
+        """
         async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
+            async with client.stream(
+                "POST",
                 f"{self.api_base}/chat/completions",
                 headers=headers,
                 json=payload
-            )
-            
-            if response.status_code != 200:
-                raise Exception(f"OpenRouter API错误: {response.status_code} - {response.text}")
-            
-            result = response.json()
-            
-            # 提取返回的文本
-            if 'choices' in result and len(result['choices']) > 0:
-                return result['choices'][0]['message']['content']
-            else:
-                raise Exception(f"OpenRouter返回格式错误: {result}")
+            ) as response:
+                if response.status_code != 200:
+                    body = (await response.aread()).decode('utf-8', errors='replace')
+                    retry_after = response.headers.get('retry-after')
+                    raise OpenRouterError(
+                        f"OpenRouter API错误: {response.status_code} - {body}",
+                        response.status_code,
+                        float(retry_after) if retry_after and retry_after.replace('.', '', 1).isdigit() else None
+                    )
+                
+                if 'text/event-stream' in response.headers.get('content-type', ''):
+                    return await self._read_stream(response, started)
+                
+                chunks, ttft = [], None
+                async for chunk in response.aiter_bytes():
+                    if ttft is None:
+                        ttft = time.perf_counter() - started
+                    chunks.append(chunk)
+                result = json.loads(b''.join(chunks))
+        
+        # 提取返回的文本
+        if 'choices' in result and len(result['choices']) > 0:
+            choice = result['choices'][0]
+            return {
+                'content': choice['message']['content'] or '',
+                'finish_reason': choice.get('finish_reason'),
+                'ttft': ttft,
+                'output_tokens': (result.get('usage') or {}).get('completion_tokens')
+            }
+        else:
+            raise Exception(f"OpenRouter返回格式错误: {result}")
+    
+    async def _read_stream(self, response: httpx.Response, started: float) -> Dict:
+        """读取SSE流式响应（data: {...} 行，以 data: [DONE] 结束）"""
+        parts: List[str] = []
+        finish_reason, usage, ttft = None, None, None
+        async for line in response.aiter_lines():
+            if not line.startswith('data:'):
+                continue    # 注释行（: OPENROUTER PROCESSING）或空行
+            data = line[5:].strip()
+            if data == '[DONE]':
+                break
+            chunk = json.loads(data)
+            if 'error' in chunk:
+                raise Exception(f"OpenRouter流式响应错误: {chunk['error']}")
+            usage = chunk.get('usage') or usage
+            for choice in chunk.get('choices') or []:
+                content = (choice.get('delta') or {}).get('content')
+                if content:
+                    if ttft is None:
+                        ttft = time.perf_counter() - started
+                    parts.append(content)
+                finish_reason = choice.get('finish_reason') or finish_reason
+        return {
+            'content': ''.join(parts),
+            'finish_reason': finish_reason,
+            'ttft': ttft,
+            'output_tokens': (usage or {}).get('completion_tokens')
+        }
     
     def get_available_models(self) -> list:
         """
-        获取OpenRouter支持的模型列表
+        获取可选模型列表（附带最近调用的实时指标）
         
         Returns:
-            推荐的模型列表
-        """
-        return [
-            {
-                "id": "openai/gpt-5.1",
-                "name": "gpt-5.1",
-                "provider": "openai",
-                "description": "高质量分析，推理能力强",
-                "recommended": True
-            },
-            {
-                "id": "openai/gpt-4-turbo",
-                "name": "GPT-4 Turbo",
-                "provider": "OpenAI",
-                "description": "强大的通用能力",
-                "recommended": True
-            },
-            {
-                "id": "anthropic/claude-3-opus",
-                "name": "Claude 3 Opus",
-                "provider": "Anthropic",
-                "description": "最强分析能力（较贵）",
-                "recommended": False
-            },
-            {
-                "id": "openai/gpt-4o",
-                "name": "GPT-4o",
-                "provider": "OpenAI",
-                "description": "最新的GPT-4优化版本",
-                "recommended": True
-            },
-            {
-                "id": "google/gemini-pro-1.5",
-                "name": "Gemini Pro 1.5",
-                "provider": "Google",
-                "description": "长上下文支持",
-                "recommended": False
-            },
-            {
-                "id": "qwen/qwen-2.5-72b-instruct",
-                "name": "Qwen 2.5 72B",
-                "provider": "Alibaba",
-                "description": "中文优化，性价比高",
-                "recommended": True
-            },
-            {
-                "id": "deepseek/deepseek-chat",
-                "name": "DeepSeek Chat",
-                "provider": "DeepSeek",
-                "description": "性价比极高，中文友好",
-                "recommended": True
-            }
-        ]
+            模型列表，live字段为延迟/首token时间/失败率/输出速度
+        """
+        routing = self.router.snapshot()
+        catalog_ids = {m['id'] for m in MODEL_CATALOG}
+        models = [{**m, 'live': routing['models'].get(m['id'])} for m in MODEL_CATALOG]
+        # 默认模型和路由候选可能不在推荐列表中
+        models.extend(
+            {"id": model_id, "name": model_id, "provider": model_id.split('/')[0],
+             "description": "当前配置的模型", "recommended": False,
+             "tier": live['tier'], "live": live}
+            for model_id, live in routing['models'].items() if model_id not in catalog_ids
+        )
+        return models
 
 
 # 创建全局实例
@@ -0,0 +1,492 @@
+"""
+本地内存存储（Supabase客户端替身）
+用于压测和离线开发：实现Database用到的PostgREST查询子集，数据只保存在进程内存中
+
+启用方式：在.env中设置 DATABASE_BACKEND=local
+"""
+import copy
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+
+# 各表的唯一约束（约束名 -> 字段），与database_schema.sql保持一致
+UNIQUE_CONSTRAINTS = {
+    'responses': {
+        'unique_ip_session': ('ip_hash', 'session_id'),
+        'unique_client_submission': ('session_id', 'client_submission_id'),
+    },
+    'analysis_results': {
+        'analysis_results_session_id_key': ('session_id',),
+    },
+    'sessions': {
+        'sessions_pkey': ('session_id',),
+    },
+    'session_sketches': {
+        'session_sketches_pkey': ('session_id',),
+    },
+    'session_snapshots': {
+        'session_snapshots_pkey': ('session_id',),
+    },
+    'session_free_text': {
+        'session_free_text_pkey': ('session_id',),
+    },
+}
+
+# 需要自动生成UUID主键的表
+UUID_PK_TABLES = {'responses', 'analysis_results'}
+
+
+class LocalStoreError(Exception):
+    """本地存储错误（对应PostgREST的APIError）"""
+
+
+class LocalResponse:
+    """查询结果（与postgrest的APIResponse字段一致）"""
+
+    def __init__(self, data: Any, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+def _now_iso() -> str:
+    """当前UTC时间（固定微秒精度，保证字符串可直接比较大小）"""
+    return datetime.now(timezone.utc).isoformat(timespec='microseconds')
+
+
+_COMPARE_OPS = {
+    'eq': lambda a, b: a == b,
+    'neq': lambda a, b: a != b,
+    'gt': lambda a, b: a > b,
+    'gte': lambda a, b: a >= b,
+    'lt': lambda a, b: a < b,
+    'lte': lambda a, b: a <= b,
+}
+
+
+def _split_top_level(expr: str) -> List[str]:
+    """按不在括号/引号内的逗号切分"""
+    parts, depth, quoted, start = [], 0, False, 0
+    for i, ch in enumerate(expr):
+        if ch == '"':
+            quoted = not quoted
+        elif quoted:
+            continue
+        elif ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        elif ch == ',' and depth == 0:
+            parts.append(expr[start:i])
+            start = i + 1
+    parts.append(expr[start:])
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _parse_condition(expr: str):
+    """解析单个条件（column.op.value 或嵌套的 and(...)/or(...)）为行过滤函数"""
+    for logic, combine in (('and(', all), ('or(', any)):
+        if expr.startswith(logic) and expr.endswith(')'):
+            subs = [_parse_condition(c) for c in _split_top_level(expr[len(logic):-1])]
+            return lambda r: combine(c(r) for c in subs)
+
+    column, op, value = expr.split('.', 2)
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        value = value[1:-1]
+    if op == 'is':
+        return lambda r: (r.get(column) is None) == (value == 'null')
+    compare = _COMPARE_OPS[op]
+
+    def check(row):
+        actual = row.get(column)
+        if actual is None:
+            return False
+        # 过滤值以字符串形式传入，按字段实际类型比较
+        expected = type(actual)(value) if isinstance(actual, (int, float)) and not isinstance(actual, bool) else value
+        return compare(str(actual) if isinstance(expected, str) else actual, expected)
+    return check
+
+
+class LocalQueryBuilder:
+    """链式查询构造器，模仿supabase-py的table()接口"""
+
+    def __init__(self, store: 'LocalClient', table: str):
+        self._store = store
+        self._table = table
+        self._op = 'select'
+        self._columns: Optional[List[str]] = None
+        self._count: Optional[str] = None
+        self._payload: Any = None
+        self._on_conflict: Optional[str] = None
+        self._ignore_duplicates = False
+        self._filters: List = []
+        self._order: List = []
+        self._limit: Optional[int] = None
+        self._offset = 0
+        self._single = False
+
+    # ---------------- 操作类型 ----------------
+
+    def select(self, columns: str = '*', count: Optional[str] = None):
+        self._columns = None if columns.strip() == '*' else [
+            c.strip() for c in columns.split(',') if c.strip()
+        ]
+        self._count = count
+        return self
+
+    def insert(self, data, **kwargs):
+        self._op = 'insert'
+        self._payload = data
+        return self
+
+    def upsert(self, data, on_conflict: str = '', ignore_duplicates: bool = False, **kwargs):
+        self._op = 'upsert'
+        self._payload = data
+        self._on_conflict = on_conflict or None
+        self._ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, data, **kwargs):
+        self._op = 'update'
+        self._payload = data
+        return self
+
+    def delete(self, **kwargs):
+        self._op = 'delete'
+        return self
+
+    # ---------------- 过滤条件 ----------------
+
+    def eq(self, column: str, value):
+        self._filters.append(lambda r: r.get(column) == value)
+        return self
+
+    def neq(self, column: str, value):
+        self._filters.append(lambda r: r.get(column) != value)
+        return self
+
+    def gt(self, column: str, value):
+        self._filters.append(lambda r: r.get(column) is not None and r.get(column) > value)
+        return self
+
+    def gte(self, column: str, value):
+        self._filters.append(lambda r: r.get(column) is not None and r.get(column) >= value)
+        return self
+
+    def lt(self, column: str, value):
+        self._filters.append(lambda r: r.get(column) is not None and r.get(column) < value)
+        return self
+
+    def lte(self, column: str, value):
+        self._filters.append(lambda r: r.get(column) is not None and r.get(column) <= value)
+        return self
+
+    def in_(self, column: str, values):
+        values = set(values)
+        self._filters.append(lambda r: r.get(column) in values)
+        return self
+
+    def is_(self, column: str, value):
+        if value in (None, 'null'):
+            self._filters.append(lambda r: r.get(column) is None)
+        else:
+            self._filters.append(lambda r: r.get(column) is not None)
+        return self
+
+    def or_(self, filters: str, **kwargs):
+        """PostgREST逻辑表达式，如 created_at.lt.X,and(created_at.eq.X,id.lt.Y)"""
+        conditions = [_parse_condition(c) for c in _split_top_level(filters)]
+        self._filters.append(lambda r: any(c(r) for c in conditions))
+        return self
+
+    # ---------------- 排序与分页 ----------------
+
+    def order(self, column: str, desc: bool = False, **kwargs):
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, size: int, **kwargs):
+        self._limit = size
+        return self
+
+    def range(self, start: int, end: int, **kwargs):
+        self._offset = start
+        self._limit = end - start + 1
+        return self
+
+    def single(self):
+        self._single = True
+        return self
+
+    # ---------------- 执行 ----------------
+
+    def execute(self) -> LocalResponse:
+        with self._store._lock:
+            rows = self._store._tables.setdefault(self._table, [])
+            if self._op == 'insert':
+                return LocalResponse(self._insert(rows, self._as_list(self._payload)))
+            if self._op == 'upsert':
+                return LocalResponse(self._upsert(rows, self._as_list(self._payload)))
+            if self._op == 'update':
+                return LocalResponse(self._update(rows))
+            if self._op == 'delete':
+                return LocalResponse(self._delete(rows))
+            return self._select(rows)
+
+    @staticmethod
+    def _as_list(payload) -> List[Dict[str, Any]]:
+        return payload if isinstance(payload, list) else [payload]
+
+    def _matches(self, row: Dict[str, Any]) -> bool:
+        return all(f(row) for f in self._filters)
+
+    def _with_defaults(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        row = dict(data)
+        if self._table in UUID_PK_TABLES:
+            row.setdefault('id', str(uuid.uuid4()))
+        row.setdefault('created_at', _now_iso())
+        if self._table == 'analysis_results':
+            row['updated_at'] = _now_iso()
+        return row
+
+    def _unique_keys(self, row: Dict[str, Any]):
+        """返回该行在各唯一约束下的键（含NULL的组合与PostgreSQL一致，不参与检查）"""
+        for name, fields in UNIQUE_CONSTRAINTS.get(self._table, {}).items():
+            key = tuple(row.get(f) for f in fields)
+            if not any(v is None for v in key):
+                yield name, key
+
+    def _insert(self, rows, items):
+        index = self._store._unique_index(self._table)
+        new_rows = []
+        pending = set()
+        for item in items:
+            row = self._with_defaults(item)
+            for name, key in self._unique_keys(row):
+                if key in index[name] or (name, key) in pending:
+                    raise LocalStoreError(
+                        f'duplicate key value violates unique constraint "{name}"'
+                    )
+                pending.add((name, key))
+            new_rows.append(row)
+        # 整批校验通过后才写入，与单条INSERT语句的原子性一致
+        for name, key in pending:
+            index[name].add(key)
+        rows.extend(new_rows)
+        return copy.deepcopy(new_rows)
+
+    def _upsert(self, rows, items):
+        # 与单条INSERT ... ON CONFLICT语句一致：任一行失败时整批回滚
+        original_len = len(rows)
+        originals = []
+        try:
+            return self._upsert_rows(rows, items, originals)
+        except LocalStoreError:
+            del rows[original_len:]
+            for row, before in originals:
+                row.clear()
+                row.update(before)
+            self._store._rebuild_unique_index(self._table)
+            raise
+
+    def _upsert_rows(self, rows, items, originals):
+        conflict_fields = [f.strip() for f in (self._on_conflict or 'id').split(',')]
+        result = []
+        for item in items:
+            key = tuple(item.get(f) for f in conflict_fields)
+            existing = next(
+                (r for r in rows if tuple(r.get(f) for f in conflict_fields) == key),
+                None
+            )
+            if existing is None:
+                result.extend(self._insert(rows, [item]))
+            elif not self._ignore_duplicates:
+                originals.append((existing, dict(existing)))
+                existing.update(item)
+                if self._table == 'analysis_results':
+                    existing['updated_at'] = _now_iso()
+                self._store._rebuild_unique_index(self._table)
+                result.append(copy.deepcopy(existing))
+        return result
+
+    def _update(self, rows):
+        result = []
+        for row in rows:
+            if self._matches(row):
+                row.update(self._payload)
+                result.append(copy.deepcopy(row))
+        if result:
+            self._store._rebuild_unique_index(self._table)
+        return result
+
+    def _delete(self, rows):
+        kept, deleted = [], []
+        for row in rows:
+            (deleted if self._matches(row) else kept).append(row)
+        rows[:] = kept
+        if deleted:
+            self._store._rebuild_unique_index(self._table)
+        return deleted
+
+    def _select(self, rows) -> LocalResponse:
+        matched = [r for r in rows if self._matches(r)]
+        total = len(matched)
+
+        # 多列排序：从最后一个排序键开始做稳定排序
+        for column, desc in reversed(self._order):
+            matched.sort(
+                key=lambda r: (r.get(column) is None, r.get(column) if r.get(column) is not None else 0),
+                reverse=desc
+            )
+
+        if self._limit is not None:
+            matched = matched[self._offset:self._offset + self._limit]
+        elif self._offset:
+            matched = matched[self._offset:]
+
+        if self._columns is not None:
+            matched = [{c: r.get(c) for c in self._columns} for r in matched]
+        data = copy.deepcopy(matched)
+
+        count = total if self._count else None
+        if self._single:
+            if len(data) != 1:
+                raise LocalStoreError(
+                    'JSON object requested, multiple (or no) rows returned (No rows found)'
+                )
+            return LocalResponse(data[0], count)
+        return LocalResponse(data, count)
+
+
+class LocalRPC:
+    """数据库函数调用（对应database_schema.sql中的函数）"""
+
+    def __init__(self, store: 'LocalClient', name: str, params: Dict[str, Any]):
+        self._store = store
+        self._name = name
+        self._params = params or {}
+
+    def execute(self) -> LocalResponse:
+        handler = getattr(self._store, f'_rpc_{self._name}', None)
+        if handler is None:
+            raise LocalStoreError(f'Could not find the function public.{self._name}')
+        with self._store._lock:
+            return LocalResponse(handler(**self._params))
+
+
+class LocalClient:
+    """进程内存版Supabase客户端"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._tables: Dict[str, List[Dict[str, Any]]] = {
+            'responses': [],
+            'analysis_results': [],
+            'sessions': [],
+            'session_sketches': [],
+            'session_snapshots': [],
+            'session_free_text': [],
+        }
+        self._indexes: Dict[str, Dict[str, set]] = {}
+
+    def _unique_index(self, table: str) -> Dict[str, set]:
+        """唯一约束索引（约束名 -> 已存在的键集合），避免每次插入全表扫描"""
+        if table not in self._indexes:
+            self._rebuild_unique_index(table)
+        return self._indexes[table]
+
+    def _rebuild_unique_index(self, table: str):
+        index = {name: set() for name in UNIQUE_CONSTRAINTS.get(table, {})}
+        for row in self._tables.get(table, []):
+            for name, fields in UNIQUE_CONSTRAINTS.get(table, {}).items():
+                key = tuple(row.get(f) for f in fields)
+                if not any(v is None for v in key):
+                    index[name].add(key)
+        self._indexes[table] = index
+
+    def table(self, name: str) -> LocalQueryBuilder:
+        return LocalQueryBuilder(self, name)
+
+    def rpc(self, name: str, params: Optional[Dict[str, Any]] = None) -> LocalRPC:
+        return LocalRPC(self, name, params)
+
+    # ---------------- 数据库函数实现 ----------------
+
+    def _rpc_get_session_statistics(self, p_session_id: str) -> Dict[str, Any]:
+        """与SQL函数get_session_statistics返回结构一致"""
+        rows = [r for r in self._tables['responses'] if r.get('session_id') == p_session_id]
+
+        def dist(field: str) -> Optional[Dict[str, int]]:
+            counts: Dict[str, int] = {}
+            for r in rows:
+                value = r.get(field)
+                key = 'unknown' if value is None else str(value)
+                counts[key] = counts.get(key, 0) + 1
+            return counts or None
+
+        def multi_dist(field: str) -> Optional[Dict[str, int]]:
+            counts: Dict[str, int] = {}
+            for r in rows:
+                for item in r.get(field) or []:
+                    counts[item] = counts.get(item, 0) + 1
+            return counts or None
+
+        times = [r['completion_time_seconds'] for r in rows
+                 if r.get('completion_time_seconds') is not None]
+
+        return {
+            'total_responses': len(rows),
+            'avg_completion_time': round(sum(times) / len(times), 1) if times else None,
+            'mobile_count': sum(1 for r in rows if r.get('device_type') == 'mobile'),
+            'desktop_count': sum(1 for r in rows if r.get('device_type') == 'desktop'),
+            'industries': dist('q1_industry'),
+            'roles': dist('q2_role'),
+            'digital_habits': dist('q3_digital_habit'),
+            'ai_self_positions': dist('q4_ai_self_position'),
+            'ai_usages': dist('q5_ai_usage'),
+            'org_stages': dist('q6_org_stage'),
+            'personal_roles': dist('q7_personal_role'),
+            'pain_points': multi_dist('q8_pain_points'),
+            'attitudes': dist('q9_attitude'),
+            'constraints': multi_dist('q10_constraints'),
+        }
+
+    def _rpc_cleanup_session_batch(self, p_session_id: str, p_batch_size: int = 2000) -> int:
+        deleted = 0
+        kept = []
+        for row in self._tables['responses']:
+            if deleted < p_batch_size and row.get('session_id') == p_session_id:
+                deleted += 1
+            else:
+                kept.append(row)
+        if deleted:
+            self._tables['responses'] = kept
+            self._rebuild_unique_index('responses')
+        return deleted
+
+    def _rpc_truncate_session_partition(self, p_session_id: str) -> bool:
+        # 与分区表一致：只有在sessions表登记过的场次才有独立分区
+        if not any(r.get('session_id') == p_session_id for r in self._tables['sessions']):
+            return False
+        self._tables['responses'] = [
+            r for r in self._tables['responses'] if r.get('session_id') != p_session_id
+        ]
+        self._rebuild_unique_index('responses')
+        return True
+
+    def _rpc_cleanup_session_metadata(self, p_session_id: str) -> None:
+        for table in ('analysis_results', 'session_sketches', 'session_snapshots', 'session_free_text'):
+            self._tables[table] = [
+                r for r in self._tables[table] if r.get('session_id') != p_session_id
+            ]
+            self._rebuild_unique_index(table)
+        # 清空后场次重新开放提交
+        for row in self._tables['sessions']:
+            if row.get('session_id') == p_session_id:
+                row.update(is_active=True, end_time=None)
+
+    def _rpc_cleanup_session(self, p_session_id: str) -> int:
+        deleted = self._rpc_cleanup_session_batch(p_session_id, len(self._tables['responses']))
+        self._rpc_cleanup_session_metadata(p_session_id)
+        return deleted
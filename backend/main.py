@@ -6,19 +6,37 @@ import os
 from typing import Optional
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import ValidationError
 from dotenv import load_dotenv
-import csv
-import io
+import gzip
 
 from models import (
     QuestionnaireSubmit, 
     SubmitResponse, 
     StatsResponse,
-    ErrorResponse
+    ErrorResponse,
+    BatchSubmit,
+    BatchSubmitResponse,
+    parse_submission
 )
 from database import db
 from llm_analyzer import llm_analyzer
+from session_cache import SessionCache
+from crosstab import resolve_dimensions, compute_crosstab
+from segment_stats import resolve_segment_dimension, compute_segment_stats
+from live_metrics import live_metrics
+from completion_sketch import CompletionSketches
+from free_text_index import FreeTextIndex
+from bulk_import import detect_format, import_responses
+from submit_queue import SubmitQueue, QueueFullError
+from static_bundle import StaticBundle, accepted_encodings
+from questionnaire_config import questionnaire_config
+from stats_delta import StatsDeltaTracker
+from session_archive import SessionArchive, responses_to_csv
+from cleanup_jobs import CleanupJobs
+from json_repair import parse_llm_json
 
 # 加载环境变量
 load_dotenv()
@@ -40,6 +58,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 场次数据缓存（交叉分析等按场次版本复用）
+session_cache = SessionCache(db)
+
+# 完成时间分位数摘要
+completion_sketches = CompletionSketches(db)
+
+# "其他"自由填写答案归一化索引
+free_text_index = FreeTextIndex(db)
+
+# 提交合并队列（带client_submission_id的幂等提交）
+submit_queue = SubmitQueue(db)
+
+# 看板统计增量
+stats_deltas = StatsDeltaTracker(db)
+
+# 已关闭场次的归档快照
+session_archive = SessionArchive(db, completion_sketches, llm_analyzer, free_text_index)
+
+
+def _invalidate_session(session_id: str):
+    """场次数据被清理后丢弃所有内存缓存"""
+    session_cache.invalidate(session_id)
+    completion_sketches.invalidate(session_id)
+    free_text_index.invalidate(session_id)
+    stats_deltas.invalidate(session_id)
+    live_metrics.invalidate(session_id)
+    session_archive.invalidate(session_id)
+
+
+# 场次数据分批清理
+cleanup_jobs = CleanupJobs(db, on_finished=_invalidate_session)
+
+# 前端构建产物（python build_frontend.py 生成）
+static_bundle = StaticBundle()
+
 
 # ================================================================
 # API端点
@@ -63,20 +116,102 @@ async def root():
 @app.get("/health")
 async def health_check():
     """健康检查端点"""
-    return {"status": "healthy"}
+    return {"status": "healthy", "database": db.routing_stats()}
 
 
-@app.post("/api/submit", response_model=SubmitResponse)
-async def submit_questionnaire(
-    data: QuestionnaireSubmit,
-    request: Request
-):
+# 带 ?v=<版本> 请求时内容不会变化，可长期缓存；否则短缓存并用ETag协商
+CONFIG_IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+CONFIG_CACHE = 'public, max-age=300, stale-while-revalidate=86400'
+
+
+@app.get("/api/config")
+async def get_questionnaire_config(request: Request, v: Optional[str] = None):
+    """
+    问卷配置（题目、选项及图表用短标签）
+
+    内容在启动时序列化一次，ETag为内容哈希；带 ?v=<version> 时返回immutable缓存头
+    """
+    headers = {
+        'ETag': questionnaire_config.etag,
+        'X-Config-Version': questionnaire_config.version,
+        'Cache-Control': CONFIG_IMMUTABLE_CACHE if v == questionnaire_config.version else CONFIG_CACHE,
+    }
+    if request.headers.get('if-none-match') == questionnaire_config.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=questionnaire_config.body, media_type='application/json', headers=headers)
+
+
+@app.get("/static/{path:path}")
+async def static_files(path: str, request: Request):
+    """
+    前端页面与静态资源（自托管、带哈希文件名、预压缩）
+
+    例如 /static/questionnaire.html、/static/assets/echarts.min.<hash>.js
+    """
+    return static_bundle.response(path, request)
+
+
+def _after_submit(data: QuestionnaireSubmit, response_id: str):
+    """新回答写入后更新实时指标"""
+    live_metrics.record(
+        data.session_id,
+        completion_seconds=data.completion_time_seconds,
+        response_id=response_id
+    )
+    completion_sketches.schedule_refresh(data.session_id)
+    if data.q1_industry_other or data.q2_role_other:
+        free_text_index.schedule_refresh(data.session_id)
+
+
+SESSION_CLOSED_MESSAGE = "本场问卷已结束，不再接收提交"
+
+
+def _snapshot_response(
+    request: Request,
+    snapshot,
+    content: bytes,
+    media_type: str,
+    headers: Optional[dict] = None,
+    variant: str = ''
+) -> Response:
+    """返回归档快照内容（快照不可变，ETag协商后直接304）"""
+    etag = f'"{snapshot.etag}{variant}"'
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache', **(headers or {})}
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=content, media_type=media_type, headers=headers)
+
+
+def _submit_response(response_id: str, duplicate: bool = False) -> Response:
+    """提交结果直接序列化为JSON（不再经过response_model的校验和jsonable_encoder）"""
+    body = SubmitResponse(
+        success=True,
+        message="已提交（重复请求）" if duplicate else "提交成功",
+        id=response_id,
+        duplicate=duplicate
+    ).model_dump_json()
+    return Response(content=body, media_type="application/json")
+
+
+@app.post(
+    "/api/submit",
+    response_model=SubmitResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": QuestionnaireSubmit.model_json_schema()}}
+        }
+    }
+)
+async def submit_questionnaire(request: Request):
     """
     接收问卷提交
     
+    请求体直接交给pydantic-core解码并校验（parse_submission），
+    校验失败时与FastAPI默认行为一样返回422
+    
     Args:
-        data: 问卷数据
-        request: HTTP请求对象
+        request: HTTP请求对象（请求体为QuestionnaireSubmit的JSON）
         
     Returns:
         提交成功响应，包含响应ID
@@ -84,37 +219,42 @@ async def submit_questionnaire(
     Raises:
         HTTPException: 提交失败时返回错误
     """
+    try:
+        data = parse_submission(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, 'loc': ('body', *error['loc'])} for error in e.errors(include_url=False)]
+        )
+    
+    if await session_archive.is_closed(data.session_id):
+        raise HTTPException(status_code=403, detail=SESSION_CLOSED_MESSAGE)
+    
     try:
         # 准备插入数据库的数据
-        db_data = {
-            'session_id': data.session_id,
-            'q1_industry': data.q1_industry,
-            'q1_industry_other': data.q1_industry_other,
-            'q2_role': data.q2_role,
-            'q2_role_other': data.q2_role_other,
-            'q3_digital_habit': data.q3_digital_habit,
-            'q4_ai_self_position': data.q4_ai_self_position,
-            'q5_ai_usage': data.q5_ai_usage,
-            'q6_org_stage': data.q6_org_stage,
-            'q7_personal_role': data.q7_personal_role,
-            'q8_pain_points': data.q8_pain_points,
-            'q9_attitude': data.q9_attitude,
-            'q10_constraints': data.q10_constraints,
-            'completion_time_seconds': data.completion_time_seconds,
-            'device_type': data.device_type,
-            'user_agent': data.user_agent,
-            'ip_hash': data.ip_hash
-        }
+        db_data = data.to_row()
+        
+        # 离线队列的幂等提交：合并写入，重试不会产生重复数据
+        if data.client_submission_id:
+            outcome = (await submit_queue.submit([db_data]))[db_data['client_submission_id']]
+            if outcome['status'] == 'rejected':
+                raise Exception(outcome['error'])
+            if outcome['status'] == 'created':
+                _after_submit(data, outcome['id'])
+            return _submit_response(outcome['id'], duplicate=outcome['status'] == 'duplicate')
         
         # 插入数据库
         response_id = await db.insert_response(db_data)
         
-        return SubmitResponse(
-            success=True,
-            message="提交成功",
-            id=response_id
-        )
+        _after_submit(data, response_id)
         
+        return _submit_response(response_id)
+        
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         error_msg = str(e)
         
@@ -132,8 +272,118 @@ async def submit_questionnaire(
         )
 
 
+@app.post("/api/submit/batch", response_model=BatchSubmitResponse)
+async def submit_batch(batch: BatchSubmit):
+    """
+    批量幂等提交（问卷页离线队列上传）
+    
+    每条提交都带客户端生成的client_submission_id，重复上传同一条会返回duplicate和原来的ID，
+    单条被拒绝（如同一设备已提交）不影响其他条。
+    
+    Returns:
+        {"success": true, "results": [{"client_submission_id": "...", "status": "created", "id": "..."}]}
+        
+    Raises:
+        HTTPException: 服务器繁忙返回503（带Retry-After），写入失败返回500
+    """
+    closed = {
+        session_id for session_id in {item.session_id for item in batch.submissions}
+        if await session_archive.is_closed(session_id)
+    }
+    rows = [item.to_row() for item in batch.submissions if item.session_id not in closed]
+    try:
+        outcomes = await submit_queue.submit(rows) if rows else {}
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"提交失败: {str(e)}"
+        )
+    
+    results = []
+    for item in batch.submissions:
+        row = item.to_row()
+        if item.session_id in closed:
+            results.append({
+                'client_submission_id': row['client_submission_id'],
+                'status': 'rejected',
+                'error': SESSION_CLOSED_MESSAGE
+            })
+            continue
+        outcome = outcomes[row['client_submission_id']]
+        if outcome['status'] == 'created':
+            _after_submit(item, outcome['id'])
+        results.append({'client_submission_id': row['client_submission_id'], **outcome})
+    
+    return BatchSubmitResponse(success=True, results=results)
+
+
+async def _closed_session_error(session_id: str) -> Optional[str]:
+    """导入时逐行检查：文件中指定的场次已关闭则拒绝该行"""
+    if await session_archive.is_closed(session_id):
+        return SESSION_CLOSED_MESSAGE
+    return None
+
+
+@app.post("/api/import")
+async def bulk_import(
+    request: Request,
+    session_id: Optional[str] = None,
+    format: Optional[str] = None,
+    dry_run: bool = False
+):
+    """
+    批量导入问卷回答（线下/纸质问卷）
+    
+    请求体直接上传CSV或NDJSON文件内容（流式读取，不需要multipart），例如：
+        curl -X POST "http://localhost:8000/api/import?session_id=XXX" \\
+             -H "Content-Type: text/csv" --data-binary @responses.csv
+    
+    Args:
+        session_id: 指定场次（覆盖文件中的session_id）
+        format: csv / ndjson，默认根据Content-Type判断
+        dry_run: 只校验不写入
+        
+    Returns:
+        {"success": true, "total_rows": 2000, "inserted": 1998, "failed": 2,
+         "errors": [{"row": 17, "errors": ["q3_digital_habit: ..."]}], "rows_per_second": 5200.0, ...}
+    """
+    fmt = format or detect_format(request.headers.get('content-type'))
+    if fmt not in ('csv', 'ndjson'):
+        raise HTTPException(status_code=400, detail="format只能是csv或ndjson")
+    if session_id and not dry_run and await session_archive.is_closed(session_id):
+        raise HTTPException(status_code=403, detail=SESSION_CLOSED_MESSAGE)
+    
+    try:
+        report = await import_responses(db, request.stream(), fmt, session_id, dry_run, _closed_session_error)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"导入失败: {str(e)}"
+        )
+    
+    if report['inserted']:
+        # 带原填写时间的行可能早于摘要/索引的水位线，增量折叠读不到，需要从头重建
+        for imported_session, earliest in report['earliest_created_at'].items():
+            try:
+                await completion_sketches.rebuild_if_behind(imported_session, earliest)
+                await free_text_index.rebuild_if_behind(imported_session, earliest)
+            except Exception as e:
+                print(f"⚠️  重建完成时间摘要/自由填写索引失败: {e}")
+        for imported_session in report['sessions']:
+            completion_sketches.schedule_refresh(imported_session)
+            free_text_index.schedule_refresh(imported_session)
+    
+    return report
+
+
 @app.get("/api/stats")
-async def get_statistics(session_id: str):
+async def get_statistics(session_id: str, request: Request):
     """
     获取问卷统计数据
     
@@ -146,8 +396,16 @@ async def get_statistics(session_id: str):
     Raises:
         HTTPException: 查询失败时返回错误
     """
+    snapshot = await session_archive.get(session_id)
+    if snapshot:
+        return _snapshot_response(request, snapshot, snapshot.stats_body, 'application/json')
+    
     try:
         stats = await db.get_statistics(session_id)
+        # 完成时间中位数/P90（平均值会被长时间挂着页面的少数人拉高）
+        stats['completion_time_quantiles'] = await completion_sketches.quantiles(session_id)
+        # "其他"选项的自由填写答案按归一化后的簇计数
+        stats['other_answers'] = await free_text_index.summary(session_id)
         return stats
         
     except Exception as e:
@@ -157,8 +415,119 @@ async def get_statistics(session_id: str):
         )
 
 
+@app.get("/api/stats/delta")
+async def get_statistics_delta(session_id: str, since: Optional[str] = None):
+    """
+    统计增量（看板轮询用）
+    
+    Args:
+        session_id: 场次ID
+        since: 客户端已有的统计版本（上次响应中的version），不传时返回全量
+        
+    Returns:
+        {"version": ..., "unchanged": true} / {"version": ..., "base": since, "set": {...}, "scalars": {...}}
+        / {"version": ..., "full": true, "stats": {...}}
+        
+    Raises:
+        HTTPException: 查询失败时返回错误
+    """
+    snapshot = await session_archive.get(session_id)
+    if snapshot:
+        version = f"archived:{snapshot.etag}"
+        if since == version:
+            return {'version': version, 'unchanged': True}
+        return {'version': version, 'full': True, 'stats': snapshot.stats, 'archived': True}
+    
+    try:
+        return await stats_deltas.delta(session_id, since)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"获取统计增量失败: {str(e)}"
+        )
+
+
+@app.get("/api/stats/completion")
+async def get_completion_quantiles(session_ids: str):
+    """
+    完成时间分位数（可合并多个场次）
+    
+    Args:
+        session_ids: 场次ID，逗号分隔
+        
+    Returns:
+        {"all": {"p50": 150.0, "p90": 320.0, "count": 42}, "mobile": {...}, "desktop": {...}}
+        
+    Raises:
+        HTTPException: 查询失败时返回错误
+    """
+    ids = [s.strip() for s in session_ids.split(',') if s.strip()]
+    if not ids:
+        raise HTTPException(status_code=400, detail="session_ids不能为空")
+    
+    try:
+        return await completion_sketches.merged_quantiles(ids)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"获取完成时间分位数失败: {str(e)}"
+        )
+
+
+@app.get("/api/stats/other")
+async def get_other_answers(session_id: str):
+    """
+    "其他"选项的自由填写答案（按归一化后的簇计数）
+    
+    Args:
+        session_id: 场次ID
+        
+    Returns:
+        {"industries": [{"label": "金融监管", "count": 5, "variants": ["金融监管机构"]}], "roles": [...]}
+        
+    Raises:
+        HTTPException: 查询失败时返回错误
+    """
+    try:
+        return await free_text_index.summary(session_id)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"获取自由填写答案失败: {str(e)}"
+        )
+
+
+@app.get("/api/stats/timeseries")
+async def get_submission_timeseries(session_id: str, resolution: str = '5s', buckets: Optional[int] = None):
+    """
+    实时提交曲线
+    
+    Args:
+        session_id: 场次ID（查询参数）
+        resolution: 分桶粒度，5s（最近30分钟）或 1m（最近4小时）
+        buckets: 只返回最近N个桶
+        
+    Returns:
+        {"buckets": [[起始时间戳, 提交数], ...], "rate_per_minute": 3,
+         "completion_time": {"p50": .., "p90": .., ...}, "latest_submission": {...}}
+        
+    Raises:
+        HTTPException: 参数错误返回400，查询失败返回500
+    """
+    try:
+        await live_metrics.sync(db, session_id)
+        return live_metrics.snapshot(session_id, resolution, buckets)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"获取提交曲线失败: {str(e)}"
+        )
+
+
 @app.get("/api/export")
-async def export_data(session_id: str):
+async def export_data(session_id: str, request: Request):
     """
     导出问卷数据为CSV
     
@@ -166,11 +535,23 @@ async def export_data(session_id: str):
         session_id: 场次ID（查询参数）
         
     Returns:
-        CSV文件流
+        CSV文件流（已归档场次直接返回快照中gzip压缩的文件）
         
     Raises:
         HTTPException: 导出失败时返回错误
     """
+    disposition = {"Content-Disposition": f"attachment; filename=questionnaire_{session_id}.csv"}
+    
+    snapshot = await session_archive.get(session_id)
+    if snapshot:
+        disposition['Vary'] = 'Accept-Encoding'
+        if 'gzip' in accepted_encodings(request.headers.get('accept-encoding')):
+            return _snapshot_response(
+                request, snapshot, snapshot.export_gz, 'text/csv',
+                {**disposition, 'Content-Encoding': 'gzip'}, variant='-gzip'
+            )
+        return _snapshot_response(request, snapshot, gzip.decompress(snapshot.export_gz), 'text/csv', disposition)
+    
     try:
         # 获取所有回答
         responses = await db.get_all_responses(session_id)
@@ -181,42 +562,10 @@ async def export_data(session_id: str):
                 detail="未找到数据"
             )
         
-        # 创建CSV
-        output = io.StringIO()
-        
-        # 定义CSV列
-        fieldnames = [
-            'id', 'created_at', 'session_id',
-            'q1_industry', 'q1_industry_other',
-            'q2_role', 'q2_role_other',
-            'q3_digital_habit', 'q4_ai_self_position',
-            'q5_ai_usage', 'q6_org_stage', 'q7_personal_role',
-            'q8_pain_points', 'q9_attitude', 'q10_constraints',
-            'completion_time_seconds', 'device_type'
-        ]
-        
-        writer = csv.DictWriter(output, fieldnames=fieldnames, extrasaction='ignore')
-        writer.writeheader()
-        
-        # 写入数据
-        for response in responses:
-            # 将数组转换为字符串
-            if response.get('q8_pain_points'):
-                response['q8_pain_points'] = ','.join(response['q8_pain_points'])
-            if response.get('q10_constraints'):
-                response['q10_constraints'] = ','.join(response['q10_constraints'])
-            
-            writer.writerow(response)
-        
-        # 转换为字节流
-        output.seek(0)
-        
         return StreamingResponse(
-            iter([output.getvalue()]),
+            iter([responses_to_csv(responses)]),
             media_type="text/csv",
-            headers={
-                "Content-Disposition": f"attachment; filename=questionnaire_{session_id}.csv"
-            }
+            headers=disposition
         )
         
     except HTTPException:
@@ -228,6 +577,103 @@ async def export_data(session_id: str):
         )
 
 
+@app.get("/api/responses")
+async def list_responses(
+    session_id: str,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    industry: Optional[str] = None,
+    role: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None
+):
+    """
+    分页查询问卷回答
+    
+    Args:
+        session_id: 场次ID（查询参数）
+        limit: 每页行数（默认50，最大1000）
+        cursor: 上一页返回的next_cursor
+        fields: 需要返回的列，逗号分隔（如 id,q1_industry,q2_role），默认全部
+        industry: 按Q1机构类型筛选
+        role: 按Q2工作方向筛选
+        since / until: 提交时间范围（ISO 8601，since含、until不含）
+        
+    Returns:
+        {"success": true, "data": [...], "next_cursor": "...", "has_more": true}
+        
+    Raises:
+        HTTPException: 参数错误返回400，查询失败返回500
+    """
+    columns = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+    
+    try:
+        page = await db.list_responses(
+            session_id,
+            columns=columns,
+            limit=limit,
+            cursor=cursor,
+            industry=industry,
+            role=role,
+            since=since,
+            until=until
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"查询失败: {str(e)}"
+        )
+    
+    return {
+        "success": True,
+        "data": page['items'],
+        "next_cursor": page['next_cursor'],
+        "has_more": page['has_more']
+    }
+
+
+@app.get("/api/crosstab")
+async def get_crosstab(session_id: str, dims: str, normalize: str = 'none'):
+    """
+    交叉分析（二维/三维列联表）
+    
+    Args:
+        session_id: 场次ID（查询参数）
+        dims: 2或3个维度，逗号分隔，依次为 行、列、分层（如 q9,q1 或 q8,q1,device）
+        normalize: none / row / col / all，额外返回按行、按列或按总数计算的占比
+        
+    Returns:
+        {"success": true, "version": "...", "cached": false, "data": {"rows": [...], "cols": [...], "matrix": [[...]], ...}}
+        
+    Raises:
+        HTTPException: 参数错误返回400，查询失败返回500
+    """
+    try:
+        columns = resolve_dimensions(dims.split(','))
+        result = await session_cache.derive(
+            session_id,
+            ('crosstab', tuple(columns), normalize),
+            lambda rows: compute_crosstab(rows, columns, normalize)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"交叉分析失败: {str(e)}"
+        )
+    
+    return {
+        "success": True,
+        "version": result['version'],
+        "cached": result['cached'],
+        "data": result['value']
+    }
+
+
 @app.post("/api/analyze")
 async def analyze_questionnaire(request: Request):
     """
@@ -236,7 +682,13 @@ async def analyze_questionnaire(request: Request):
     请求体:
     {
         "session_id": "SJTU_SAIF_20251114",
-        "use_simple_prompt": false  # 可选，是否使用简化提示词
+        "use_simple_prompt": false,  # 可选，是否使用简化提示词
+        "incremental": false,  # 可选，基于上次分析结果只分析新增变化
+        "race": false,  # 可选，多模型并发竞速，返回最先通过校验的结果
+        "models": ["openai/gpt-4o", "deepseek/deepseek-chat"],  # 可选，竞速模型列表
+        "collect_all": false,  # 可选，竞速时等待所有模型返回以便对比
+        "tier": "high",  # 可选，最低质量档位（economy/standard/high），配置OPENROUTER_ROUTE_MODELS时按实时延迟选择模型
+        "segment_by": "q1"  # 可选，按该单选题分群（如q1行业/q2岗位），各群体并发分析后合并
     }
     
     返回:
@@ -246,22 +698,19 @@ async def analyze_questionnaire(request: Request):
             "session_id": "...",
             "analysis": "...",  # AI分析结果（Markdown格式）
             "model": "...",
-            "total_responses": 20
+            "total_responses": 20,
+            "analysis_mode": "full"  # full / incremental / unchanged / race / segmented
         }
     }
     """
     try:
-        # 检查LLM分析器是否可用
-        if llm_analyzer is None:
-            raise HTTPException(
-                status_code=503,
-                detail="AI分析功能未配置，请在.env中添加OPENROUTER_API_KEY"
-            )
-        
         # 解析请求体
         body = await request.json()
         session_id = body.get('session_id', os.getenv('SESSION_ID'))
         use_simple_prompt = body.get('use_simple_prompt', False)
+        incremental = body.get('incremental', False)
+        race = body.get('race', False)
+        segment_by = body.get('segment_by')
         
         if not session_id:
             raise HTTPException(
@@ -269,6 +718,27 @@ async def analyze_questionnaire(request: Request):
                 detail="缺少session_id参数"
             )
         
+        # 已归档场次直接返回归档时的分析（不需要配置AI）
+        snapshot = await session_archive.get(session_id)
+        if snapshot and snapshot.analysis:
+            parsed, _ = parse_llm_json(snapshot.analysis['analysis'])
+            return {
+                "success": True,
+                "data": {
+                    **snapshot.analysis,
+                    'analysis': parsed if parsed is not None else snapshot.analysis['analysis'],
+                    'analysis_text': snapshot.analysis['analysis'],
+                    'analysis_mode': 'archived'
+                }
+            }
+        
+        # 检查LLM分析器是否可用
+        if llm_analyzer is None:
+            raise HTTPException(
+                status_code=503,
+                detail="AI分析功能未配置，请在.env中添加OPENROUTER_API_KEY"
+            )
+        
         # 获取统计数据
         stats = await db.get_statistics(session_id)
         
@@ -277,13 +747,58 @@ async def analyze_questionnaire(request: Request):
                 status_code=404,
                 detail=f"会话 {session_id} 没有问卷数据"
             )
+        stats['other_answers'] = await free_text_index.summary(session_id)
         
         # 调用AI分析
-        analysis_result = await llm_analyzer.analyze_questionnaire(
-            stats=stats,
-            session_id=session_id,
-            use_simple_prompt=use_simple_prompt
-        )
+        if segment_by:
+            try:
+                column = resolve_segment_dimension(segment_by)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            # 分群统计基于缓存的回答一次遍历算出，数据未变化时直接复用
+            segments = await session_cache.derive(
+                session_id,
+                ('segments', column),
+                lambda rows: compute_segment_stats(rows, column)
+            )
+            analysis_result = await llm_analyzer.analyze_segmented(
+                stats=stats,
+                segments=segments['value'],
+                session_id=session_id,
+                tier=body.get('tier')
+            )
+        elif race:
+            analysis_result = await llm_analyzer.analyze_race(
+                stats=stats,
+                session_id=session_id,
+                use_simple_prompt=use_simple_prompt,
+                models=body.get('models'),
+                timeout=body.get('timeout'),
+                collect_all=body.get('collect_all', False)
+            )
+        elif incremental:
+            try:
+                previous = db.get_analysis_result(session_id)
+                snapshot = db.get_analysis_snapshot(session_id) if previous else None
+            except Exception as e:
+                print(f"⚠️  读取上次分析结果失败，改为全量分析: {e}")
+                previous, snapshot = None, None
+            
+            analysis_result = await llm_analyzer.analyze_incremental(
+                stats=stats,
+                session_id=session_id,
+                previous=previous,
+                snapshot=snapshot,
+                use_simple_prompt=use_simple_prompt,
+                tier=body.get('tier')
+            )
+        else:
+            analysis_result = await llm_analyzer.analyze_questionnaire(
+                stats=stats,
+                session_id=session_id,
+                use_simple_prompt=use_simple_prompt,
+                tier=body.get('tier')
+            )
         
         if not analysis_result.get('success'):
             raise HTTPException(
@@ -291,17 +806,22 @@ async def analyze_questionnaire(request: Request):
                 detail=f"AI分析失败: {analysis_result.get('error')}"
             )
         
-        # 保存分析结果到数据库
-        try:
-            db.save_analysis_result(
-                session_id=session_id,
-                analysis_text=analysis_result['analysis_text'],  # 保存原始JSON文本
-                model_name=analysis_result['model'],
-                total_responses=analysis_result['total_responses']
-            )
-        except Exception as e:
-            print(f"⚠️  保存分析结果失败: {e}")
-            # 不影响返回，继续
+        # 保存分析结果到数据库（结果未变化时无需重复保存）
+        if analysis_result.get('analysis_mode') != 'unchanged':
+            try:
+                db.save_analysis_result(
+                    session_id=session_id,
+                    analysis_text=analysis_result['analysis_text'],  # 保存原始JSON文本
+                    model_name=analysis_result['model'],
+                    total_responses=analysis_result['total_responses'],
+                    stats_snapshot=analysis_result.get('stats_snapshot')
+                )
+            except Exception as e:
+                print(f"⚠️  保存分析结果失败: {e}")
+                # 不影响返回，继续
+        
+        # 快照只用于存储，不返回给前端
+        analysis_result.pop('stats_snapshot', None)
         
         return {
             "success": True,
@@ -334,6 +854,13 @@ async def get_analysis_result(session_id: str):
         }
     }
     """
+    snapshot = await session_archive.get(session_id)
+    if snapshot and snapshot.analysis:
+        return {
+            "success": True,
+            "data": {**snapshot.analysis, 'archived': True}
+        }
+    
     try:
         result = db.get_analysis_result(session_id)
         
@@ -357,10 +884,96 @@ async def get_analysis_result(session_id: str):
         )
 
 
+@app.post("/api/cleanup/{session_id}", status_code=202)
+async def cleanup_session(session_id: str):
+    """
+    清空场次数据（后台分批删除）
+    
+    立即返回任务进度，之后用 GET /api/cleanup/{session_id} 查询；
+    同一场次已有进行中的清理时返回该任务
+    
+    Returns:
+        {"success": true, "data": {"job_id": "...", "status": "running", "total": 1200, "deleted": 0, ...}}
+    """
+    job = cleanup_jobs.start(session_id)
+    return {"success": True, "data": job.to_dict()}
+
+
+@app.delete("/api/cleanup/{session_id}", status_code=202)
+async def delete_session_data(session_id: str):
+    """同 POST /api/cleanup/{session_id}"""
+    return await cleanup_session(session_id)
+
+
+@app.get("/api/cleanup/{session_id}")
+async def get_cleanup_status(session_id: str):
+    """查询场次最近一次清理任务的进度"""
+    job = cleanup_jobs.get(session_id)
+    if job is None:
+        raise HTTPException(
+            status_code=404,
+            detail="该场次没有清理任务"
+        )
+    return {"success": True, "data": job.to_dict()}
+
+
+@app.post("/api/sessions/{session_id}/close")
+async def close_session(session_id: str, analyze: bool = True):
+    """
+    关闭场次并归档
+    
+    停止接收提交，把统计、导出文件和AI分析各计算一次保存为快照，
+    之后该场次的 /api/stats、/api/export、/api/analyze 直接返回快照
+    
+    Args:
+        analyze: 已有AI分析未覆盖全部回答时是否重新分析（需要配置OPENROUTER_API_KEY）
+        
+    Returns:
+        {"success": true, "data": {"session_id": ..., "etag": ..., "response_count": 42, ...}}
+    """
+    try:
+        snapshot = await session_archive.finalize(session_id, analyze=analyze)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"归档失败: {str(e)}"
+        )
+    
+    session_cache.invalidate(session_id)
+    stats_deltas.invalidate(session_id)
+    return {"success": True, "data": snapshot.summary()}
+
+
+@app.post("/api/sessions/{session_id}/reopen")
+async def reopen_session(session_id: str):
+    """重新开启已关闭的场次（删除归档快照，恢复实时统计和提交）"""
+    try:
+        await session_archive.reopen(session_id)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"重新开启失败: {str(e)}"
+        )
+    return {"success": True, "data": {"session_id": session_id, "archived": False}}
+
+
+@app.get("/api/sessions/{session_id}")
+async def get_session_status(session_id: str):
+    """场次状态（是否已归档）"""
+    try:
+        snapshot = await session_archive.get(session_id)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"获取场次状态失败: {str(e)}"
+        )
+    return {"success": True, "data": snapshot.summary() if snapshot else {"session_id": session_id, "archived": False}}
+
+
 @app.get("/api/models")
-async def get_available_models():
+async def get_available_models(tier: Optional[str] = None):
     """
-    获取可用的AI模型列表
+    获取可用的AI模型列表及各模型最近调用的实时指标
     
     返回:
     {
@@ -371,10 +984,14 @@ async def get_available_models():
                 "name": "Claude 3.5 Sonnet",
                 "provider": "Anthropic",
                 "description": "...",
-                "recommended": true
+                "recommended": true,
+                "tier": "high",
+                "live": {"calls": 12, "failure_rate": 0.0, "latency_p50": 8.2, "ttft_p50": 1.1,
+                         "tokens_per_second": 42.0, "healthy": true, ...}
             },
             ...
-        ]
+        ],
+        "routing": {"enabled": true, "current_choice": "deepseek/deepseek-chat", "min_tier": "standard", ...}
     }
     """
     try:
@@ -388,7 +1005,8 @@ async def get_available_models():
         
         return {
             "success": True,
-            "data": models
+            "data": models,
+            "routing": llm_analyzer.router.snapshot(tier)
         }
         
     except Exception as e:
@@ -411,7 +1029,8 @@ async def http_exception_handler(request: Request, exc: HTTPException):
             "success": False,
             "error": exc.detail,
             "status_code": exc.status_code
-        }
+        },
+        headers=exc.headers
     )
 
 
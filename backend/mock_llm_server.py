@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+"""
+本地模拟LLM服务（OpenAI兼容接口）
+用于压测和离线开发：不需要OpenRouter密钥和外网
+
+- 回放: 按请求内容（模型+消息）查找录制的响应，未录制的请求返回内置的分析结果
+- 录制: 转发到真实的上游接口，同时把响应（含流式分块）追加到录制文件
+- 流式: 请求带 "stream": true 时按SSE分块返回（data: {...} / data: [DONE]）
+- 时延: 首token延迟（--latency/--jitter）+ 按输出速度（--tokens-per-second）逐块发送
+- 故障注入: 按比例返回429/5xx或截断输出（finish_reason=length），由--seed决定，结果可复现；
+  也可用请求头 X-Mock-Fault: 429 / 500 / 503 / truncate 指定单个请求的故障
+
+用法:
+    python mock_llm_server.py --port 8100 --latency 1.5
+    python mock_llm_server.py --replay cassettes/analysis.jsonl --tokens-per-second 80
+    python mock_llm_server.py --error-rate 0.2 --truncate-rate 0.1 --seed 7
+    python mock_llm_server.py --record cassettes/analysis.jsonl --upstream https://openrouter.ai/api/v1
+
+然后在后端.env中配置（或 LLMAnalyzer(api_base=...)）:
+    OPENROUTER_API_KEY=mock
+    OPENROUTER_API_BASE=http://127.0.0.1:8100/api/v1
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from prompt_budget import estimate_tokens
+
+app = FastAPI(title="Mock LLM Server")
+
+# 模拟延迟（秒），可通过命令行、环境变量或 POST /mock/config 调整
+MOCK_LATENCY = float(os.getenv('MOCK_LLM_LATENCY', '1.0'))
+MOCK_JITTER = float(os.getenv('MOCK_LLM_JITTER', '0.2'))
+
+SETTINGS: Dict[str, Any] = {
+    'latency': MOCK_LATENCY,
+    'jitter': MOCK_JITTER,
+    'tokens_per_second': float(os.getenv('MOCK_LLM_TOKENS_PER_SECOND', '0')),   # 0表示不限速
+    'error_rate': float(os.getenv('MOCK_LLM_ERROR_RATE', '0')),
+    'error_codes': [int(c) for c in os.getenv('MOCK_LLM_ERROR_CODES', '429,500,503').split(',')],
+    'truncate_rate': float(os.getenv('MOCK_LLM_TRUNCATE_RATE', '0')),
+    'retry_after': float(os.getenv('MOCK_LLM_RETRY_AFTER', '1')),
+    'chunk_chars': int(os.getenv('MOCK_LLM_CHUNK_CHARS', '16')),
+    'seed': int(os.getenv('MOCK_LLM_SEED', '0')),
+    'strict': False,        # 回放时未录制的请求返回错误而不是内置结果
+}
+
+# 固定返回的分析结果（匹配prompts.get_simple_analysis_prompt的JSON结构）
+CANNED_ANALYSIS = {
+    "audience_summary": "受众以银行和证券从业者为主，普遍有基础的AI工具使用经验，态度理性谨慎。",
+    "top_3_insights": [
+        "多数学员已在日常工作中偶尔使用AI工具",
+        "研报阅读与文档撰写是最集中的痛点",
+        "数据安全与合规是推进AI应用的首要约束"
+    ],
+    "content_focus": ["落地场景拆解", "数据安全方案", "投入产出评估"],
+    "case_priority": ["案例1: 7分", "案例2: 9分", "案例3: 8分"],
+    "interaction_tips": ["现场投票选择演示案例", "邀请学员分享试点经验"]
+}
+
+# 完整分析（匹配prompts.get_analysis_prompt / analysis_schema.ANALYSIS_SCHEMA）
+CANNED_FULL_ANALYSIS = {
+    "audience_analysis": {
+        "summary": "受众以银行、证券从业者为主，多数已在日常工作中使用AI工具，但机构层面仍处于试点阶段，对数据安全与投入产出较为谨慎。",
+        "key_characteristics": [
+            {"dimension": "行业背景", "insight": "银行与证券占多数", "percentage": "约45%"},
+            {"dimension": "数字化水平", "insight": "普遍掌握Excel高级功能", "percentage": "约40%"},
+            {"dimension": "AI成熟度", "insight": "个人使用多于团队推广", "percentage": "约40%"}
+        ],
+        "readiness_score": {
+            "technical": {"score": 6, "description": "具备基础数据处理能力"},
+            "mindset": {"score": 7, "description": "理性乐观，愿意尝试"},
+            "organizational": {"score": 5, "description": "多为小范围试点"}
+        }
+    },
+    "key_findings": [
+        {
+            "title": "文档类痛点最集中",
+            "priority": "high",
+            "details": ["研报阅读与周报撰写占比最高", "重复性材料整合耗时"],
+            "implication": "案例演示应突出文档处理效率"
+        },
+        {
+            "title": "合规是首要约束",
+            "priority": "high",
+            "details": ["数据安全被最多人选为推进约束"],
+            "implication": "需要讲清私有化部署与数据边界"
+        }
+    ],
+    "content_recommendations": {
+        "part1_concepts": {
+            "emphasis": ["大模型能力边界", "RAG与工作流", "数据安全方案"],
+            "depth_level": "进阶",
+            "suggested_topics": [{"topic": "金融业落地现状", "rationale": "贴近受众", "time_allocation": "10分钟"}],
+            "avoid": ["过深的模型训练细节"]
+        },
+        "part2_cases": {
+            "case1_resume": {"relevance_score": 6, "emphasis": ["筛选效率"], "demo_suggestions": "简短演示", "qa_predictions": ["准确率如何"]},
+            "case2_contract": {"relevance_score": 9, "emphasis": ["合规审查流程"], "demo_suggestions": "完整演示", "qa_predictions": ["如何保证数据安全"]},
+            "case3_research": {"relevance_score": 8, "emphasis": ["信息整合"], "demo_suggestions": "重点演示", "qa_predictions": ["幻觉如何控制"]},
+            "case_order_suggestion": {"recommended_order": [2, 3, 1], "rationale": "从最相关的合规场景切入"},
+            "flexible_case": {"should_present": False, "rationale": "时间有限"}
+        },
+        "time_allocation": {
+            "part1_breakdown": {"development": "10分钟", "trends": "10分钟", "finance_status": "10分钟"},
+            "part2_breakdown": {"case1": "5分钟", "case2": "15分钟", "case3": "10分钟"},
+            "adjustment_rationale": "按相关度分配"
+        }
+    },
+    "interaction_design": {
+        "live_poc_suggestions": [
+            {"scenario": "研报摘要", "description": "现场上传公开研报生成摘要", "why": "痛点集中", "preparation": "准备公开研报", "time_needed": "10分钟"}
+        ],
+        "qa_strategy": {
+            "predicted_questions": [{"question": "数据能否不出域", "suggested_answer": "介绍私有化部署方案"}],
+            "difficult_topics": ["模型幻觉", "先承认局限再讲控制手段"]
+        },
+        "discussion_topics": [{"topic": "本机构最适合的试点场景", "starter": "现场投票", "expected_outcome": "形成场景清单"}]
+    },
+    "audience_segments": [
+        {"segment_name": "积极探索者", "percentage": 35, "count": 7, "characteristics": "已在使用AI并寻找场景",
+         "pain_points": ["缺乏试点方向"], "engagement_strategy": "提供可复制的落地路径"}
+    ],
+    "practical_tips": {
+        "opening": "用问卷结果开场",
+        "transitions": "以痛点串联案例",
+        "engagement_techniques": ["现场投票", "点名分享"],
+        "closing": "总结可立即尝试的三件事"
+    }
+}
+
+# 分群分析（prompts.get_segment_analysis_prompt / get_segment_reduce_prompt）
+CANNED_SEGMENT_ANALYSIS = {
+    "characteristics": "以业务一线为主，个人使用AI较多但机构推进较慢",
+    "pain_points": ["研报阅读耗时", "材料整合重复劳动"],
+    "content_focus": ["文档处理案例", "合规边界"],
+    "engagement_strategy": "用本群体的真实场景做现场演示"
+}
+
+CANNED_SEGMENT_REDUCE = {
+    "overall_summary": "各群体都关注文档处理效率，差异主要在合规顾虑和机构推进阶段。",
+    "segment_differences": [
+        {"topic": "合规顾虑", "difference": "银行群体明显高于其他群体", "suggestion": "案例2放在前面并讲清数据边界"}
+    ],
+    "key_findings": CANNED_FULL_ANALYSIS["key_findings"],
+    "practical_tips": CANNED_FULL_ANALYSIS["practical_tips"]
+}
+
+# 运行统计（GET /mock/stats）
+STATS: Dict[str, Any] = {'requests': 0, 'replayed': 0, 'canned': 0, 'recorded': 0, 'faults': {}}
+
+
+# ================================================================
+# 录制文件
+# ================================================================
+
+def request_key(body: Dict[str, Any]) -> str:
+    """请求的回放键：模型 + 消息 + 是否JSON模式（忽略温度、max_tokens等参数）"""
+    canonical = json.dumps(
+        {'model': body.get('model'), 'messages': body.get('messages'), 'json': 'response_format' in body},
+        ensure_ascii=False, sort_keys=True
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:24]
+
+
+class Cassette:
+    """录制文件（JSON Lines，每行一次调用）；同一请求录制多次时按顺序循环回放"""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._cursor: Dict[str, int] = {}
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries.setdefault(entry['key'], []).append(entry)
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        entries = self.entries.get(key)
+        if not entries:
+            return None
+        index = self._cursor.get(key, 0)
+        self._cursor[key] = index + 1
+        return entries[index % len(entries)]
+
+    def append(self, entry: Dict[str, Any]):
+        self.entries.setdefault(entry['key'], []).append(entry)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+REPLAY = Cassette(None)
+RECORDER: Optional[Cassette] = None
+UPSTREAM: Optional[str] = None
+
+
+# ================================================================
+# 响应内容
+# ================================================================
+
+def canned_content(body: Dict[str, Any]) -> str:
+    """按提示词类型返回内置结果；续写请求返回上次截断后剩余的部分"""
+    messages = body.get('messages') or []
+    prompt = ''.join(m.get('content') or '' for m in messages if m.get('role') == 'user')
+    if '"segment_differences"' in prompt:
+        analysis = CANNED_SEGMENT_REDUCE
+    elif '"engagement_strategy"' in prompt and '# 分群' in prompt:
+        analysis = CANNED_SEGMENT_ANALYSIS
+    elif '"audience_analysis"' in prompt:
+        analysis = CANNED_FULL_ANALYSIS
+    else:
+        analysis = CANNED_ANALYSIS
+    if '上次的分析报告' in prompt:
+        return '{}'     # 增量分析：数据变化不影响结论
+    content = json.dumps(analysis, ensure_ascii=False)
+    if len(messages) >= 2 and messages[-2].get('role') == 'assistant' and '截断' in (messages[-1].get('content') or ''):
+        previous = messages[-2].get('content') or ''
+        return content[len(previous):] if content.startswith(previous) else content
+    return content
+
+
+def split_chunks(content: str) -> List[str]:
+    size = max(1, SETTINGS['chunk_chars'])
+    return [content[i:i + size] for i in range(0, len(content), size)] or ['']
+
+
+def pick_fault(request: Request, key: str) -> Optional[str]:
+    """决定本次请求注入的故障（同一seed、同一请求序号的结果相同）"""
+    forced = request.headers.get('x-mock-fault')
+    if forced:
+        return forced
+    rng = random.Random(f"{SETTINGS['seed']}:{key}:{STATS['requests']}")
+    roll = rng.random()
+    if roll < SETTINGS['error_rate']:
+        return str(rng.choice(SETTINGS['error_codes']))
+    if roll < SETTINGS['error_rate'] + SETTINGS['truncate_rate']:
+        return 'truncate'
+    return None
+
+
+def error_response(status: int) -> JSONResponse:
+    headers = {'Retry-After': f"{SETTINGS['retry_after']:g}"} if status == 429 else None
+    message = 'Rate limit exceeded' if status == 429 else 'Upstream provider error'
+    return JSONResponse(status_code=status, content={'error': {'code': status, 'message': message}}, headers=headers)
+
+
+def first_token_delay() -> float:
+    return max(0.0, SETTINGS['latency'] + random.uniform(-SETTINGS['jitter'], SETTINGS['jitter']))
+
+
+def chunk_delay(chunk: str) -> float:
+    tps = SETTINGS['tokens_per_second']
+    return estimate_tokens(chunk) / tps if tps > 0 else 0.0
+
+
+def completion(body: Dict[str, Any], content: str, finish_reason: str) -> Dict[str, Any]:
+    prompt_tokens = sum(estimate_tokens(m.get('content') or '') for m in body.get('messages', []))
+    completion_tokens = estimate_tokens(content)
+    return {
+        "id": f"mock-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get('model', 'mock/model'),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": finish_reason
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    }
+
+
+def stream_response(body: Dict[str, Any], chunks: List[str], finish_reason: str) -> StreamingResponse:
+    """按SSE分块返回：首块前等待首token延迟，之后按输出速度发送"""
+    completion_id = f"mock-{uuid.uuid4().hex[:12]}"
+    model = body.get('model', 'mock/model')
+
+    def event(delta: Dict[str, Any], finish: Optional[str] = None, usage: Optional[Dict] = None) -> str:
+        data = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+        if usage:
+            data["usage"] = usage
+        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    async def generate():
+        yield ": OPENROUTER PROCESSING\n\n"
+        await asyncio.sleep(first_token_delay())
+        yield event({"role": "assistant", "content": ""})
+        for chunk in chunks:
+            yield event({"content": chunk})
+            await asyncio.sleep(chunk_delay(chunk))
+        content = ''.join(chunks)
+        yield event({}, finish_reason, completion(body, content, finish_reason)['usage'])
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(generate(), media_type="text/event-stream")
+
+
+# ================================================================
+# 录制（转发到上游）
+# ================================================================
+
+async def forward(request: Request, body: Dict[str, Any], key: str):
+    """转发到真实接口并录制响应"""
+    headers = {'Content-Type': 'application/json'}
+    authorization = request.headers.get('authorization')
+    if not authorization and os.getenv('UPSTREAM_API_KEY'):
+        authorization = f"Bearer {os.getenv('UPSTREAM_API_KEY')}"
+    if authorization:
+        headers['Authorization'] = authorization
+    started = time.perf_counter()
+
+    if not body.get('stream'):
+        async with httpx.AsyncClient(timeout=180.0) as client:
+            response = await client.post(f"{UPSTREAM}/chat/completions", headers=headers, json=body)
+        if response.status_code != 200:
+            return JSONResponse(status_code=response.status_code, content=response.json())
+        result = response.json()
+        choice = result['choices'][0]
+        RECORDER.append({
+            'key': key, 'model': body.get('model'),
+            'content': choice['message']['content'] or '', 'finish_reason': choice.get('finish_reason'),
+            'latency': round(time.perf_counter() - started, 3),
+        })
+        STATS['recorded'] += 1
+        return result
+
+    async def relay():
+        chunks, finish_reason, ttft = [], None, None
+        async with httpx.AsyncClient(timeout=180.0) as client:
+            async with client.stream("POST", f"{UPSTREAM}/chat/completions", headers=headers, json=body) as response:
+                async for line in response.aiter_lines():
+                    yield line + "\n"
+                    if not line.startswith('data:') or line[5:].strip() == '[DONE]':
+                        continue
+                    for choice in json.loads(line[5:]).get('choices') or []:
+                        content = (choice.get('delta') or {}).get('content')
+                        if content:
+                            ttft = ttft if ttft is not None else time.perf_counter() - started
+                            chunks.append(content)
+                        finish_reason = choice.get('finish_reason') or finish_reason
+        RECORDER.append({
+            'key': key, 'model': body.get('model'),
+            'content': ''.join(chunks), 'chunks': chunks, 'finish_reason': finish_reason,
+            'latency': round(time.perf_counter() - started, 3), 'ttft': round(ttft or 0, 3),
+        })
+        STATS['recorded'] += 1
+
+    return StreamingResponse(relay(), media_type="text/event-stream")
+
+
+# ================================================================
+# 接口
+# ================================================================
+
+@app.get("/health")
+async def health_check():
+    return {"status": "healthy"}
+
+
+@app.get("/mock/stats")
+async def mock_stats():
+    """请求计数、回放命中和注入的故障"""
+    return {**STATS, 'settings': SETTINGS}
+
+
+@app.post("/mock/config")
+async def mock_config(request: Request):
+    """运行时调整时延/故障参数（只接受SETTINGS中已有的键），并清零统计"""
+    updates = await request.json()
+    SETTINGS.update({k: v for k, v in updates.items() if k in SETTINGS})
+    STATS.update(requests=0, replayed=0, canned=0, recorded=0, faults={})
+    return SETTINGS
+
+
+@app.post("/api/v1/chat/completions")
+async def chat_completions(request: Request):
+    """模拟OpenRouter的chat/completions接口"""
+    body = await request.json()
+    key = request_key(body)
+    STATS['requests'] += 1
+
+    if RECORDER is not None and UPSTREAM:
+        return await forward(request, body, key)
+
+    fault = pick_fault(request, key)
+    if fault and fault.isdigit():
+        STATS['faults'][fault] = STATS['faults'].get(fault, 0) + 1
+        await asyncio.sleep(min(first_token_delay(), 0.2))
+        return error_response(int(fault))
+
+    recorded = REPLAY.lookup(key)
+    if recorded is not None:
+        STATS['replayed'] += 1
+        content, chunks = recorded['content'], recorded.get('chunks')
+        finish_reason = recorded.get('finish_reason') or 'stop'
+    elif SETTINGS['strict']:
+        return JSONResponse(status_code=404, content={'error': {'code': 404, 'message': f'未录制的请求: {key}'}})
+    else:
+        STATS['canned'] += 1
+        content, chunks, finish_reason = canned_content(body), None, 'stop'
+
+    if fault == 'truncate' and len(content) > 1:
+        STATS['faults']['truncate'] = STATS['faults'].get('truncate', 0) + 1
+        content, chunks, finish_reason = content[:len(content) // 2], None, 'length'
+
+    if body.get('stream'):
+        return stream_response(body, chunks or split_chunks(content), finish_reason)
+
+    await asyncio.sleep(first_token_delay() + chunk_delay(content))
+    return completion(body, content, finish_reason)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="本地模拟LLM服务")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--latency', type=float, default=MOCK_LATENCY, help='首token平均延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=MOCK_JITTER, help='延迟抖动（秒）')
+    parser.add_argument('--tokens-per-second', type=float, default=SETTINGS['tokens_per_second'],
+                        help='输出速度，0表示不限速')
+    parser.add_argument('--error-rate', type=float, default=SETTINGS['error_rate'], help='返回错误状态码的比例')
+    parser.add_argument('--error-codes', default=','.join(map(str, SETTINGS['error_codes'])), help='注入的状态码')
+    parser.add_argument('--truncate-rate', type=float, default=SETTINGS['truncate_rate'], help='截断输出的比例')
+    parser.add_argument('--seed', type=int, default=SETTINGS['seed'], help='故障注入随机种子')
+    parser.add_argument('--replay', help='回放的录制文件（JSON Lines）')
+    parser.add_argument('--strict', action='store_true', help='回放时未录制的请求返回404')
+    parser.add_argument('--record', help='录制到此文件（需要--upstream）')
+    parser.add_argument('--upstream', default=os.getenv('UPSTREAM_API_BASE'), help='录制时转发的真实接口')
+    args = parser.parse_args()
+
+    SETTINGS.update(
+        latency=args.latency, jitter=args.jitter, tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate, error_codes=[int(c) for c in args.error_codes.split(',') if c],
+        truncate_rate=args.truncate_rate, seed=args.seed, strict=args.strict
+    )
+    random.seed(args.seed)
+    if args.replay:
+        REPLAY = Cassette(args.replay)
+        print(f"📼 回放 {args.replay}: {sum(len(v) for v in REPLAY.entries.values())} 条录制")
+    if args.record:
+        if not args.upstream:
+            parser.error('--record 需要同时指定 --upstream')
+        RECORDER, UPSTREAM = Cassette(args.record), args.upstream.rstrip('/')
+        print(f"⏺️  录制到 {args.record}，上游 {UPSTREAM}")
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,291 @@
+"""
+模型路由
+按模型记录真实调用的延迟、首token时间（TTFT）、失败率和输出速度（滚动窗口），
+在OPENROUTER_ROUTE_MODELS配置的候选模型中选择满足质量档位、当前健康且最快的模型。
+
+未配置候选模型时不做路由，始终使用OPENROUTER_MODEL（指标仍然记录，供 /api/models 展示）。
+"""
+import math
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+# 质量档位（从低到高）
+TIERS = ['economy', 'standard', 'high']
+
+# 可选模型（tier为质量档位，路由时只在不低于要求档位的模型中选择）
+MODEL_CATALOG = [
+    {
+        "id": "openai/gpt-5.1",
+        "name": "gpt-5.1",
+        "provider": "openai",
+        "description": "高质量分析，推理能力强",
+        "recommended": True,
+        "tier": "high"
+    },
+    {
+        "id": "openai/gpt-4-turbo",
+        "name": "GPT-4 Turbo",
+        "provider": "OpenAI",
+        "description": "强大的通用能力",
+        "recommended": True,
+        "tier": "high"
+    },
+    {
+        "id": "anthropic/claude-3-opus",
+        "name": "Claude 3 Opus",
+        "provider": "Anthropic",
+        "description": "最强分析能力（较贵）",
+        "recommended": False,
+        "tier": "high"
+    },
+    {
+        "id": "openai/gpt-4o",
+        "name": "GPT-4o",
+        "provider": "OpenAI",
+        "description": "最新的GPT-4优化版本",
+        "recommended": True,
+        "tier": "high"
+    },
+    {
+        "id": "google/gemini-pro-1.5",
+        "name": "Gemini Pro 1.5",
+        "provider": "Google",
+        "description": "长上下文支持",
+        "recommended": False,
+        "tier": "standard"
+    },
+    {
+        "id": "qwen/qwen-2.5-72b-instruct",
+        "name": "Qwen 2.5 72B",
+        "provider": "Alibaba",
+        "description": "中文优化，性价比高",
+        "recommended": True,
+        "tier": "standard"
+    },
+    {
+        "id": "deepseek/deepseek-chat",
+        "name": "DeepSeek Chat",
+        "provider": "DeepSeek",
+        "description": "性价比极高，中文友好",
+        "recommended": True,
+        "tier": "standard"
+    }
+]
+
+CATALOG_TIERS = {m['id']: m['tier'] for m in MODEL_CATALOG}
+
+
+def _percentile(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(p / 100 * len(ordered))) - 1]
+
+
+class ModelStats:
+    """单个模型最近若干次调用的指标"""
+
+    def __init__(self, window: int, max_age: float):
+        self.max_age = max_age
+        self.samples: deque = deque(maxlen=window)  # (时间戳, 成功, 延迟, TTFT, 输出token数, tokens/秒)
+        self.consecutive_failures = 0
+        self.last_failure_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        # 熔断状态：tripped_at为None表示正常；冷却期过后进入半开，只放行一次试探调用
+        self.tripped_at: Optional[float] = None
+        self.probe_started_at: Optional[float] = None
+        # 判断失败率只看此时间之后的样本（上次熔断的时间），恢复后不被熔断前的失败拖累
+        self.rate_since = 0.0
+
+    def record(self, ok: bool, latency: float, ttft: Optional[float] = None,
+               output_tokens: Optional[int] = None, error: Optional[str] = None):
+        tokens_per_second = None
+        if ok and output_tokens:
+            # 流式响应时按生成阶段计算，否则按整个请求计算
+            generation = latency - ttft if ttft is not None and latency - ttft > 0.05 else latency
+            tokens_per_second = output_tokens / generation if generation > 0 else None
+        self.samples.append((time.time(), ok, latency, ttft, output_tokens, tokens_per_second))
+        if ok:
+            self.consecutive_failures = 0
+        else:
+            self.consecutive_failures += 1
+            self.last_failure_at = time.time()
+            self.last_error = error
+
+    def recent(self, since: float = 0.0) -> List[tuple]:
+        cutoff = max(time.time() - self.max_age, since)
+        return [s for s in self.samples if s[0] >= cutoff]
+
+    def summary(self) -> Dict[str, Any]:
+        recent = self.recent()
+        succeeded = [s for s in recent if s[1]]
+
+        def p(values, pct, digits=3):
+            value = _percentile([v for v in values if v is not None], pct)
+            return round(value, digits) if value is not None else None
+
+        return {
+            'calls': len(recent),
+            'failures': len(recent) - len(succeeded),
+            'failure_rate': round(1 - len(succeeded) / len(recent), 3) if recent else None,
+            'latency_p50': p([s[2] for s in succeeded], 50),
+            'latency_p95': p([s[2] for s in succeeded], 95),
+            'ttft_p50': p([s[3] for s in succeeded], 50),
+            'tokens_per_second': p([s[5] for s in succeeded], 50, 1),
+            'consecutive_failures': self.consecutive_failures,
+            'last_error': self.last_error,
+        }
+
+
+class ModelRouter:
+    """按实时指标选择模型"""
+
+    def __init__(self, default_model: str):
+        self.default_model = default_model
+        self.candidates = [
+            m.strip() for m in os.getenv('OPENROUTER_ROUTE_MODELS', '').split(',') if m.strip()
+        ]
+        self.min_tier = self._env_tier('OPENROUTER_MIN_TIER')
+        self.default_tier = self._env_tier('OPENROUTER_MODEL_TIER')
+        self.window = int(os.getenv('MODEL_STATS_WINDOW', '50'))
+        self.max_age = float(os.getenv('MODEL_STATS_MAX_AGE', '1800'))
+        self.min_samples = int(os.getenv('MODEL_MIN_SAMPLES', '3'))
+        self.max_failure_rate = float(os.getenv('MODEL_MAX_FAILURE_RATE', '0.5'))
+        # 连续失败达到次数后暂停使用一段时间
+        self.breaker_failures = int(os.getenv('MODEL_BREAKER_FAILURES', '3'))
+        self.breaker_cooldown = float(os.getenv('MODEL_BREAKER_COOLDOWN', '60'))
+        # 以一定概率选择样本不足的候选模型，保持指标更新
+        self.explore_rate = float(os.getenv('MODEL_EXPLORE_RATE', '0.1'))
+        self._stats: Dict[str, ModelStats] = {}
+
+    @staticmethod
+    def _env_tier(name: str) -> str:
+        """读取质量档位配置，无效值按standard处理"""
+        tier = os.getenv(name, 'standard').strip().lower()
+        if tier not in TIERS:
+            print(f"⚠️  {name}={tier} 无效（可选: {', '.join(TIERS)}），使用standard")
+            return 'standard'
+        return tier
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.candidates)
+
+    def tier_of(self, model: str) -> str:
+        if model in CATALOG_TIERS:
+            return CATALOG_TIERS[model]
+        return self.default_tier if model == self.default_model else 'standard'
+
+    def stats(self, model: str) -> ModelStats:
+        stats = self._stats.get(model)
+        if stats is None:
+            stats = self._stats[model] = ModelStats(self.window, self.max_age)
+        return stats
+
+    def record(self, model: str, ok: bool, latency: float, ttft: Optional[float] = None,
+               output_tokens: Optional[int] = None, error: Optional[str] = None):
+        """记录一次真实调用，并更新熔断状态"""
+        stats = self.stats(model)
+        stats.record(ok, latency, ttft, output_tokens, error)
+        state = self.breaker_state(model)
+        if state == 'half_open':
+            # 试探调用的结果：成功则恢复，失败则重新熔断
+            stats.probe_started_at = None
+            if ok:
+                stats.tripped_at = None
+            else:
+                self._trip(stats)
+        elif state == 'closed' and self._should_trip(stats):
+            self._trip(stats)
+
+    def _should_trip(self, stats: ModelStats) -> bool:
+        if stats.consecutive_failures >= self.breaker_failures:
+            return True
+        recent = stats.recent(since=stats.rate_since)
+        failures = sum(1 for s in recent if not s[1])
+        return len(recent) >= self.min_samples and failures / len(recent) > self.max_failure_rate
+
+    def _trip(self, stats: ModelStats):
+        stats.tripped_at = stats.rate_since = time.time()
+        stats.probe_started_at = None
+
+    def breaker_state(self, model: str) -> str:
+        """closed（正常）/ open（熔断冷却中）/ half_open（冷却期已过，等待试探调用）"""
+        stats = self._stats.get(model)
+        if stats is None or stats.tripped_at is None:
+            return 'closed'
+        if time.time() - stats.tripped_at < self.breaker_cooldown:
+            return 'open'
+        return 'half_open'
+
+    def healthy(self, model: str) -> bool:
+        state = self.breaker_state(model)
+        if state == 'open':
+            return False
+        if state == 'half_open':
+            # 只放行一次试探；试探超过冷却时间仍无结果（如请求被取消）时允许再试
+            started = self._stats[model].probe_started_at
+            return started is None or time.time() - started >= self.breaker_cooldown
+        return True
+
+    def choose(self, tier: Optional[str] = None, explore: bool = True) -> str:
+        """
+        选择模型：满足质量档位的健康候选中，最近p50延迟最低的一个
+
+        Args:
+            tier: 最低质量档位（economy / standard / high），默认OPENROUTER_MIN_TIER
+            explore: 是否按MODEL_EXPLORE_RATE尝试样本不足的候选
+        """
+        model = self._pick(tier, explore)
+        if self.breaker_state(model) == 'half_open':
+            self._stats[model].probe_started_at = time.time()
+        return model
+
+    def _pick(self, tier: Optional[str], explore: bool) -> str:
+        if not self.enabled:
+            return self.default_model
+
+        required = TIERS.index(tier) if tier in TIERS else TIERS.index(self.min_tier)
+        eligible = [m for m in self.candidates if TIERS.index(self.tier_of(m)) >= required]
+        healthy = [m for m in eligible if self.healthy(m)]
+        if not healthy:
+            # 全部不健康时仍返回一个，由调用方处理失败
+            return eligible[0] if eligible else self.default_model
+
+        measured, unmeasured = [], []
+        for model in healthy:
+            summary = self.stats(model).summary()
+            successes = summary['calls'] - summary['failures']
+            if successes >= self.min_samples:
+                measured.append((summary['latency_p50'], model))
+            else:
+                unmeasured.append(model)
+
+        if unmeasured and explore and (not measured or random.random() < self.explore_rate):
+            return random.choice(unmeasured)
+        if measured:
+            return min(measured)[1]
+        return self.default_model if self.default_model in unmeasured else unmeasured[0]
+
+    def snapshot(self, tier: Optional[str] = None) -> Dict[str, Any]:
+        """路由状态和各模型指标（/api/models）"""
+        models = list(dict.fromkeys(self.candidates + [self.default_model] + list(self._stats)))
+        return {
+            'enabled': self.enabled,
+            'default_model': self.default_model,
+            'candidates': self.candidates,
+            'min_tier': tier or self.min_tier,
+            'current_choice': self._pick(tier, explore=False),
+            'models': {
+                m: {
+                    **self.stats(m).summary(),
+                    'tier': self.tier_of(m),
+                    'healthy': self.healthy(m),
+                    'breaker': self.breaker_state(m),
+                }
+                for m in models
+            },
+        }
@@ -2,8 +2,8 @@
 数据模型定义
 使用Pydantic进行数据验证
 """
-from typing import Optional, List
-from pydantic import BaseModel, Field, validator
+from typing import Any, Dict, Optional, List
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 
 
 class QuestionnaireSubmit(BaseModel):
@@ -39,8 +39,14 @@ class QuestionnaireSubmit(BaseModel):
     device_type: str = Field(default="unknown", description="设备类型")
     user_agent: Optional[str] = Field(None, description="浏览器UA")
     ip_hash: Optional[str] = Field(None, description="IP/指纹哈希")
+    client_submission_id: Optional[str] = Field(
+        None,
+        pattern=r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$',
+        description="客户端生成的提交UUID（重试时去重）"
+    )
     
-    @validator('q8_pain_points')
+    @field_validator('q8_pain_points')
+    @classmethod
     def validate_pain_points(cls, v):
         """验证Q8至少选1项，最多3项"""
         if not v or len(v) == 0:
@@ -49,15 +55,32 @@ class QuestionnaireSubmit(BaseModel):
             raise ValueError('Q8最多只能选择3项')
         return v
     
-    @validator('q10_constraints')
+    @field_validator('q10_constraints')
+    @classmethod
     def validate_constraints(cls, v):
         """验证Q10最多3项"""
         if v and len(v) > 3:
             raise ValueError('Q10最多只能选择3项')
         return v
     
-    class Config:
-        json_schema_extra = {
+    @field_validator('client_submission_id')
+    @classmethod
+    def normalize_client_submission_id(cls, v):
+        """UUID统一为小写（与数据库唯一约束比较时大小写一致）"""
+        return v.lower() if v else v
+    
+    def to_row(self) -> Dict[str, Any]:
+        """
+        转换为responses表的一行（字段与表列一一对应，直接由pydantic-core导出）
+        
+        未带client_submission_id时不写该列，由数据库保持NULL
+        """
+        if self.client_submission_id is None:
+            return self.model_dump(exclude={'client_submission_id'})
+        return self.model_dump()
+    
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "session_id": "SJTU_SAIF_20251114",
                 "q1_industry": "bank",
@@ -75,9 +98,22 @@ class QuestionnaireSubmit(BaseModel):
                 "completion_time_seconds": 138,
                 "device_type": "mobile",
                 "user_agent": "Mozilla/5.0...",
-                "ip_hash": "5d41402abc4b..."
+                "ip_hash": "5d41402abc4b...",
+                "client_submission_id": "3f1c2b9e-8a47-4d2e-9c61-0b7e5a9d4f20"
             }
         }
+    )
+
+
+def parse_submission(body: bytes) -> QuestionnaireSubmit:
+    """
+    直接从请求体字节解析并校验问卷（pydantic-core一次完成JSON解码和校验，
+    不经过 json.loads -> dict -> 模型 的中间步骤）
+    
+    Raises:
+        pydantic.ValidationError: 格式或取值不合法
+    """
+    return QuestionnaireSubmit.model_validate_json(body)
 
 
 class SubmitResponse(BaseModel):
@@ -85,6 +121,34 @@ class SubmitResponse(BaseModel):
     success: bool = True
     message: str = "提交成功"
     id: str = Field(..., description="响应ID")
+    duplicate: bool = Field(False, description="是否为重复请求（之前已写入）")
+
+
+class BatchSubmit(BaseModel):
+    """批量提交（离线队列上传）"""
+    submissions: List[QuestionnaireSubmit] = Field(..., min_length=1, max_length=50)
+    
+    @field_validator('submissions')
+    @classmethod
+    def validate_client_ids(cls, v):
+        """批量提交的每一条都必须带client_submission_id"""
+        if any(not item.client_submission_id for item in v):
+            raise ValueError('批量提交的每一条都需要client_submission_id')
+        return v
+
+
+class BatchSubmitItem(BaseModel):
+    """批量提交中单条的结果"""
+    client_submission_id: str
+    status: str = Field(..., description="created / duplicate / rejected")
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BatchSubmitResponse(BaseModel):
+    """批量提交响应"""
+    success: bool = True
+    results: List[BatchSubmitItem]
 
 
 class StatsResponse(BaseModel):
@@ -0,0 +1,75 @@
+"""
+提示词token预算
+本地估算提示词token数（不调用分词器），超过PROMPT_TOKEN_BUDGET时逐级压缩：
+  1. full     完整格式（长尾类别已合并为"其他(n)"）
+  2. compact  选项改为短代码 + 图例
+  3. simple   改用简化版提示词（输出结构也随之简化）
+  4. 逐步减少每题列出的类别数，直到不超过预算
+"""
+import os
+import re
+from typing import Any, Dict
+
+from prompts import (
+    PROMPT_MAX_CATEGORIES,
+    _format_stats_compact,
+    _format_stats_for_prompt,
+    get_analysis_prompt,
+    get_simple_analysis_prompt
+)
+
+# 中日韩字符约1个token/字，其余（英文、数字、标点、JSON结构）约3.5字符/token，偏保守估计
+CJK_CHAR = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+CJK_TOKENS_PER_CHAR = 1.0
+OTHER_CHARS_PER_TOKEN = 3.5
+
+# 压缩到最后每题至少保留的类别数
+MIN_CATEGORIES = 3
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的token数"""
+    cjk = len(CJK_CHAR.findall(text))
+    return int(cjk * CJK_TOKENS_PER_CHAR + (len(text) - cjk) / OTHER_CHARS_PER_TOKEN) + 1
+
+
+def build_prompt(stats: Dict[str, Any], use_simple_prompt: bool = False, budget: int = None) -> Dict[str, Any]:
+    """
+    生成不超过token预算的分析提示词
+
+    Args:
+        stats: 统计数据
+        use_simple_prompt: 是否直接使用简化版提示词
+        budget: token上限（默认PROMPT_TOKEN_BUDGET）
+
+    Returns:
+        {'prompt': 提示词, 'simple': 最终是否为简化版, 'stage': 'full'/'compact'/'simple'/'truncated',
+         'estimated_tokens': 估算token数, 'budget': 上限, 'over_budget': 压缩到底仍超出时为True}
+    """
+    budget = budget or int(os.getenv('PROMPT_TOKEN_BUDGET', '6000'))
+
+    def attempt(stage: str, simple: bool, stats_text: str) -> Dict[str, Any]:
+        prompt = (get_simple_analysis_prompt if simple else get_analysis_prompt)(stats, stats_text)
+        return {'prompt': prompt, 'simple': simple, 'stage': stage, 'estimated_tokens': estimate_tokens(prompt)}
+
+    candidates = [
+        lambda: attempt('full', use_simple_prompt, _format_stats_for_prompt(stats)),
+        lambda: attempt('compact', use_simple_prompt, _format_stats_compact(stats)),
+    ]
+    if not use_simple_prompt:
+        candidates.append(lambda: attempt('simple', True, _format_stats_compact(stats)))
+    categories = PROMPT_MAX_CATEGORIES
+    while categories > MIN_CATEGORIES:
+        categories = max(MIN_CATEGORIES, categories // 2)
+        candidates.append(
+            lambda n=categories: attempt('truncated', True, _format_stats_compact(stats, max_categories=n))
+        )
+
+    for candidate in candidates:
+        result = candidate()
+        if result['estimated_tokens'] <= budget:
+            break
+    result.update(budget=budget, over_budget=result['estimated_tokens'] > budget)
+    if result['stage'] != 'full':
+        print(f"✂️  提示词超出预算（{budget} tokens），已压缩为 {result['stage']}：约 {result['estimated_tokens']} tokens")
+    return result
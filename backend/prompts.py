@@ -1,108 +1,191 @@
 """
 AI分析提示词模板 - 输出JSON结构
 """
+import os
+
+from questionnaire_config import questionnaire_config
 
 ANALYSIS_SYSTEM_PROMPT = """你是一位资深的金融行业AI应用专家和数据分析师。你的任务是分析MBA学生的问卷调研结果，并为演讲者提供针对性的内容建议。
 
 **重要**：你必须输出严格的JSON格式，不要有任何额外的文字说明。"""
 
-# 问卷题目说明（用于AI理解评分）
-QUESTION_LABELS = {
-    'q3_digital_habit': {
-        1: '基础工具（Office等）',
-        2: 'Excel高级+简单BI',
-        3: 'SQL查询/Python脚本',
-        4: '搭建工具/自动化流程'
-    },
-    'q4_ai_self_position': {
-        1: '好奇观望',
-        2: '个人用户',
-        3: '场景探索',
-        4: '推动落地'
-    },
-    'q5_ai_usage': {
-        1: '还没怎么用过',
-        2: '偶尔用（查资料、文案）',
-        3: '经常用（有固定模板）',
-        4: '深度用（分析、方案设计）',
-        5: '团队推广（培训、规范）'
-    },
-    'q6_org_stage': {
-        1: '调研讨论阶段',
-        2: '小范围试点',
-        3: '多场景稳定使用',
-        4: '整体规划推进',
-        5: '不确定'
-    },
-    'q7_personal_role': {
-        1: '使用者',
-        2: '参与者',
-        3: '推动者',
-        4: '观察者'
-    },
-    'q9_attitude': {
-        1: '积极拥抱',
-        2: '理性谨慎',
-        3: '观望等待',
-        4: '存疑担忧',
-        5: '不确定'
-    }
-}
+# 问卷题目说明（用于AI理解评分），选项值 -> 完整标签，来自 questionnaire_config.json
+QUESTION_LABELS = questionnaire_config.labels
+
+# 紧凑格式图例用的短标签
+QUESTION_SHORT_LABELS = questionnaire_config.short_labels
+
+# 提示词中各分布的顺序：统计字段, 题目字段, 标题
+PROMPT_SECTIONS = [
+    ('industries', 'q1_industry', '行业分布'),
+    ('roles', 'q2_role', '职位角色'),
+    ('digital_habits', 'q3_digital_habit', '数字化能力（Q3）'),
+    ('ai_self_positions', 'q4_ai_self_position', 'AI认知定位（Q4）'),
+    ('ai_usages', 'q5_ai_usage', 'AI使用程度（Q5）'),
+    ('org_stages', 'q6_org_stage', '机构AI阶段（Q6）'),
+    ('personal_roles', 'q7_personal_role', '个人项目角色（Q7）'),
+    ('pain_points', 'q8_pain_points', '主要痛点（Q8）'),
+    ('attitudes', 'q9_attitude', '对AI态度（Q9）'),
+    ('constraints', 'q10_constraints', '推进约束（Q10）'),
+]
+
+# 每个分布最多列出的类别数，其余合并为"其他(n)"
+PROMPT_MAX_CATEGORIES = int(os.getenv('PROMPT_MAX_CATEGORIES', '12'))
+
+# 不在问卷选项中的自由填写值，占比低于此值时合并为"其他(n)"
+PROMPT_TAIL_MIN_SHARE = float(os.getenv('PROMPT_TAIL_MIN_SHARE', '0.02'))
+
+# 自由填写值在提示词中保留的最大字数
+MAX_FREE_TEXT_CHARS = 20
+
+# "其他"选项的值，以及提示词中列出的自由填写细分数
+OTHER_OPTION = 'other'
+OTHER_BREAKDOWN_LIMIT = 5
+
+
+def _option_key(labels: dict, key):
+    """统计结果中的键 -> 问卷选项值（整数选项在JSON里是字符串），不是已知选项时返回None"""
+    if key in labels:
+        return key
+    if str(key).isdigit() and int(key) in labels:
+        return int(key)
+    return None
 
-def _format_stats_for_prompt(stats: dict) -> str:
+
+def _free_text(key) -> str:
+    text = str(key).strip()
+    return text if len(text) <= MAX_FREE_TEXT_CHARS else text[:MAX_FREE_TEXT_CHARS] + '…'
+
+
+def _collapse_tail(data: dict, field: str, max_categories: int) -> tuple:
+    """
+    按人数排序，超出max_categories的类别和低占比的自由填写值合并
+    
+    Returns:
+        ([(选项值或自由填写文本, 是否已知选项, 人数)], 合并的类别数, 合并的人数)
+    """
+    labels = QUESTION_LABELS.get(field, {})
+    total = sum(data.values())
+    kept, tail_kinds, tail_count = [], 0, 0
+    for key, count in sorted(data.items(), key=lambda x: x[1], reverse=True):
+        option = _option_key(labels, key)
+        known = option is not None
+        if len(kept) < max_categories and (known or count / total >= PROMPT_TAIL_MIN_SHARE):
+            kept.append((option if known else _free_text(key), known, count))
+        else:
+            tail_kinds += 1
+            tail_count += count
+    return kept, tail_kinds, tail_count
+
+
+def _other_breakdown(stats: dict, stats_key: str, limit: int = OTHER_BREAKDOWN_LIMIT) -> str:
+    """"其他"选项的自由填写细分（free_text_index归一化后的簇），如 "金融监管 5、咨询 3、另有2类" """
+    clusters = (stats.get('other_answers') or {}).get(stats_key) or []
+    if not clusters:
+        return ''
+    parts = [f"{_free_text(c['label'])} {c['count']}" for c in clusters[:limit]]
+    if len(clusters) > limit:
+        parts.append(f"另有{len(clusters) - limit}类")
+    return "、".join(parts)
+
+
+def _share_base(stats: dict, field: str, data: dict) -> int:
+    """占比的分母：单选题为各选项人数之和；多选题每人可选多项，按总样本数计算（占比之和可超过100%）"""
+    total = sum(data.values())
+    if questionnaire_config.questions.get(field, {}).get('type') == 'multiple_choice':
+        return stats.get('total_responses') or total
+    return total
+
+
+def _format_stats_for_prompt(stats: dict, max_categories: int = PROMPT_MAX_CATEGORIES) -> str:
     """格式化统计数据用于提示词"""
     
-    def format_dist(data: dict, labels: dict = None) -> str:
+    def format_dist(data: dict, field: str, stats_key: str) -> str:
         if not data:
             return "（无数据）"
-        total = sum(data.values())
+        total = _share_base(stats, field, data)
+        labels = QUESTION_LABELS.get(field, {})
+        kept, tail_kinds, tail_count = _collapse_tail(data, field, max_categories)
         lines = []
-        for key, count in sorted(data.items(), key=lambda x: x[1], reverse=True):
-            pct = count / total * 100
-            label = labels.get(int(key) if key.isdigit() else key, key) if labels else key
-            lines.append(f"  - {label}: {count}人 ({pct:.1f}%)")
+        for key, known, count in kept:
+            label = labels[key] if known else key
+            breakdown = _other_breakdown(stats, stats_key) if key == OTHER_OPTION else ''
+            lines.append(f"  - {label}: {count}人 ({count / total * 100:.1f}%)" + (f"，填写: {breakdown}" if breakdown else ''))
+        if tail_count:
+            lines.append(f"  - 其他({tail_kinds}项): {tail_count}人 ({tail_count / total * 100:.1f}%)")
         return "\n".join(lines)
     
+    sections = "\n\n".join(
+        f"## {title}\n{format_dist(stats.get(stats_key) or {}, field, stats_key)}"
+        for stats_key, field, title in PROMPT_SECTIONS
+    )
     return f"""
 # 受众数据概览
 - 总样本: {stats.get('total_responses', 0)}人
-- 平均完成时间: {stats.get('avg_completion_time', 0):.1f}秒
-
-## 行业分布
-{format_dist(stats.get('industries', {}))}
+- 平均完成时间: {stats.get('avg_completion_time') or 0:.1f}秒
+- 多选题（Q8/Q10）占比按总样本计算，之和可超过100%
 
-## 职位角色
-{format_dist(stats.get('roles', {}))}
-
-## 数字化能力（Q3）
-{format_dist(stats.get('digital_habits', {}), QUESTION_LABELS['q3_digital_habit'])}
-
-## AI认知定位（Q4）
-{format_dist(stats.get('ai_self_positions', {}), QUESTION_LABELS['q4_ai_self_position'])}
-
-## AI使用程度（Q5）
-{format_dist(stats.get('ai_usages', {}), QUESTION_LABELS['q5_ai_usage'])}
+{sections}
+"""
 
-## 机构AI阶段（Q6）
-{format_dist(stats.get('org_stages', {}), QUESTION_LABELS['q6_org_stage'])}
 
-## 个人项目角色（Q7）
-{format_dist(stats.get('personal_roles', {}), QUESTION_LABELS['q7_personal_role'])}
+def _option_code(field: str, option) -> str:
+    """选项短代码：整数选项直接用数值，其余按问卷顺序编为 a, b, c ..."""
+    if isinstance(option, int):
+        return str(option)
+    index = list(QUESTION_LABELS.get(field, {})).index(option)
+    return chr(ord('a') + index) if index < 26 else f"o{index}"
 
-## 主要痛点（Q8）
-{format_dist(stats.get('pain_points', {}))}
 
-## 对AI态度（Q9）
-{format_dist(stats.get('attitudes', {}), QUESTION_LABELS['q9_attitude'])}
+def _format_stats_compact(stats: dict, max_categories: int = PROMPT_MAX_CATEGORIES) -> str:
+    """
+    紧凑格式：选项用短代码，每题一行，末尾附图例（只含出现过的代码，使用短标签）
+    
+    例: Q1 行业分布: a:40(33%) c:20(17%) 其他(3):5(4%)
+    """
+    lines, legend = [], []
+    for stats_key, field, title in PROMPT_SECTIONS:
+        data = stats.get(stats_key) or {}
+        name = field.split('_', 1)[0].upper()
+        if not data:
+            lines.append(f"{name} {title.split('（')[0]}: 无")
+            continue
+        total = _share_base(stats, field, data)
+        labels = QUESTION_SHORT_LABELS.get(field, {})
+        kept, tail_kinds, tail_count = _collapse_tail(data, field, max_categories)
+        items, used = [], []
+        for key, known, count in kept:
+            code = _option_code(field, key) if known else f'"{key}"'
+            breakdown = _other_breakdown(stats, stats_key, limit=3) if key == OTHER_OPTION else ''
+            items.append(f"{code}:{count}({round(count * 100 / total)}%)" + (f"[{breakdown}]" if breakdown else ''))
+            if known:
+                used.append(key)
+        if tail_count:
+            items.append(f"其他({tail_kinds}):{tail_count}({round(tail_count * 100 / total)}%)")
+        lines.append(f"{name} {title.split('（')[0]}: " + " ".join(items))
+        if used:
+            ordered = [option for option in labels if option in used]
+            legend.append(f"{name} " + " ".join(f"{_option_code(field, o)}={labels[o]}" for o in ordered))
+    
+    return f"""
+# 受众数据（n={stats.get('total_responses', 0)}，平均完成时间{stats.get('avg_completion_time') or 0:.0f}秒）
+格式: 选项代码:人数(占比)，代码含义见图例；多选题（Q8/Q10）占比按总样本计算，之和可超过100%
+{chr(10).join(lines)}
 
-## 推进约束（Q10）
-{format_dist(stats.get('constraints', {}))}
+# 图例
+{chr(10).join(legend)}
 """
 
-def get_analysis_prompt(stats: dict) -> str:
-    """生成完整的分析提示词"""
+def get_analysis_prompt(stats: dict, stats_text: str = None) -> str:
+    """
+    生成完整的分析提示词
+    
+    Args:
+        stats: 统计数据
+        stats_text: 已格式化的统计数据（prompt_budget压缩后传入），默认按完整格式生成
+    """
     
-    stats_text = _format_stats_for_prompt(stats)
+    stats_text = stats_text or _format_stats_for_prompt(stats)
     
     prompt = f"""{stats_text}
 
@@ -278,10 +361,10 @@ def get_analysis_prompt(stats: dict) -> str:
 
 
 # 简化版提示词（如果需要快速分析）
-def get_simple_analysis_prompt(stats: dict) -> str:
+def get_simple_analysis_prompt(stats: dict, stats_text: str = None) -> str:
     """生成简化版提示词"""
     
-    stats_text = _format_stats_for_prompt(stats)
+    stats_text = stats_text or _format_stats_for_prompt(stats)
     
     prompt = f"""{stats_text}
 
@@ -298,3 +381,129 @@ def get_simple_analysis_prompt(stats: dict) -> str:
 """
     
     return prompt
+
+
+# 分群分析（map）：每个群体单独一个提示词，输出字段与完整分析的 audience_segments 条目一致
+def get_segment_analysis_prompt(segment: dict, dimension_title: str, total: int) -> str:
+    """
+    生成单个群体的分析提示词
+
+    Args:
+        segment: segment_stats.compute_segment_stats 返回的群体（name / size / stats）
+        dimension_title: 分群维度标题，如"行业分布"
+        total: 全场样本数
+    """
+    stats_text = _format_stats_compact(segment['stats'], max_categories=6)
+
+    prompt = f"""# 分群: {dimension_title.split('（')[0]} = {segment['name']}（{segment['size']}人，占全场{segment['size'] * 100 / total:.0f}%）
+{stats_text}
+
+请只分析这个群体，为一场2小时的金融AI应用演讲提供针对该群体的建议。
+
+输出JSON格式：
+{{
+  "characteristics": "该群体的特点（60字以内）",
+  "pain_points": ["最突出的痛点1", "痛点2"],
+  "content_focus": ["对该群体应重点讲的方面1", "方面2"],
+  "engagement_strategy": "互动策略（40字以内）"
+}}
+"""
+
+    return prompt
+
+
+# 分群分析（reduce）：合并各群体结论，只输出跨群体的部分
+def get_segment_reduce_prompt(stats_text: str, dimension_title: str, segment_reports: list) -> str:
+    """
+    生成合并各群体结论的提示词
+
+    Args:
+        stats_text: 全场统计（紧凑格式）
+        dimension_title: 分群维度标题
+        segment_reports: [{'segment_name', 'count', 'percentage', 'characteristics', 'pain_points', ...}]
+    """
+    import json
+
+    reports = "\n".join(json.dumps(r, ensure_ascii=False, separators=(',', ':')) for r in segment_reports)
+
+    prompt = f"""{stats_text}
+
+# 按{dimension_title.split('（')[0]}分群的分析结论（每行一个群体）
+{reports}
+
+请综合全场数据和各群体结论，为一场2小时的AI应用演讲给出整体建议，重点说明群体之间的差异如何影响讲法。
+
+输出JSON格式：
+{{
+  "overall_summary": "全场受众总结（100字以内）",
+  "segment_differences": [
+    {{"topic": "差异点", "difference": "哪些群体有何不同", "suggestion": "演讲中如何兼顾"}}
+  ],
+  "key_findings": [
+    {{"title": "发现", "priority": "high/medium/low", "details": ["依据"], "implication": "对演讲的启示"}}
+  ],
+  "practical_tips": {{
+    "opening": "开场建议",
+    "transitions": "过渡建议",
+    "engagement_techniques": ["技巧1", "技巧2"],
+    "closing": "结尾建议"
+  }}
+}}
+"""
+
+    return prompt
+
+
+# 统计字段 -> 选项标签（用于增量分析的差异描述）
+STATS_KEY_LABELS = {
+    'digital_habits': QUESTION_LABELS['q3_digital_habit'],
+    'ai_self_positions': QUESTION_LABELS['q4_ai_self_position'],
+    'ai_usages': QUESTION_LABELS['q5_ai_usage'],
+    'org_stages': QUESTION_LABELS['q6_org_stage'],
+    'personal_roles': QUESTION_LABELS['q7_personal_role'],
+    'attitudes': QUESTION_LABELS['q9_attitude'],
+}
+
+
+# 增量分析提示词（只更新有变化的部分）
+def get_incremental_analysis_prompt(previous_analysis: dict, diff_text: str) -> str:
+    """
+    生成增量分析提示词
+    
+    Args:
+        previous_analysis: 上次的分析结果（JSON对象）
+        diff_text: 与上次分析相比的统计变化（stats_diff.format_diff_for_prompt的输出）
+    """
+    import json
+    
+    previous_text = json.dumps(previous_analysis, ensure_ascii=False, separators=(',', ':'))
+    
+    prompt = f"""# 上次的分析报告（JSON）
+{previous_text}
+
+# 自上次分析以来的数据变化（旧值→新值）
+{diff_text}
+
+---
+
+请根据数据变化更新上面的分析报告：
+1. 只输出需要修改的顶层字段（完整输出该字段的新内容），没有变化的顶层字段不要输出
+2. 字段结构必须与上次报告保持一致
+3. 如果变化不影响结论，输出空对象 {{}}
+
+输出必须是有效的JSON对象。
+"""
+    
+    return prompt
+
+
+# 输出被截断时的续写提示
+CONTINUATION_PROMPT = """你上一条回复因长度限制被截断了。请从中断处直接继续输出剩余的JSON内容：
+不要重复已输出的部分，不要添加任何解释或代码块标记，保证与前文拼接后是完整有效的JSON。"""
+
+
+def get_fill_missing_prompt(missing_keys: list) -> str:
+    """只请求补全缺失的顶层字段"""
+    keys = "、".join(f'"{k}"' for k in missing_keys)
+    return f"""上面的分析结果缺少或格式不正确的字段：{keys}。
+请只输出包含这些字段的JSON对象（结构与最初要求一致），不要重复其他字段。"""
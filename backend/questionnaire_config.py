@@ -0,0 +1,71 @@
+"""
+问卷配置
+启动时加载一次 questionnaire_config.json，作为题目与选项标签的唯一来源：
+- /api/config 直接返回预先序列化好的内容，ETag为内容哈希
+- 标签索引（字段 -> 选项值 -> 标签）供图表、交叉分析和提示词使用
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# 仓库根目录；Docker镜像只包含backend/，由docker-compose挂载到 /app 下
+CONFIG_CANDIDATES = [
+    Path(__file__).resolve().parent.parent / 'questionnaire_config.json',
+    Path(__file__).resolve().parent / 'questionnaire_config.json',
+]
+
+
+class QuestionnaireConfig:
+    """问卷配置及标签索引"""
+
+    def __init__(self, path: Optional[str] = None):
+        path = path or os.getenv('QUESTIONNAIRE_CONFIG_PATH')
+        if not path:
+            path = next((p for p in CONFIG_CANDIDATES if p.exists()), CONFIG_CANDIDATES[0])
+        self.path = Path(path)
+        self.load()
+
+    def load(self):
+        """（重新）加载配置文件并重建索引"""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self.data: Dict[str, Any] = json.load(f)
+
+        self.labels: Dict[str, Dict[Any, str]] = {}         # db字段 -> 选项值 -> 完整标签
+        self.short_labels: Dict[str, Dict[Any, str]] = {}   # db字段 -> 选项值 -> 图表用短标签
+        self.questions: Dict[str, Dict[str, Any]] = {}      # db字段 -> 题目
+        for question in self.data.get('questions', []):
+            field = question.get('db_field') or question['id']
+            self.questions[field] = question
+            self.labels[field] = {o['value']: o['label'] for o in question.get('options', [])}
+            self.short_labels[field] = {
+                o['value']: o.get('short_label') or o['label'] for o in question.get('options', [])
+            }
+
+        self.body = json.dumps(self.data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.version = hashlib.sha256(self.body).hexdigest()[:16]
+        self.etag = f'"{self.version}"'
+
+    def label(self, field: str, value: Any, short: bool = True) -> str:
+        """
+        选项值 -> 标签，未知值原样返回
+
+        数据库/统计结果中的整数选项可能是字符串（'3'），按整数再查一次
+        """
+        index = (self.short_labels if short else self.labels).get(field)
+        if not index:
+            return str(value)
+        if value in index:
+            return index[value]
+        if isinstance(value, str) and value.lstrip('-').isdigit() and int(value) in index:
+            return index[int(value)]
+        return str(value)
+
+    def options(self, field: str) -> List[Any]:
+        """按问卷顺序返回某题的选项值"""
+        return list(self.labels.get(field, {}))
+
+
+# 全局实例
+questionnaire_config = QuestionnaireConfig()
@@ -0,0 +1,131 @@
+"""
+分群统计
+按某个单选维度（默认Q1行业）把场次的问卷回答分群，一次遍历算出每个群体的各题分布，
+结构与get_session_statistics一致，可直接用于生成分析提示词
+"""
+import os
+from collections import Counter
+from typing import Any, Dict, List
+
+from crosstab import DIMENSIONS, MISSING, MULTI_SELECT
+from prompts import PROMPT_SECTIONS
+from questionnaire_config import questionnaire_config
+
+# 人数少于此值的群体合并为"其他"（合并后仍不足则不单独分析）
+SEGMENT_MIN_SIZE = int(os.getenv('ANALYSIS_SEGMENT_MIN_SIZE', '5'))
+
+# 最多分析的群体数（按人数从多到少），其余合并为"其他"
+SEGMENT_MAX_COUNT = int(os.getenv('ANALYSIS_SEGMENT_MAX_COUNT', '6'))
+
+# 合并群体的键（显示为"其他(n类)"）
+OTHER_SEGMENT = '其他'
+
+# 列名 -> 题目标题（用于提示词）
+SECTION_TITLES = {field: title for _, field, title in PROMPT_SECTIONS}
+
+
+def resolve_segment_dimension(dim: str) -> str:
+    """q1 / q1_industry 等写法统一为列名；多选题不能用于分群，不合法时抛出ValueError"""
+    dim = (dim or 'q1').strip().lower()
+    column = DIMENSIONS.get(dim) or (dim if dim in DIMENSIONS.values() else None)
+    if column is None or column in MULTI_SELECT:
+        options = ', '.join(k for k, c in DIMENSIONS.items() if c not in MULTI_SELECT)
+        raise ValueError(f"不支持的分群维度: {dim}（可选: {options}）")
+    return column
+
+
+class _Accumulator:
+    """单个群体的计数"""
+
+    def __init__(self):
+        self.size = 0
+        self.counts: Dict[str, Counter] = {stats_key: Counter() for stats_key, _, _ in PROMPT_SECTIONS}
+        self.times: List[float] = []
+
+    def add(self, row: Dict[str, Any]):
+        self.size += 1
+        for stats_key, field, _ in PROMPT_SECTIONS:
+            value = row.get(field)
+            if field in MULTI_SELECT:
+                self.counts[stats_key].update(value or [])
+            else:
+                self.counts[stats_key][MISSING if value is None else str(value)] += 1
+        if row.get('completion_time_seconds') is not None:
+            self.times.append(row['completion_time_seconds'])
+
+    def merge(self, other: '_Accumulator'):
+        self.size += other.size
+        for stats_key, counter in other.counts.items():
+            self.counts[stats_key].update(counter)
+        self.times.extend(other.times)
+
+    def stats(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {
+            'total_responses': self.size,
+            'avg_completion_time': round(sum(self.times) / len(self.times), 1) if self.times else None,
+        }
+        for stats_key, counter in self.counts.items():
+            result[stats_key] = dict(counter) or None
+        return result
+
+
+def compute_segment_stats(
+    rows: List[Dict[str, Any]],
+    column: str,
+    min_size: int = SEGMENT_MIN_SIZE,
+    max_segments: int = SEGMENT_MAX_COUNT
+) -> Dict[str, Any]:
+    """
+    按column分群并统计
+
+    Args:
+        rows: 问卷回答
+        column: 分群列名（单选题）
+        min_size: 最小群体人数
+        max_segments: 最多单独列出的群体数（含"其他"）
+
+    Returns:
+        {'dimension', 'title', 'total', 'segments': [{'key', 'name', 'size', 'share', 'stats'}], 'excluded': 未分析的人数}
+    """
+    groups: Dict[Any, _Accumulator] = {}
+    for row in rows:
+        value = row.get(column)
+        key = MISSING if value is None or value == '' else value
+        groups.setdefault(key, _Accumulator()).add(row)
+
+    # 群体数不超过上限时全部单独列出，否则保留人数最多的 max_segments-1 个，其余合并为"其他"
+    ordered = sorted(groups.items(), key=lambda item: item[1].size, reverse=True)
+    slots = max_segments if len(ordered) <= max_segments else max_segments - 1
+    kept, other, merged = [], _Accumulator(), 0
+    for key, acc in ordered:
+        if acc.size >= min_size and len(kept) < slots:
+            kept.append((key, acc))
+        else:
+            other.merge(acc)
+            merged += 1
+
+    labels = questionnaire_config.labels.get(column, {})
+    total = len(rows)
+
+    def segment(key, name, acc: _Accumulator) -> Dict[str, Any]:
+        return {
+            'key': key,
+            'name': name,
+            'size': acc.size,
+            'share': round(acc.size / total, 4) if total else 0.0,
+            'stats': acc.stats(),
+        }
+
+    segments = [segment(key, labels.get(key, str(key)), acc) for key, acc in kept]
+    excluded = other.size
+    if other.size >= min_size:
+        segments.append(segment(OTHER_SEGMENT, f"{OTHER_SEGMENT}({merged}类)", other))
+        excluded = 0
+
+    return {
+        'dimension': column,
+        'title': SECTION_TITLES.get(column, column),
+        'total': total,
+        'segments': segments,
+        'excluded': excluded,
+    }
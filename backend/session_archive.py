@@ -0,0 +1,260 @@
+"""
+场次归档
+关闭场次时一次性计算统计、导出CSV和AI分析，保存为不可变快照（session_snapshots表，导出文件gzip压缩）；
+之后该场次的统计/导出/分析直接返回快照内容，不再实时查询responses表。
+
+快照在进程内存和本地磁盘（SNAPSHOT_DIR）各缓存一份，按ETag每隔SNAPSHOT_CHECK_TTL秒
+向数据库确认一次，其他实例重新开启/重新归档场次后缓存随之失效。
+"""
+import asyncio
+import base64
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# 导出CSV的列
+EXPORT_FIELDS = [
+    'id', 'created_at', 'session_id',
+    'q1_industry', 'q1_industry_other',
+    'q2_role', 'q2_role_other',
+    'q3_digital_habit', 'q4_ai_self_position',
+    'q5_ai_usage', 'q6_org_stage', 'q7_personal_role',
+    'q8_pain_points', 'q9_attitude', 'q10_constraints',
+    'completion_time_seconds', 'device_type'
+]
+
+DEFAULT_SNAPSHOT_DIR = Path(__file__).resolve().parent / 'snapshots'
+
+
+def responses_to_csv(responses: List[Dict[str, Any]]) -> str:
+    """问卷回答 -> CSV文本（多选题用逗号连接）"""
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=EXPORT_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+    for response in responses:
+        row = dict(response)
+        if row.get('q8_pain_points'):
+            row['q8_pain_points'] = ','.join(row['q8_pain_points'])
+        if row.get('q10_constraints'):
+            row['q10_constraints'] = ','.join(row['q10_constraints'])
+        writer.writerow(row)
+    return output.getvalue()
+
+
+class SessionSnapshot:
+    """已归档场次的快照（内容不可变）"""
+
+    def __init__(self, row: Dict[str, Any]):
+        self.session_id = row['session_id']
+        self.etag = row['etag']
+        self.response_count = row['response_count']
+        self.finalized_at = row['finalized_at']
+        self.stats: Dict[str, Any] = row['stats']
+        self.analysis: Optional[Dict[str, Any]] = row.get('analysis')
+        self.export_gz: bytes = base64.b64decode(row['export_csv_gz'])
+        # 预先序列化，读取时直接返回字节
+        self.stats_body = json.dumps(
+            {**self.stats, 'archived': True, 'finalized_at': self.finalized_at},
+            ensure_ascii=False
+        ).encode('utf-8')
+        self.checked_at = time.monotonic()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'session_id': self.session_id,
+            'archived': True,
+            'etag': self.etag,
+            'response_count': self.response_count,
+            'finalized_at': self.finalized_at,
+            'has_analysis': self.analysis is not None,
+        }
+
+
+class SessionArchive:
+    """场次归档快照管理"""
+
+    def __init__(self, database, completion_sketches=None, analyzer=None, free_text_index=None):
+        self.db = database
+        self.completion_sketches = completion_sketches
+        self.free_text_index = free_text_index
+        self.analyzer = analyzer
+        self.snapshot_dir = Path(os.getenv('SNAPSHOT_DIR') or DEFAULT_SNAPSHOT_DIR)
+        self.check_ttl = float(os.getenv('SNAPSHOT_CHECK_TTL', '10'))
+        self._snapshots: Dict[str, SessionSnapshot] = {}
+        self._missing: Dict[str, float] = {}    # 未归档的场次 -> 上次确认时间
+        self._finalizing = set()
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    # ---------------- 读取 ----------------
+
+    def _dir(self, session_id: str) -> Path:
+        safe = re.sub(r'[^A-Za-z0-9_.-]', '_', session_id)
+        return self.snapshot_dir / f"{safe}-{hashlib.sha1(session_id.encode()).hexdigest()[:8]}"
+
+    def _disk_path(self, session_id: str, etag: str) -> Path:
+        return self._dir(session_id) / f"{etag}.json.gz"
+
+    def export_path(self, snapshot: SessionSnapshot) -> Path:
+        """导出文件在本地磁盘上的路径（gzip压缩的CSV）"""
+        return self._dir(snapshot.session_id) / f"{snapshot.etag}.csv.gz"
+
+    def _write_disk(self, row: Dict[str, Any], snapshot: SessionSnapshot):
+        try:
+            directory = self._dir(snapshot.session_id)
+            if directory.exists():
+                shutil.rmtree(directory)      # 删除旧版本
+            directory.mkdir(parents=True)
+            self._disk_path(snapshot.session_id, snapshot.etag).write_bytes(
+                gzip.compress(json.dumps(row, ensure_ascii=False).encode('utf-8'), mtime=0)
+            )
+            self.export_path(snapshot).write_bytes(snapshot.export_gz)
+        except OSError as e:
+            print(f"⚠️  写入本地归档缓存失败: {e}")
+
+    def _read_disk(self, session_id: str, etag: str) -> Optional[Dict[str, Any]]:
+        path = self._disk_path(session_id, etag)
+        try:
+            return json.loads(gzip.decompress(path.read_bytes())) if path.exists() else None
+        except (OSError, ValueError):
+            return None
+
+    async def get(self, session_id: str) -> Optional[SessionSnapshot]:
+        """
+        获取已归档场次的快照，未归档时返回None
+
+        缓存在check_ttl秒内直接使用；超过后只查询ETag确认是否仍然有效
+        """
+        now = time.monotonic()
+        snapshot = self._snapshots.get(session_id)
+        if snapshot and now - snapshot.checked_at < self.check_ttl:
+            return snapshot
+        checked = self._missing.get(session_id)
+        if snapshot is None and checked is not None and now - checked < self.check_ttl:
+            return None
+
+        etag = await asyncio.to_thread(self.db.get_session_snapshot_etag, session_id)
+        if etag is None:
+            self._snapshots.pop(session_id, None)
+            self._missing[session_id] = now
+            return None
+        if snapshot and snapshot.etag == etag:
+            snapshot.checked_at = now
+            return snapshot
+
+        row = self._read_disk(session_id, etag)
+        from_disk = row is not None
+        if row is None:
+            row = await asyncio.to_thread(self.db.get_session_snapshot, session_id)
+            if row is None:
+                self._missing[session_id] = now
+                return None
+        snapshot = SessionSnapshot(row)
+        if not from_disk:
+            self._write_disk(row, snapshot)
+        self._snapshots[session_id] = snapshot
+        self._missing.pop(session_id, None)
+        return snapshot
+
+    async def is_closed(self, session_id: str) -> bool:
+        """场次是否已关闭（归档中或已归档）"""
+        return session_id in self._finalizing or await self.get(session_id) is not None
+
+    # ---------------- 关闭/重新开启 ----------------
+
+    async def _analysis_for(self, session_id: str, stats: Dict[str, Any], analyze: bool) -> Optional[Dict[str, Any]]:
+        """已有分析覆盖了全部回答时直接使用，否则（允许时）重新分析一次"""
+        try:
+            existing = self.db.get_analysis_result(session_id)
+        except Exception as e:
+            print(f"⚠️  读取分析结果失败: {e}")
+            existing = None
+
+        total = stats.get('total_responses', 0)
+        if analyze and self.analyzer is not None and total and \
+                (existing is None or existing.get('total_responses') != total):
+            result = await self.analyzer.analyze_questionnaire(stats=stats, session_id=session_id)
+            if result.get('success'):
+                self.db.save_analysis_result(
+                    session_id=session_id,
+                    analysis_text=result['analysis_text'],
+                    model_name=result['model'],
+                    total_responses=result['total_responses'],
+                    stats_snapshot=result.get('stats_snapshot')
+                )
+                existing = self.db.get_analysis_result(session_id)
+            else:
+                print(f"⚠️  归档时AI分析失败，保留已有分析: {result.get('error')}")
+
+        return existing
+
+    async def finalize(self, session_id: str, analyze: bool = True) -> SessionSnapshot:
+        """
+        关闭场次并生成快照：停止接收提交，计算统计、导出文件和AI分析各一次
+
+        Args:
+            session_id: 场次ID
+            analyze: 已有分析未覆盖全部回答时是否重新调用AI分析
+        """
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        async with lock:
+            self._finalizing.add(session_id)
+            try:
+                await asyncio.to_thread(self.db.set_session_active, session_id, False)
+
+                # 归档快照不可变，必须读主库的完整数据（不受副本延迟影响）
+                stats = await self.db.get_statistics(session_id, primary=True)
+                stats.pop('latest_submission', None)
+                if self.completion_sketches is not None:
+                    stats['completion_time_quantiles'] = await self.completion_sketches.quantiles(session_id)
+                if self.free_text_index is not None:
+                    stats['other_answers'] = await self.free_text_index.summary(session_id)
+
+                responses = await self.db.get_all_responses(session_id, columns=EXPORT_FIELDS, primary=True)
+                export_gz = gzip.compress(responses_to_csv(responses).encode('utf-8'), mtime=0)
+                analysis = await self._analysis_for(session_id, stats, analyze)
+
+                digest = hashlib.sha256()
+                digest.update(json.dumps([stats, analysis], sort_keys=True, ensure_ascii=False, default=str).encode())
+                digest.update(export_gz)
+                row = {
+                    'session_id': session_id,
+                    'etag': digest.hexdigest()[:32],
+                    'response_count': len(responses),
+                    'stats': stats,
+                    'analysis': analysis,
+                    'export_csv_gz': base64.b64encode(export_gz).decode('ascii'),
+                    'finalized_at': datetime.now(timezone.utc).isoformat(),
+                }
+                await asyncio.to_thread(self.db.save_session_snapshot, row)
+
+                snapshot = SessionSnapshot(row)
+                self._write_disk(row, snapshot)
+                self._snapshots[session_id] = snapshot
+                self._missing.pop(session_id, None)
+                print(f"📦 场次 {session_id} 已归档：{len(responses)} 条回答，导出 {len(export_gz)} 字节")
+                return snapshot
+            finally:
+                self._finalizing.discard(session_id)
+
+    async def reopen(self, session_id: str):
+        """重新开启场次：删除快照，恢复实时统计"""
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        async with lock:
+            await asyncio.to_thread(self.db.delete_session_snapshot, session_id)
+            await asyncio.to_thread(self.db.set_session_active, session_id, True)
+            self.invalidate(session_id)
+
+    def invalidate(self, session_id: str):
+        """丢弃本进程的快照缓存（场次数据被清理或重新开启后）"""
+        self._snapshots.pop(session_id, None)
+        self._missing.pop(session_id, None)
+        shutil.rmtree(self._dir(session_id), ignore_errors=True)
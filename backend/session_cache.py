@@ -0,0 +1,85 @@
+"""
+场次数据缓存
+按场次缓存问卷回答及其派生结果（如交叉分析），以场次版本（回答数 + 最新提交时间）判断是否失效
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+# 缓存的列（不含user_agent/ip_hash等与分析无关的列）
+CACHED_COLUMNS = [
+    'id', 'created_at',
+    'q1_industry', 'q2_role',
+    'q3_digital_habit', 'q4_ai_self_position',
+    'q5_ai_usage', 'q6_org_stage', 'q7_personal_role',
+    'q8_pain_points', 'q9_attitude', 'q10_constraints',
+    'completion_time_seconds', 'device_type'
+]
+
+
+class SessionEntry:
+    """单个场次的缓存数据"""
+
+    def __init__(self, version: str, rows: List[Dict[str, Any]]):
+        self.version = version
+        self.rows = rows
+        self.checked_at = time.monotonic()
+        self.derived: Dict[Any, Any] = {}
+
+
+class SessionCache:
+    """场次数据缓存（LRU）"""
+
+    def __init__(self, database, max_sessions: Optional[int] = None, ttl: Optional[float] = None):
+        self.db = database
+        self.max_sessions = max_sessions or int(os.getenv('SESSION_CACHE_SIZE', '32'))
+        # 在ttl秒内复用缓存而不查询版本，交互式查询时避免每次请求都访问数据库
+        self.ttl = float(os.getenv('SESSION_CACHE_TTL', '2')) if ttl is None else ttl
+        self._entries: 'OrderedDict[str, SessionEntry]' = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def get(self, session_id: str) -> SessionEntry:
+        """获取场次缓存，版本变化时重新加载"""
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(session_id)
+            if entry and time.monotonic() - entry.checked_at < self.ttl:
+                self._entries.move_to_end(session_id)
+                return entry
+
+            version = await self.db.get_session_version(session_id)
+            if entry and entry.version == version:
+                entry.checked_at = time.monotonic()
+                self._entries.move_to_end(session_id)
+                return entry
+
+            rows = await self.db.get_all_responses(session_id, columns=CACHED_COLUMNS)
+            entry = SessionEntry(version, rows)
+            self._entries[session_id] = entry
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_sessions:
+                evicted, _ = self._entries.popitem(last=False)
+                self._locks.pop(evicted, None)
+            return entry
+
+    async def derive(self, session_id: str, key: Any, compute: Callable[[List[Dict[str, Any]]], Any]) -> Dict[str, Any]:
+        """
+        获取派生结果，同一版本内只计算一次
+
+        Returns:
+            {'version': 场次版本, 'cached': 是否命中缓存, 'value': 计算结果}
+        """
+        entry = await self.get(session_id)
+        cached = key in entry.derived
+        if not cached:
+            entry.derived[key] = compute(entry.rows)
+        return {'version': entry.version, 'cached': cached, 'value': entry.derived[key]}
+
+    def invalidate(self, session_id: Optional[str] = None):
+        """清除缓存（不指定场次时清除全部）"""
+        if session_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(session_id, None)
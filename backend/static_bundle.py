@@ -0,0 +1,106 @@
+"""
+前端静态资源服务
+提供 build_frontend.py 的构建产物：
+- assets/ 下的文件名带内容哈希，返回一年的 immutable 缓存头
+- HTML页面每次向服务器验证（no-cache + ETag），发布新版本后立即生效
+- 按 Accept-Encoding 直接返回预压缩的 .br / .gz 文件，不做运行时压缩
+"""
+import hashlib
+import mimetypes
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, Response
+
+DEFAULT_DIST_DIR = Path(__file__).resolve().parent.parent / 'frontend' / 'dist'
+
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+PAGE_CACHE = 'no-cache'
+
+# 优先级从高到低
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+MEDIA_TYPES = {
+    '.js': 'application/javascript; charset=utf-8',
+    '.css': 'text/css; charset=utf-8',
+    '.html': 'text/html; charset=utf-8',
+    '.json': 'application/json',
+}
+
+
+def accepted_encodings(header: Optional[str]) -> set:
+    """解析 Accept-Encoding（忽略 q=0 的编码）"""
+    accepted = set()
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        if name:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+class StaticBundle:
+    """构建产物目录的只读视图"""
+
+    def __init__(self, dist_dir: Optional[str] = None):
+        self.dist_dir = Path(dist_dir or os.getenv('FRONTEND_DIST_DIR') or DEFAULT_DIST_DIR).resolve()
+        self._etags: Dict[tuple, str] = {}
+
+    @property
+    def built(self) -> bool:
+        return (self.dist_dir / 'manifest.json').exists()
+
+    def _resolve(self, path: str) -> Optional[Path]:
+        target = (self.dist_dir / (path or 'questionnaire.html')).resolve()
+        if self.dist_dir not in target.parents or not target.is_file():
+            return None
+        if target.suffix in ('.gz', '.br') or target.name == 'manifest.json':
+            return None
+        return target
+
+    def _etag(self, path: Path) -> str:
+        stat = path.stat()
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        etag = self._etags.get(key)
+        if etag is None:
+            etag = self._etags[key] = hashlib.sha256(path.read_bytes()).hexdigest()[:16]
+        return etag
+
+    def response(self, path: str, request: Request) -> Response:
+        """
+        返回静态文件（带缓存头、预压缩协商和条件请求）
+
+        Raises:
+            HTTPException: 未构建（503）或文件不存在（404）
+        """
+        if not self.built:
+            raise HTTPException(status_code=503, detail="前端尚未构建，请先运行 python build_frontend.py")
+        target = self._resolve(path)
+        if target is None:
+            raise HTTPException(status_code=404, detail="文件不存在")
+
+        immutable = target.parent.name == 'assets'
+        accepted = accepted_encodings(request.headers.get('accept-encoding'))
+        encoding, served = None, target
+        for name, suffix in ENCODINGS:
+            candidate = target.with_name(target.name + suffix)
+            if name in accepted and candidate.is_file():
+                encoding, served = name, candidate
+                break
+
+        etag = f'"{self._etag(target)}{"-" + encoding if encoding else ""}"'
+        headers = {
+            'Cache-Control': IMMUTABLE_CACHE if immutable else PAGE_CACHE,
+            'Vary': 'Accept-Encoding',
+            'ETag': etag,
+        }
+        if request.headers.get('if-none-match') == etag:
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers['Content-Encoding'] = encoding
+
+        media_type = MEDIA_TYPES.get(target.suffix) or mimetypes.guess_type(target.name)[0] or 'application/octet-stream'
+        return FileResponse(served, media_type=media_type, headers=headers)
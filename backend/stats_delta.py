@@ -0,0 +1,74 @@
+"""
+统计增量
+看板带上已有的统计版本轮询，只返回此后计数有变化的选项；
+每个场次保留最近若干个版本的统计，多个看板轮询同一版本时只查询一次数据库
+"""
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from stats_diff import DISTRIBUTION_KEYS, diff_stats
+
+# 随增量一起返回的标量
+SCALAR_KEYS = ['total_responses', 'avg_completion_time', 'mobile_count', 'desktop_count']
+
+
+def _compact(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """只保留看板图表和统计卡片用到的字段"""
+    compact = {key: dict(stats.get(key) or {}) for key in DISTRIBUTION_KEYS}
+    for key in SCALAR_KEYS:
+        compact[key] = stats.get(key)
+    return compact
+
+
+class StatsDeltaTracker:
+    """按场次版本计算统计增量"""
+
+    def __init__(self, database, history_size: Optional[int] = None):
+        self.db = database
+        self.history_size = history_size or int(os.getenv('STATS_DELTA_HISTORY', '32'))
+        self._history: Dict[str, 'OrderedDict[str, Dict[str, Any]]'] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def _stats_at(self, session_id: str, version: str) -> Dict[str, Any]:
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        async with lock:
+            history = self._history.setdefault(session_id, OrderedDict())
+            stats = history.get(version)
+            if stats is None:
+                stats = history[version] = _compact(await self.db.get_statistics(session_id))
+                while len(history) > self.history_size:
+                    history.popitem(last=False)
+            return stats
+
+    async def delta(self, session_id: str, since: Optional[str] = None) -> Dict[str, Any]:
+        """
+        计算自since版本以来的统计变化
+
+        Returns:
+            无变化: {'version': v, 'unchanged': True}
+            增量:   {'version': v, 'base': since, 'set': {'industries': {'bank': 12}}, 'scalars': {...}}
+                    set中的值是新的计数（0表示该选项已无人选择）
+            全量:   {'version': v, 'full': True, 'stats': {...}}（首次请求或since已不在历史中）
+        """
+        version = await self.db.get_session_version(session_id)
+        if since == version:
+            return {'version': version, 'unchanged': True}
+
+        stats = await self._stats_at(session_id, version)
+        base = self._history.get(session_id, {}).get(since) if since else None
+        if base is None:
+            return {'version': version, 'full': True, 'stats': stats}
+
+        changes = diff_stats(base, stats)['changes']
+        return {
+            'version': version,
+            'base': since,
+            'set': {key: {option: new for option, (_, new) in changed.items()} for key, changed in changes.items()},
+            'scalars': {key: stats.get(key) for key in SCALAR_KEYS},
+        }
+
+    def invalidate(self, session_id: str):
+        """场次数据被清理后丢弃历史"""
+        self._history.pop(session_id, None)
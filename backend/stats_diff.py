@@ -0,0 +1,87 @@
+"""
+统计快照与差异计算
+用于增量AI分析：比较上次分析时的统计快照与当前统计，判断分布漂移程度
+"""
+from typing import Dict, Optional
+
+# get_session_statistics返回的分布字段
+DISTRIBUTION_KEYS = [
+    'industries', 'roles', 'digital_habits', 'ai_self_positions', 'ai_usages',
+    'org_stages', 'personal_roles', 'pain_points', 'attitudes', 'constraints'
+]
+
+
+def make_snapshot(stats: Dict, prompt_type: str = 'full') -> Dict:
+    """从统计数据中提取需要随分析结果一起保存的快照"""
+    snapshot = {key: dict(stats.get(key) or {}) for key in DISTRIBUTION_KEYS}
+    snapshot['total_responses'] = stats.get('total_responses', 0)
+    snapshot['avg_completion_time'] = stats.get('avg_completion_time')
+    snapshot['prompt_type'] = prompt_type
+    return snapshot
+
+
+def _share(dist: Dict[str, int]) -> Dict[str, float]:
+    total = sum(dist.values())
+    return {k: v / total for k, v in dist.items()} if total else {}
+
+
+def distribution_drift(old: Dict[str, int], new: Dict[str, int]) -> float:
+    """两个分布之间的总变差距离（0=完全相同，1=完全不同）"""
+    p, q = _share(old or {}), _share(new or {})
+    keys = set(p) | set(q)
+    return 0.5 * sum(abs(p.get(k, 0.0) - q.get(k, 0.0)) for k in keys)
+
+
+def diff_stats(snapshot: Dict, stats: Dict) -> Dict:
+    """
+    计算快照与当前统计的差异
+
+    Returns:
+        {
+            'new_responses': 5,
+            'new_ratio': 0.1,        # 新增样本占当前总数的比例
+            'max_drift': 0.04,       # 各题分布漂移的最大值
+            'changes': {'industries': {'bank': [10, 12]}, ...}  # 只包含有变化的计数
+        }
+    """
+    old_total = snapshot.get('total_responses', 0) or 0
+    new_total = stats.get('total_responses', 0) or 0
+
+    changes = {}
+    drifts = {}
+    for key in DISTRIBUTION_KEYS:
+        old_dist = snapshot.get(key) or {}
+        new_dist = stats.get(key) or {}
+        changed = {
+            k: [old_dist.get(k, 0), new_dist.get(k, 0)]
+            for k in set(old_dist) | set(new_dist)
+            if old_dist.get(k, 0) != new_dist.get(k, 0)
+        }
+        if changed:
+            changes[key] = changed
+        drifts[key] = distribution_drift(old_dist, new_dist)
+
+    return {
+        'old_total': old_total,
+        'new_total': new_total,
+        'new_responses': new_total - old_total,
+        'new_ratio': (new_total - old_total) / new_total if new_total else 0.0,
+        'max_drift': max(drifts.values()) if drifts else 0.0,
+        'drifts': drifts,
+        'changes': changes,
+    }
+
+
+def format_diff_for_prompt(diff: Dict, labels: Optional[Dict[str, Dict]] = None) -> str:
+    """把差异压缩为简短文本：每个变化的选项一行 "旧值→新值" """
+    lines = [
+        f"- 样本数: {diff['old_total']}→{diff['new_total']}（新增{diff['new_responses']}人）"
+    ]
+    for key, changed in diff['changes'].items():
+        key_labels = (labels or {}).get(key, {})
+        items = []
+        for option, (old, new) in sorted(changed.items(), key=lambda x: abs(x[1][1] - x[1][0]), reverse=True):
+            label = key_labels.get(int(option) if str(option).isdigit() else option, option)
+            items.append(f"{label} {old}→{new}")
+        lines.append(f"- {key}: " + "；".join(items))
+    return "\n".join(lines)
@@ -0,0 +1,88 @@
+"""
+提交合并队列
+课堂上几十人同时点提交时，把同一时间窗口内的提交合并为一次批量写入，
+队列过长时直接拒绝（503 + Retry-After），由客户端的离线队列退避重试
+"""
+import asyncio
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class QueueFullError(Exception):
+    """待写入的提交过多"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("服务器繁忙，请稍后重试")
+        self.retry_after = retry_after
+
+
+class SubmitQueue:
+    """把并发的单条提交合并为批量写入"""
+
+    def __init__(self, database):
+        self.db = database
+        self.max_batch = int(os.getenv('SUBMIT_BATCH_SIZE', '50'))
+        self.max_wait = float(os.getenv('SUBMIT_BATCH_WAIT_MS', '20')) / 1000
+        self.max_pending = int(os.getenv('SUBMIT_QUEUE_LIMIT', '500'))
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._queue = self._queue or asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, rows: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        提交若干行（每行带client_submission_id），等待所在批次写入完成
+
+        Returns:
+            client_submission_id -> {'status', 'id', 'error'}
+
+        Raises:
+            QueueFullError: 队列已满
+        """
+        self._ensure_worker()
+        if self._queue.qsize() + len(rows) > self.max_pending:
+            raise QueueFullError(retry_after=max(1, int(self._queue.qsize() / self.max_batch * self.max_wait) + 1))
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        for row in rows:
+            future = loop.create_future()
+            self._queue.put_nowait((row, future))
+            futures.append(future)
+        outcomes = await asyncio.gather(*futures)
+        return {row['client_submission_id']: outcome for row, outcome in zip(rows, outcomes)}
+
+    async def _run(self):
+        while True:
+            batch: List[Tuple[Dict[str, Any], asyncio.Future]] = [await self._queue.get()]
+            # 等待一个很短的窗口，收集同时到达的提交
+            deadline = asyncio.get_running_loop().time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._write(batch)
+
+    async def _write(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        # 同一批内重复的client_submission_id只写一次
+        rows = list({row['client_submission_id']: row for row, _ in batch}.values())
+        try:
+            results = await asyncio.to_thread(self.db.submit_idempotent, rows)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(Exception(str(e)))
+            return
+        for row, future in batch:
+            if not future.done():
+                future.set_result(results.get(
+                    row['client_submission_id'],
+                    {'status': 'rejected', 'error': '写入结果未知，请重试'}
+                ))
@@ -0,0 +1,123 @@
+"""
+t-digest 流式分位数估计
+可合并（不同场次/进程的摘要可直接合并）、可序列化为JSON，
+centroid数量受compression限制，分位数查询与样本量无关
+"""
+import math
+from typing import Dict, Iterable, List, Optional
+
+
+class TDigest:
+    """合并式t-digest（k1尺度函数）"""
+
+    def __init__(self, compression: float = 100, centroids: Optional[List[List[float]]] = None):
+        self.compression = compression
+        self._centroids: List[List[float]] = [list(c) for c in centroids or []]  # [[均值, 权重], ...] 按均值有序
+        self._buffer: List[List[float]] = []
+        self._buffer_limit = int(compression * 5)
+        self.count = sum(c[1] for c in self._centroids)
+        self.min: Optional[float] = self._centroids[0][0] if self._centroids else None
+        self.max: Optional[float] = self._centroids[-1][0] if self._centroids else None
+
+    def add(self, value: float, weight: float = 1):
+        """加入一个样本"""
+        value = float(value)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.count += weight
+        self._buffer.append([value, float(weight)])
+        if len(self._buffer) >= self._buffer_limit:
+            self._compress()
+
+    def update(self, values: Iterable[float]):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: 'TDigest') -> 'TDigest':
+        """把另一个摘要合并进来（返回self）"""
+        other._compress()
+        if other.count == 0:
+            return self
+        self._compress()
+        self._compress(extra=other._centroids)
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def _k_limit(self, q: float) -> float:
+        # k1尺度函数的反函数：分位数q处允许的centroid累积上限
+        k = self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+        return (math.sin(min(k + 1, self.compression / 4) * 2 * math.pi / self.compression) + 1) / 2
+
+    def _compress(self, extra: Optional[List[List[float]]] = None):
+        if not self._buffer and not extra:
+            return
+        points = self._centroids + self._buffer + [list(c) for c in extra or []]
+        self._buffer = []
+        points.sort(key=lambda c: c[0])
+        total = sum(c[1] for c in points)
+
+        merged = [list(points[0])]
+        so_far = 0.0
+        limit = total * self._k_limit(0.0)
+        for mean, weight in points[1:]:
+            current = merged[-1]
+            if so_far + current[1] + weight <= limit:
+                # 合并到当前centroid（加权平均）
+                current[1] += weight
+                current[0] += (mean - current[0]) * weight / current[1]
+            else:
+                so_far += current[1]
+                limit = total * self._k_limit(so_far / total)
+                merged.append([mean, weight])
+        self._centroids = merged
+
+    def quantile(self, q: float) -> Optional[float]:
+        """估计分位数（0<=q<=1），无数据时返回None"""
+        self._compress()
+        if not self._centroids:
+            return None
+        if len(self._centroids) == 1 or q <= 0:
+            return self.min if q <= 0 else self._centroids[0][0]
+        if q >= 1:
+            return self.max
+
+        target = q * self.count
+        cumulative = 0.0
+        for i, (mean, weight) in enumerate(self._centroids):
+            center = cumulative + weight / 2
+            if target < center:
+                if i == 0:
+                    # 最小值与第一个centroid中心之间线性插值
+                    return self.min + (mean - self.min) * target / center
+                prev_mean, prev_weight = self._centroids[i - 1]
+                prev_center = cumulative - prev_weight / 2
+                return prev_mean + (mean - prev_mean) * (target - prev_center) / (center - prev_center)
+            cumulative += weight
+        last_mean, last_weight = self._centroids[-1]
+        last_center = self.count - last_weight / 2
+        if self.count == last_center:
+            return self.max
+        return last_mean + (self.max - last_mean) * (target - last_center) / (self.count - last_center)
+
+    def to_dict(self) -> Dict:
+        """序列化（用于存入JSONB）"""
+        self._compress()
+        return {
+            'compression': self.compression,
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'centroids': [[round(m, 4), w] for m, w in self._centroids],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict]) -> 'TDigest':
+        if not data:
+            return cls()
+        digest = cls(data.get('compression', 100), data.get('centroids'))
+        digest.count = data.get('count', digest.count)
+        digest.min = data.get('min', digest.min)
+        digest.max = data.get('max', digest.max)
+        return digest
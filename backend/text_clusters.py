@@ -0,0 +1,140 @@
+"""
+自由填写文本归一化聚类
+字符n-gram TF-IDF + 增量最近质心分配，不依赖外部模型和网络。
+
+每条文本只与共享n-gram的质心比较（倒排索引），加入一条的开销与已有簇数基本无关；
+可序列化为JSON，用于按场次持久化、增量更新。
+"""
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set
+
+# 去掉空白、标点和常见的无意义后缀，用于比较（展示时仍使用原文）
+_STRIP = re.compile(r'[\s\W_]+', re.UNICODE)
+_SUFFIXES = ('有限公司', '公司', '部门', '单位', '机构')
+
+NGRAM_SIZES = (1, 2, 3)
+
+
+def normalize_text(text: str) -> str:
+    """全角转半角、小写、去标点空白和常见后缀"""
+    text = _STRIP.sub('', unicodedata.normalize('NFKC', text or '').lower())
+    for suffix in _SUFFIXES:
+        if len(text) > len(suffix) + 1 and text.endswith(suffix):
+            return text[:-len(suffix)]
+    return text
+
+
+def char_ngrams(text: str) -> Counter:
+    """字符n-gram计数（首尾加边界符，短文本也能区分前缀/后缀）"""
+    padded = f"^{text}$"
+    grams: Counter = Counter()
+    for n in NGRAM_SIZES:
+        source = text if n == 1 else padded
+        grams.update(source[i:i + n] for i in range(len(source) - n + 1))
+    return grams
+
+
+class TextClusterer:
+    """增量最近质心聚类"""
+
+    def __init__(self, threshold: float = 0.5, max_features: int = 64, max_variants: int = 10,
+                 documents: int = 0, df: Optional[Dict[str, int]] = None,
+                 clusters: Optional[List[Dict[str, Any]]] = None):
+        self.threshold = threshold          # 余弦相似度低于此值时新建簇
+        self.max_features = max_features    # 每个质心保留的n-gram数
+        self.max_variants = max_variants    # 每个簇保留的原文写法数
+        self.documents = documents
+        self.df: Counter = Counter(df or {})
+        # 簇: {'label': 规范名称, 'count': 条数, 'grams': n-gram -> 累计词频, 'variants': 原文 -> 次数}
+        self.clusters: List[Dict[str, Any]] = [
+            {'label': c['label'], 'count': c['count'], 'grams': dict(c['grams']), 'variants': dict(c['variants'])}
+            for c in clusters or []
+        ]
+        self._postings: Dict[str, Set[int]] = {}
+        for index, cluster in enumerate(self.clusters):
+            self._index(index, cluster['grams'])
+
+    def _index(self, index: int, grams):
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(index)
+
+    def _idf(self, gram: str) -> float:
+        return math.log((1 + self.documents) / (1 + self.df.get(gram, 0))) + 1
+
+    def _vector(self, grams: Dict[str, float], scale: float = 1.0) -> Dict[str, float]:
+        """TF-IDF向量（L2归一化）"""
+        vector = {g: tf / scale * self._idf(g) for g, tf in grams.items()}
+        norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+        return {g: v / norm for g, v in vector.items()}
+
+    def nearest(self, text: str) -> Optional[tuple]:
+        """(簇序号, 相似度)，没有共享n-gram的簇时返回None（不修改状态）"""
+        key = normalize_text(text)
+        if not key:
+            return None
+        vector = self._vector(char_ngrams(key))
+        candidates = set()
+        for gram in vector:
+            candidates |= self._postings.get(gram, set())
+        best = None
+        for index in candidates:
+            cluster = self.clusters[index]
+            centroid = self._vector(cluster['grams'], cluster['count'])
+            similarity = sum(w * centroid.get(g, 0.0) for g, w in vector.items())
+            if best is None or similarity > best[1]:
+                best = (index, similarity)
+        return best
+
+    def add(self, text: str) -> Optional[int]:
+        """加入一条文本，返回所属簇序号（空文本返回None）"""
+        key = normalize_text(text)
+        if not key:
+            return None
+        grams = char_ngrams(key)
+        self.documents += 1
+        self.df.update(grams.keys())
+
+        best = self.nearest(text)
+        display = text.strip()[:40]
+        if best is None or best[1] < self.threshold:
+            index = len(self.clusters)
+            self.clusters.append({'label': display, 'count': 0, 'grams': {}, 'variants': {}})
+        else:
+            index = best[0]
+
+        cluster = self.clusters[index]
+        cluster['count'] += 1
+        merged = Counter(cluster['grams'])
+        merged.update(grams)
+        cluster['grams'] = dict(merged.most_common(self.max_features))
+        self._index(index, cluster['grams'])
+
+        variants = cluster['variants']
+        variants[display] = variants.get(display, 0) + 1
+        if len(variants) > self.max_variants:
+            del variants[min(variants, key=variants.get)]
+        # 规范名称取最常见的写法，次数相同时取较短的
+        cluster['label'] = min(variants, key=lambda v: (-variants[v], len(v)))
+        return index
+
+    def summary(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """按条数从多到少：[{'label', 'count', 'variants': [其他写法]}]"""
+        ordered = sorted(self.clusters, key=lambda c: c['count'], reverse=True)
+        return [
+            {
+                'label': c['label'],
+                'count': c['count'],
+                'variants': [v for v, _ in sorted(c['variants'].items(), key=lambda x: -x[1]) if v != c['label']],
+            }
+            for c in ordered[:limit]
+        ]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'documents': self.documents, 'df': dict(self.df), 'clusters': self.clusters}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], **options) -> 'TextClusterer':
+        return cls(documents=data.get('documents', 0), df=data.get('df'), clusters=data.get('clusters'), **options)
@@ -10,10 +10,13 @@
 
 -- ----------------------------------------------------------------
 -- 1. 问卷响应表
+-- 按session_id做LIST分区：每个场次一个分区（sessions表插入时由触发器创建，见3.4），
+-- 按场次的统计/导出查询只扫描该场次的分区，清理场次是常数时间的TRUNCATE。
+-- 已有的非分区responses表请执行 migrations/001_partition_responses.sql 迁移。
 -- ----------------------------------------------------------------
 CREATE TABLE IF NOT EXISTS responses (
   -- 主键与元数据
-  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  id UUID NOT NULL DEFAULT gen_random_uuid(),
   session_id VARCHAR(50) NOT NULL DEFAULT 'SJTU_SAIF_20251114',
   created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
   
@@ -55,16 +58,45 @@ CREATE TABLE IF NOT EXISTS responses (
   ip_hash VARCHAR(64),
   device_type VARCHAR(20) DEFAULT 'unknown',
   
-  -- 约束
-  CONSTRAINT unique_ip_session UNIQUE(ip_hash, session_id)
-);
+  -- 客户端生成的提交ID（离线队列重试时保证幂等）
+  client_submission_id UUID,
+  
+  -- 约束（分区表的主键和唯一约束必须包含分区键session_id）
+  CONSTRAINT responses_pkey PRIMARY KEY (id, session_id),
+  CONSTRAINT unique_ip_session UNIQUE(ip_hash, session_id),
+  CONSTRAINT unique_client_submission UNIQUE(session_id, client_submission_id)
+) PARTITION BY LIST (session_id);
+
+-- 尚未在sessions表登记的场次落在默认分区，登记时移入该场次自己的分区
+CREATE TABLE IF NOT EXISTS responses_default PARTITION OF responses DEFAULT;
+
+-- 已有数据库升级
+ALTER TABLE responses ADD COLUMN IF NOT EXISTS client_submission_id UUID;
+DO $$
+BEGIN
+  -- 提交ID唯一约束改为 (session_id, client_submission_id)，与分区表一致（后端按此做ON CONFLICT）
+  IF NOT EXISTS (
+    SELECT 1 FROM pg_constraint
+    WHERE conname = 'unique_client_submission' AND conrelid = 'responses'::regclass AND array_length(conkey, 1) = 2
+  ) THEN
+    ALTER TABLE responses DROP CONSTRAINT IF EXISTS unique_client_submission;
+    ALTER TABLE responses ADD CONSTRAINT unique_client_submission UNIQUE (session_id, client_submission_id);
+  END IF;
+END $$;
 
--- 创建索引
-CREATE INDEX IF NOT EXISTS idx_responses_session ON responses(session_id);
+-- 创建索引（热点查询的执行计划由 backend/check_query_plans.py 检查）
 CREATE INDEX IF NOT EXISTS idx_responses_created ON responses(created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_responses_industry ON responses(q1_industry);
 CREATE INDEX IF NOT EXISTS idx_responses_role ON responses(q2_role);
 CREATE INDEX IF NOT EXISTS idx_responses_ip_hash ON responses(ip_hash);
+-- 最新提交、场次版本和分页查询（按场次的 created_at DESC, id DESC 键集分页）
+CREATE INDEX IF NOT EXISTS idx_responses_session_created ON responses(session_id, created_at DESC, id DESC);
+-- 统计分布（get_session_statistics按场次GROUP BY各题）不另建索引：每个场次独占一个分区，
+-- 按session_id裁剪后顺序扫描该分区读到的正好是本场次的行；(session_id) INCLUDE (...) 覆盖索引的
+-- 前导列在分区内是常量，相当于整个分区再存一份，只增加每次提交的写入开销
+DROP INDEX IF EXISTS idx_responses_session_stats;
+-- 前导列与idx_responses_session_created相同（默认分区中未登记场次的按场次查询走后者）
+DROP INDEX IF EXISTS idx_responses_session;
 
 -- 添加注释
 COMMENT ON TABLE responses IS '问卷响应表';
@@ -78,6 +110,7 @@ COMMENT ON COLUMN responses.q7_personal_role IS 'Q7: 个人项目角色（1-4）
 COMMENT ON COLUMN responses.q8_pain_points IS 'Q8: 痛点场景（多选，文本数组）';
 COMMENT ON COLUMN responses.q9_attitude IS 'Q9: 对AI的态度（1-5）';
 COMMENT ON COLUMN responses.q10_constraints IS 'Q10: 推进约束（多选，可选，文本数组）';
+COMMENT ON COLUMN responses.client_submission_id IS '客户端生成的提交UUID，重试时用于去重';
 
 -- ----------------------------------------------------------------
 -- 2. AI分析结果表
@@ -88,15 +121,20 @@ CREATE TABLE IF NOT EXISTS analysis_results (
   analysis_text TEXT NOT NULL,
   model_name VARCHAR(100) NOT NULL,
   total_responses INTEGER NOT NULL,
+  stats_snapshot JSONB,
   created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
   updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
 );
 
+-- 已有数据库升级：增量分析需要保存分析时的统计快照
+ALTER TABLE analysis_results ADD COLUMN IF NOT EXISTS stats_snapshot JSONB;
+
 CREATE INDEX IF NOT EXISTS idx_analysis_session ON analysis_results(session_id);
 
 COMMENT ON TABLE analysis_results IS 'AI分析结果表';
 COMMENT ON COLUMN analysis_results.analysis_text IS 'AI分析文本（Markdown格式）';
 COMMENT ON COLUMN analysis_results.model_name IS '使用的AI模型名称';
+COMMENT ON COLUMN analysis_results.stats_snapshot IS '分析时的统计快照（用于增量分析）';
 
 -- ----------------------------------------------------------------
 -- 3. 会话管理表
@@ -118,6 +156,142 @@ INSERT INTO sessions (session_id, name, description, start_time, is_active)
 VALUES ('SJTU_SAIF_20251114', '上海交大高金MBA课程', 'AI应用需求调研', NOW(), true)
 ON CONFLICT (session_id) DO NOTHING;
 
+-- ----------------------------------------------------------------
+-- 3.1 完成时间分位数摘要表
+-- ----------------------------------------------------------------
+CREATE TABLE IF NOT EXISTS session_sketches (
+  session_id VARCHAR(50) PRIMARY KEY,
+  sketches JSONB NOT NULL DEFAULT '{}'::jsonb,
+  response_count INTEGER NOT NULL DEFAULT 0,
+  watermark TEXT,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+COMMENT ON TABLE session_sketches IS '完成时间t-digest摘要（按设备类型），按水位线增量更新';
+COMMENT ON COLUMN session_sketches.sketches IS '设备类型 -> 序列化的t-digest';
+COMMENT ON COLUMN session_sketches.watermark IS '已折叠的最后一行 (created_at, id) 分页游标';
+COMMENT ON COLUMN session_sketches.response_count IS '已折叠的回答数（含未记录完成时间的回答）';
+
+-- ----------------------------------------------------------------
+-- 3.2 场次归档快照表
+-- ----------------------------------------------------------------
+CREATE TABLE IF NOT EXISTS session_snapshots (
+  session_id VARCHAR(50) PRIMARY KEY,
+  etag VARCHAR(64) NOT NULL,
+  response_count INTEGER NOT NULL DEFAULT 0,
+  stats JSONB NOT NULL,
+  analysis JSONB,
+  export_csv_gz TEXT NOT NULL,
+  finalized_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+COMMENT ON TABLE session_snapshots IS '已关闭场次的不可变快照（统计、导出文件、AI分析各计算一次）';
+COMMENT ON COLUMN session_snapshots.etag IS '快照内容哈希，后端按此校验本地缓存';
+COMMENT ON COLUMN session_snapshots.export_csv_gz IS '导出CSV（gzip压缩后base64编码）';
+
+-- 场次是否仍接收提交（已关闭或已归档的场次拒绝匿名插入）
+CREATE OR REPLACE FUNCTION session_accepts_responses(p_session_id VARCHAR)
+RETURNS BOOLEAN AS $$
+  SELECT NOT EXISTS (SELECT 1 FROM session_snapshots WHERE session_id = p_session_id)
+     AND NOT EXISTS (SELECT 1 FROM sessions WHERE session_id = p_session_id AND is_active = false);
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
+
+COMMENT ON FUNCTION session_accepts_responses IS '场次未关闭时返回true（用于匿名插入的RLS检查）';
+
+-- ----------------------------------------------------------------
+-- 3.3 "其他"自由填写答案聚类索引表
+-- ----------------------------------------------------------------
+CREATE TABLE IF NOT EXISTS session_free_text (
+  session_id VARCHAR(50) PRIMARY KEY,
+  clusters JSONB NOT NULL DEFAULT '{}'::jsonb,
+  response_count INTEGER NOT NULL DEFAULT 0,
+  watermark TEXT,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+COMMENT ON TABLE session_free_text IS 'q1_industry_other / q2_role_other 的归一化聚类（字符n-gram TF-IDF），按水位线增量更新';
+COMMENT ON COLUMN session_free_text.clusters IS '自由填写列 -> 序列化的聚类（文档频率 + 各簇质心、人数、原文写法）';
+COMMENT ON COLUMN session_free_text.watermark IS '已折叠的最后一行 (created_at, id) 分页游标';
+
+-- ----------------------------------------------------------------
+-- 3.4 responses按场次分区
+-- ----------------------------------------------------------------
+
+-- 场次的分区表名（场次ID可能含任意字符，取规整后的前缀 + md5，避免冲突和超长）
+CREATE OR REPLACE FUNCTION response_partition_name(p_session_id VARCHAR)
+RETURNS TEXT AS $$
+  SELECT 'responses_'
+    || left(regexp_replace(lower(p_session_id), '[^a-z0-9]+', '_', 'g'), 30)
+    || '_' || left(md5(p_session_id), 8);
+$$ LANGUAGE sql IMMUTABLE;
+
+-- 创建场次分区（已存在时直接返回），默认分区中该场次已有的回答一并移入
+CREATE OR REPLACE FUNCTION ensure_response_partition(p_session_id VARCHAR)
+RETURNS TEXT AS $$
+DECLARE
+  part_name TEXT := response_partition_name(p_session_id);
+BEGIN
+  IF to_regclass(format('public.%I', part_name)) IS NOT NULL THEN
+    RETURN part_name;
+  END IF;
+  
+  -- 阻止默认分区的并发写入，否则挂载分区时默认分区的校验会失败；同时串行化并发的建分区调用
+  LOCK TABLE responses_default IN EXCLUSIVE MODE;
+  IF to_regclass(format('public.%I', part_name)) IS NOT NULL THEN
+    RETURN part_name;
+  END IF;
+  
+  EXECUTE format('CREATE TABLE %I (LIKE responses INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', part_name);
+  EXECUTE format(
+    'WITH moved AS (DELETE FROM responses_default WHERE session_id = $1 RETURNING *) INSERT INTO %I SELECT * FROM moved',
+    part_name
+  ) USING p_session_id;
+  EXECUTE format('ALTER TABLE responses ATTACH PARTITION %I FOR VALUES IN (%L)', part_name, p_session_id);
+  -- 分区也可以按表名直接访问，单独开启RLS（无策略即拒绝匿名访问）
+  EXECUTE format('ALTER TABLE %I ENABLE ROW LEVEL SECURITY', part_name);
+  
+  RETURN part_name;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+COMMENT ON FUNCTION ensure_response_partition IS '创建场次的responses分区并移入默认分区中的回答，返回分区表名';
+
+-- sessions表新增场次时自动创建分区
+CREATE OR REPLACE FUNCTION create_session_partition()
+RETURNS TRIGGER AS $$
+BEGIN
+  PERFORM ensure_response_partition(NEW.session_id);
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_sessions_create_partition ON sessions;
+CREATE TRIGGER trg_sessions_create_partition
+  AFTER INSERT ON sessions
+  FOR EACH ROW EXECUTE FUNCTION create_session_partition();
+
+-- 触发器创建前已登记的场次（含默认会话）
+SELECT ensure_response_partition(session_id) FROM sessions;
+
+-- 清空场次分区（常数时间，只锁该分区；分区保留，场次重新开放后继续接收提交）
+CREATE OR REPLACE FUNCTION truncate_session_partition(p_session_id VARCHAR)
+RETURNS BOOLEAN AS $$
+DECLARE
+  part_name TEXT := response_partition_name(p_session_id);
+BEGIN
+  IF to_regclass(format('public.%I', part_name)) IS NULL THEN
+    RETURN false;
+  END IF;
+  
+  -- 分区正被长查询（如导出）读取时不无限等待，由后端改为分批删除
+  PERFORM set_config('lock_timeout', '3s', true);
+  EXECUTE format('TRUNCATE TABLE %I', part_name);
+  RETURN true;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+COMMENT ON FUNCTION truncate_session_partition IS '清空场次的responses分区，场次没有独立分区时返回false';
+
 -- ----------------------------------------------------------------
 -- 4. 实时统计视图
 -- ----------------------------------------------------------------
@@ -280,18 +454,56 @@ COMMENT ON FUNCTION get_session_statistics IS '获取指定会话的统计数据
 -- 6. 清理函数
 -- ----------------------------------------------------------------
 
-CREATE OR REPLACE FUNCTION cleanup_session(p_session_id VARCHAR)
+-- 分批删除回答（每次只锁定少量行，由后端循环调用直到返回0）
+CREATE OR REPLACE FUNCTION cleanup_session_batch(p_session_id VARCHAR, p_batch_size INTEGER DEFAULT 2000)
 RETURNS INTEGER AS $$
 DECLARE
   deleted_count INTEGER;
+BEGIN
+  DELETE FROM responses
+  WHERE session_id = p_session_id
+    AND id IN (
+      SELECT id FROM responses
+      WHERE session_id = p_session_id
+      LIMIT p_batch_size
+      FOR UPDATE SKIP LOCKED
+    );
+  GET DIAGNOSTICS deleted_count = ROW_COUNT;
+  
+  RETURN deleted_count;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION cleanup_session_batch IS '删除指定会话的一批回答，返回删除行数';
+
+-- 回答删除完成后清理分析结果、摘要和归档，场次重新开放提交
+CREATE OR REPLACE FUNCTION cleanup_session_metadata(p_session_id VARCHAR)
+RETURNS VOID AS $$
 BEGIN
   DELETE FROM analysis_results WHERE session_id = p_session_id;
+  DELETE FROM session_sketches WHERE session_id = p_session_id;
+  DELETE FROM session_snapshots WHERE session_id = p_session_id;
+  DELETE FROM session_free_text WHERE session_id = p_session_id;
+  UPDATE sessions SET is_active = true, end_time = NULL WHERE session_id = p_session_id;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION cleanup_session_metadata IS '清理指定会话的分析结果、摘要和归档快照';
+
+-- 一次性清理（手动维护用；大场次请使用 /api/cleanup 分批清理）
+CREATE OR REPLACE FUNCTION cleanup_session(p_session_id VARCHAR)
+RETURNS INTEGER AS $$
+DECLARE
+  deleted_count INTEGER;
+BEGIN
+  SELECT COUNT(*) INTO deleted_count FROM responses WHERE session_id = p_session_id;
+  -- 没有独立分区的场次（回答在默认分区中）逐行删除
+  IF NOT truncate_session_partition(p_session_id) THEN
+    DELETE FROM responses WHERE session_id = p_session_id;
+    GET DIAGNOSTICS deleted_count = ROW_COUNT;
+  END IF;
   
-  WITH deleted AS (
-    DELETE FROM responses WHERE session_id = p_session_id
-    RETURNING *
-  )
-  SELECT COUNT(*) INTO deleted_count FROM deleted;
+  PERFORM cleanup_session_metadata(p_session_id);
   
   RETURN deleted_count;
 END;
@@ -304,13 +516,17 @@ COMMENT ON FUNCTION cleanup_session IS '清理指定会话的所有数据';
 -- ----------------------------------------------------------------
 
 ALTER TABLE responses ENABLE ROW LEVEL SECURITY;
+ALTER TABLE responses_default ENABLE ROW LEVEL SECURITY;
 ALTER TABLE analysis_results ENABLE ROW LEVEL SECURITY;
 ALTER TABLE sessions ENABLE ROW LEVEL SECURITY;
+ALTER TABLE session_sketches ENABLE ROW LEVEL SECURITY;
+ALTER TABLE session_snapshots ENABLE ROW LEVEL SECURITY;
+ALTER TABLE session_free_text ENABLE ROW LEVEL SECURITY;
 
--- 允许匿名用户插入responses
+-- 允许匿名用户插入responses（场次关闭后拒绝）
 CREATE POLICY "Allow anonymous insert" ON responses
   FOR INSERT TO anon
-  WITH CHECK (true);
+  WITH CHECK (session_accepts_responses(session_id));
 
 -- 允许service_role访问所有数据
 CREATE POLICY "Allow service role all" ON responses
@@ -332,6 +548,8 @@ CREATE POLICY "Allow service role all sessions" ON sessions
 -- 8. 启用Realtime
 -- ----------------------------------------------------------------
 
+-- responses是分区表，按父表名发布各分区的变更（前端订阅的是responses）
+ALTER PUBLICATION supabase_realtime SET (publish_via_partition_root = true);
 ALTER PUBLICATION supabase_realtime ADD TABLE responses;
 ALTER PUBLICATION supabase_realtime ADD TABLE analysis_results;
 
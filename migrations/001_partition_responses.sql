@@ -0,0 +1,269 @@
+-- ================================================================
+-- 迁移：responses表改为按session_id的LIST分区表
+--
+-- 适用于用旧版database_schema.sql创建、已有数据的数据库（新库直接执行database_schema.sql即可）。
+-- 整个迁移在一个事务中完成，期间responses表被锁定、提交会排队等待，请在没有课堂进行时执行。
+-- 在Supabase SQL Editor中执行本文件，或: psql "$DATABASE_URL" -f migrations/001_partition_responses.sql
+--
+-- 步骤：
+--   1. 旧表改名为responses_heap（索引、约束一并改名，避免与新表重名）
+--   2. 按新结构创建分区表、默认分区、建分区函数与sessions触发器
+--   3. 为所有已有场次创建分区（未在sessions表登记的场次一并登记）
+--   4. 复制数据，重建视图、RLS策略与Realtime发布
+--   5. 核对行数；确认无误后手动删除responses_heap
+-- ================================================================
+
+BEGIN;
+
+LOCK TABLE responses IN ACCESS EXCLUSIVE MODE;
+
+-- ----------------------------------------------------------------
+-- 1. 旧表改名
+-- ----------------------------------------------------------------
+ALTER TABLE responses RENAME TO responses_heap;
+
+DO $$
+DECLARE
+  rec RECORD;
+BEGIN
+  -- 约束对应的索引随约束改名
+  FOR rec IN
+    SELECT conname FROM pg_constraint
+    WHERE conrelid = 'responses_heap'::regclass AND contype IN ('p', 'u')
+  LOOP
+    EXECUTE format('ALTER TABLE responses_heap RENAME CONSTRAINT %I TO %I', rec.conname, 'heap_' || rec.conname);
+  END LOOP;
+
+  FOR rec IN
+    SELECT c.relname AS index_name FROM pg_index i
+    JOIN pg_class c ON c.oid = i.indexrelid
+    WHERE i.indrelid = 'responses_heap'::regclass
+      AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conindid = i.indexrelid)
+  LOOP
+    EXECUTE format('ALTER INDEX %I RENAME TO %I', rec.index_name, 'heap_' || rec.index_name);
+  END LOOP;
+END $$;
+
+ALTER PUBLICATION supabase_realtime DROP TABLE responses_heap;
+
+-- ----------------------------------------------------------------
+-- 2. 分区表（结构与database_schema.sql第1节一致）
+-- ----------------------------------------------------------------
+CREATE TABLE responses (
+  id UUID NOT NULL DEFAULT gen_random_uuid(),
+  session_id VARCHAR(50) NOT NULL DEFAULT 'SJTU_SAIF_20251114',
+  created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  q1_industry VARCHAR(100) NOT NULL,
+  q1_industry_other VARCHAR(200),
+  q2_role VARCHAR(100) NOT NULL,
+  q2_role_other VARCHAR(200),
+  q3_digital_habit INTEGER NOT NULL CHECK (q3_digital_habit BETWEEN 1 AND 4),
+  q4_ai_self_position INTEGER NOT NULL CHECK (q4_ai_self_position BETWEEN 1 AND 4),
+  q5_ai_usage INTEGER NOT NULL CHECK (q5_ai_usage BETWEEN 1 AND 5),
+  q6_org_stage INTEGER NOT NULL CHECK (q6_org_stage BETWEEN 1 AND 5),
+  q7_personal_role INTEGER NOT NULL CHECK (q7_personal_role BETWEEN 1 AND 4),
+  q8_pain_points TEXT[] NOT NULL,
+  q9_attitude INTEGER NOT NULL CHECK (q9_attitude BETWEEN 1 AND 5),
+  q10_constraints TEXT[],
+  completion_time_seconds INTEGER,
+  user_agent TEXT,
+  ip_hash VARCHAR(64),
+  device_type VARCHAR(20) DEFAULT 'unknown',
+  client_submission_id UUID,
+  CONSTRAINT responses_pkey PRIMARY KEY (id, session_id),
+  CONSTRAINT unique_ip_session UNIQUE(ip_hash, session_id),
+  CONSTRAINT unique_client_submission UNIQUE(session_id, client_submission_id)
+) PARTITION BY LIST (session_id);
+
+CREATE TABLE responses_default PARTITION OF responses DEFAULT;
+
+CREATE INDEX idx_responses_session ON responses(session_id);
+CREATE INDEX idx_responses_created ON responses(created_at DESC);
+CREATE INDEX idx_responses_industry ON responses(q1_industry);
+CREATE INDEX idx_responses_role ON responses(q2_role);
+CREATE INDEX idx_responses_ip_hash ON responses(ip_hash);
+CREATE INDEX idx_responses_session_created ON responses(session_id, created_at DESC, id DESC);
+
+COMMENT ON TABLE responses IS '问卷响应表（按session_id分区）';
+
+CREATE OR REPLACE FUNCTION response_partition_name(p_session_id VARCHAR)
+RETURNS TEXT AS $$
+  SELECT 'responses_'
+    || left(regexp_replace(lower(p_session_id), '[^a-z0-9]+', '_', 'g'), 30)
+    || '_' || left(md5(p_session_id), 8);
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION ensure_response_partition(p_session_id VARCHAR)
+RETURNS TEXT AS $$
+DECLARE
+  part_name TEXT := response_partition_name(p_session_id);
+BEGIN
+  IF to_regclass(format('public.%I', part_name)) IS NOT NULL THEN
+    RETURN part_name;
+  END IF;
+
+  LOCK TABLE responses_default IN EXCLUSIVE MODE;
+  IF to_regclass(format('public.%I', part_name)) IS NOT NULL THEN
+    RETURN part_name;
+  END IF;
+
+  EXECUTE format('CREATE TABLE %I (LIKE responses INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', part_name);
+  EXECUTE format(
+    'WITH moved AS (DELETE FROM responses_default WHERE session_id = $1 RETURNING *) INSERT INTO %I SELECT * FROM moved',
+    part_name
+  ) USING p_session_id;
+  EXECUTE format('ALTER TABLE responses ATTACH PARTITION %I FOR VALUES IN (%L)', part_name, p_session_id);
+  EXECUTE format('ALTER TABLE %I ENABLE ROW LEVEL SECURITY', part_name);
+
+  RETURN part_name;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION create_session_partition()
+RETURNS TRIGGER AS $$
+BEGIN
+  PERFORM ensure_response_partition(NEW.session_id);
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_sessions_create_partition ON sessions;
+CREATE TRIGGER trg_sessions_create_partition
+  AFTER INSERT ON sessions
+  FOR EACH ROW EXECUTE FUNCTION create_session_partition();
+
+CREATE OR REPLACE FUNCTION truncate_session_partition(p_session_id VARCHAR)
+RETURNS BOOLEAN AS $$
+DECLARE
+  part_name TEXT := response_partition_name(p_session_id);
+BEGIN
+  IF to_regclass(format('public.%I', part_name)) IS NULL THEN
+    RETURN false;
+  END IF;
+
+  PERFORM set_config('lock_timeout', '3s', true);
+  EXECUTE format('TRUNCATE TABLE %I', part_name);
+  RETURN true;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- ----------------------------------------------------------------
+-- 3. 为已有场次创建分区
+-- ----------------------------------------------------------------
+-- 只出现在回答中的场次先登记到sessions表（触发器随之创建分区）
+INSERT INTO sessions (session_id)
+SELECT DISTINCT session_id FROM responses_heap
+ON CONFLICT (session_id) DO NOTHING;
+
+SELECT ensure_response_partition(session_id) FROM sessions;
+
+-- ----------------------------------------------------------------
+-- 4. 复制数据（按分区键路由到各场次分区）
+-- ----------------------------------------------------------------
+INSERT INTO responses (
+  id, session_id, created_at,
+  q1_industry, q1_industry_other, q2_role, q2_role_other,
+  q3_digital_habit, q4_ai_self_position, q5_ai_usage, q6_org_stage, q7_personal_role,
+  q8_pain_points, q9_attitude, q10_constraints,
+  completion_time_seconds, user_agent, ip_hash, device_type, client_submission_id
+)
+SELECT
+  id, session_id, created_at,
+  q1_industry, q1_industry_other, q2_role, q2_role_other,
+  q3_digital_habit, q4_ai_self_position, q5_ai_usage, q6_org_stage, q7_personal_role,
+  q8_pain_points, q9_attitude, q10_constraints,
+  completion_time_seconds, user_agent, ip_hash, device_type, client_submission_id
+FROM responses_heap;
+
+-- 视图按OID引用表，改名后仍指向旧表，需要重建
+CREATE OR REPLACE VIEW session_stats AS
+SELECT
+  session_id,
+  COUNT(*) as total_responses,
+  AVG(completion_time_seconds) as avg_completion_time,
+  COUNT(CASE WHEN device_type = 'mobile' THEN 1 END) as mobile_count,
+  COUNT(CASE WHEN device_type = 'desktop' THEN 1 END) as desktop_count,
+  MIN(created_at) as first_response_time,
+  MAX(created_at) as last_response_time
+FROM responses
+GROUP BY session_id;
+
+-- 分批删除按分区键裁剪
+CREATE OR REPLACE FUNCTION cleanup_session_batch(p_session_id VARCHAR, p_batch_size INTEGER DEFAULT 2000)
+RETURNS INTEGER AS $$
+DECLARE
+  deleted_count INTEGER;
+BEGIN
+  DELETE FROM responses
+  WHERE session_id = p_session_id
+    AND id IN (
+      SELECT id FROM responses
+      WHERE session_id = p_session_id
+      LIMIT p_batch_size
+      FOR UPDATE SKIP LOCKED
+    );
+  GET DIAGNOSTICS deleted_count = ROW_COUNT;
+
+  RETURN deleted_count;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION cleanup_session(p_session_id VARCHAR)
+RETURNS INTEGER AS $$
+DECLARE
+  deleted_count INTEGER;
+BEGIN
+  SELECT COUNT(*) INTO deleted_count FROM responses WHERE session_id = p_session_id;
+  IF NOT truncate_session_partition(p_session_id) THEN
+    DELETE FROM responses WHERE session_id = p_session_id;
+    GET DIAGNOSTICS deleted_count = ROW_COUNT;
+  END IF;
+
+  PERFORM cleanup_session_metadata(p_session_id);
+
+  RETURN deleted_count;
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE responses ENABLE ROW LEVEL SECURITY;
+ALTER TABLE responses_default ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Allow anonymous insert" ON responses
+  FOR INSERT TO anon
+  WITH CHECK (session_accepts_responses(session_id));
+
+CREATE POLICY "Allow service role all" ON responses
+  FOR ALL TO service_role
+  USING (true)
+  WITH CHECK (true);
+
+ALTER PUBLICATION supabase_realtime SET (publish_via_partition_root = true);
+ALTER PUBLICATION supabase_realtime ADD TABLE responses;
+
+ANALYZE responses;
+
+-- ----------------------------------------------------------------
+-- 5. 核对（行数不一致时抛错，整个迁移回滚）
+-- ----------------------------------------------------------------
+DO $$
+DECLARE
+  old_count BIGINT;
+  new_count BIGINT;
+  default_count BIGINT;
+BEGIN
+  SELECT COUNT(*) INTO old_count FROM responses_heap;
+  SELECT COUNT(*) INTO new_count FROM responses;
+  SELECT COUNT(*) INTO default_count FROM responses_default;
+  IF old_count <> new_count THEN
+    RAISE EXCEPTION '❌ 行数不一致：旧表 % 行，分区表 % 行', old_count, new_count;
+  END IF;
+  RAISE NOTICE '✅ 已迁移 % 行到 % 个场次分区（默认分区 % 行）',
+    new_count,
+    (SELECT COUNT(*) FROM pg_inherits WHERE inhparent = 'responses'::regclass) - 1,
+    default_count;
+END $$;
+
+COMMIT;
+
+-- 确认后端运行正常后删除旧表：
+-- DROP TABLE responses_heap;
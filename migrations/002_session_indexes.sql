@@ -0,0 +1,24 @@
+-- ================================================================
+-- 迁移：responses热点查询的组合索引
+--
+-- 与database_schema.sql第1节的索引一致：
+--   - idx_responses_session_created (session_id, created_at DESC, id DESC)：最新提交、场次版本、键集分页
+--   - 删除前导列相同、已被上面的索引取代的idx_responses_session
+--   - 删除idx_responses_session_stats（如已按本迁移的早期版本创建）：responses按session_id分区后，
+--     每个分区只有一个场次，(session_id) INCLUDE (...) 覆盖索引相当于整个分区的副本，
+--     统计查询裁剪到本场次分区后顺序扫描即可，该索引只增加写入开销
+--
+-- 分区表上不能CREATE INDEX CONCURRENTLY，建索引期间会阻塞写入，请在没有课堂进行时执行。
+-- 执行后用 backend/check_query_plans.py 确认热点查询的执行计划。
+-- ================================================================
+
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS idx_responses_session_created ON responses(session_id, created_at DESC, id DESC);
+
+DROP INDEX IF EXISTS idx_responses_session_stats;
+DROP INDEX IF EXISTS idx_responses_session;
+
+COMMIT;
+
+ANALYZE responses;
@@ -0,0 +1,22 @@
+-- ================================================================
+-- 本地主库/副本测试环境：补建Supabase自带的角色、权限和Realtime发布
+-- 由docker-compose.replica.yml挂载到主库的 /docker-entrypoint-initdb.d，在database_schema.sql之前执行
+-- ================================================================
+
+CREATE ROLE anon NOLOGIN;
+CREATE ROLE service_role NOLOGIN BYPASSRLS;
+
+-- PostgREST以authenticator连接，按JWT中的role切换角色
+CREATE ROLE authenticator LOGIN NOINHERIT PASSWORD 'postgres';
+GRANT anon, service_role TO authenticator;
+
+GRANT USAGE ON SCHEMA public TO anon, service_role;
+-- 之后创建的表（含触发器按场次创建的responses分区）自动授权
+ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT ALL ON TABLES TO service_role;
+ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT ALL ON SEQUENCES TO service_role;
+ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT INSERT ON TABLES TO anon;
+
+CREATE PUBLICATION supabase_realtime;
+
+-- 副本通过流复制同步主库
+CREATE ROLE replicator WITH REPLICATION LOGIN PASSWORD 'replicator';
@@ -0,0 +1,4 @@
+#!/bin/bash
+# 允许副本以replicator用户建立流复制连接
+set -e
+echo "host replication replicator all scram-sha-256" >> "$PGDATA/pg_hba.conf"